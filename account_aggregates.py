@@ -0,0 +1,133 @@
+"""
+Incremental per-account transaction aggregates
+
+Keeps, for every account, the transaction count, the net change (sum of all
+transaction amounts; not a balance, which also depends on the balance the
+account was opened or loaded with) and count and total per transaction type
+per calendar month. Aggregates are updated as transactions are written, so
+an account summary costs time proportional to the number of months asked
+for instead of the length of the transaction history. Summaries over date
+ranges take whole months from the aggregates and sum only the partial
+months at either end of the range from the transactions themselves.
+"""
+
+import re
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+from transaction_store import parse_timestamp
+
+MONTH_PATTERN = re.compile(r"\d{4}-\d{2}")
+
+
+def transaction_month(date: str) -> str:
+    """Calendar month ("YYYY-MM") of an ISO date or timestamp"""
+    return date[:7]
+
+def _month_start(month: str) -> str:
+    return f"{month}-01"
+
+def _next_month(month: str) -> str:
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year + number // 12:04d}-{number % 12 + 1:02d}"
+
+def _previous_month(month: str) -> str:
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{year - (number == 1):04d}-{(number - 2) % 12 + 1:02d}"
+
+def split_range(start: Optional[str], end: Optional[str]) -> Tuple[Optional[str], Optional[str],
+                                                                   List[Tuple[str, str, str]]]:
+    """Split a summary range into whole months and partial months.
+
+    ``start`` and ``end`` are months ("YYYY-MM", both inclusive) or ISO dates
+    or timestamps (``start`` inclusive, ``end`` exclusive); raises ValueError
+    for anything else. Returns the first and last whole month (None for an
+    open end; the first is after the last when there is no whole month) and
+    the (month, from, to) spans of the partial months, ``from`` inclusive
+    and ``to`` exclusive.
+    """
+    for value in (start, end):
+        if value is not None and MONTH_PATTERN.fullmatch(value):
+            parse_timestamp(_month_start(value))
+    # The range as instants [low, high), in the text the caller gave
+    low = _month_start(start) if start is not None and MONTH_PATTERN.fullmatch(start) else start
+    high = _month_start(_next_month(end)) if end is not None and MONTH_PATTERN.fullmatch(end) else end
+    low_ts = parse_timestamp(low) if low is not None else None
+    high_ts = parse_timestamp(high) if high is not None else None
+
+    first = last = None
+    spans = []
+    if low is not None:
+        month = low[:7]
+        first = month
+        if low_ts != parse_timestamp(_month_start(month)):
+            first = _next_month(month)
+            to = _month_start(first)
+            spans.append((month, low, high if high_ts is not None and high_ts < parse_timestamp(to) else to))
+    if high is not None:
+        month = high[:7]
+        last = _previous_month(month)
+        if high_ts != parse_timestamp(_month_start(month)):
+            since = _month_start(month)
+            spans.append((month, low if low_ts is not None and low_ts > parse_timestamp(since) else since, high))
+    spans = [span for n, span in enumerate(spans)
+             if parse_timestamp(span[1]) < parse_timestamp(span[2]) and span not in spans[:n]]
+    return first, last, spans
+
+
+class _AccountAggregate:
+    def __init__(self):
+        self.count = 0
+        self.net_change = 0.0
+        # month -> transaction type -> [count, total]
+        self.months: Dict[str, Dict[str, List[float]]] = defaultdict(lambda: defaultdict(lambda: [0, 0.0]))
+
+
+class AccountAggregates:
+    def __init__(self):
+        self.accounts: Dict[str, _AccountAggregate] = defaultdict(_AccountAggregate)
+
+    def add(self, transaction: Dict[str, Any]):
+        aggregate = self.accounts[transaction["account_id"]]
+        aggregate.count += 1
+        aggregate.net_change += transaction["amount"]
+        totals = aggregate.months[transaction_month(transaction["date"])][transaction["type"]]
+        totals[0] += 1
+        totals[1] += transaction["amount"]
+
+    def clear(self):
+        self.accounts.clear()
+
+    def summary(self, account_id: str, from_month: Optional[str] = None, to_month: Optional[str] = None,
+                partial_rows: List[Dict[str, Any]] = ()) -> Dict[str, Any]:
+        """Summary of an account; ``from_month`` and ``to_month`` are inclusive.
+
+        ``partial_rows`` are (month, type, count, total) rows of partial months
+        outside them, as summed from the transactions.
+        """
+        aggregate = self.accounts.get(account_id) or _AccountAggregate()
+        rows = [
+            {"month": month, "type": txn_type, "count": totals[0], "total": totals[1]}
+            for month, types in aggregate.months.items()
+            if (from_month is None or month >= from_month) and (to_month is None or month <= to_month)
+            for txn_type, totals in types.items()
+        ]
+        rows.extend(partial_rows)
+        return build_summary(account_id, aggregate.count, aggregate.net_change, rows)
+
+
+def build_summary(account_id: str, count: int, net_change: float,
+                  rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Assemble a summary from (month, type, count, total) rows"""
+    months: Dict[str, Dict[str, Any]] = {}
+    for row in sorted(rows, key=lambda row: (row["month"], row["type"])):
+        month = months.setdefault(row["month"], {"month": row["month"], "count": 0, "net": 0.0, "totals": {}})
+        month["count"] += row["count"]
+        month["net"] = round(month["net"] + row["total"], 2)
+        month["totals"][row["type"]] = {"count": row["count"], "total": round(row["total"], 2)}
+    return {
+        "account_id": account_id,
+        "transaction_count": count,
+        "net_change": round(net_change, 2),
+        "months": list(months.values()),
+    }
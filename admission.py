@@ -0,0 +1,239 @@
+"""
+Admission control for the banking API and the MCP server
+
+Requests are checked before they reach the application:
+
+- rate limits: token buckets refilled at a steady rate up to a burst size,
+  one shared by all requests and one per customer. A request that finds a
+  bucket empty is answered 429 at once, with Retry-After set to the time
+  until the bucket holds a token again;
+- requests in flight: at most ``max_in_flight`` requests are handled at a
+  time and at most ``max_queue`` more wait for a slot, each for at most
+  ``queue_timeout`` seconds. Any other request is answered 503 with
+  Retry-After, so under overload the queue every request waits in stays
+  short instead of growing without bound.
+
+Rejected requests never reach the application, so they are safe to repeat.
+RetryAfterTransport is the client side: an httpx transport that repeats
+requests answered 429 or 503 with a Retry-After header after that delay,
+with jitter, so rejected clients do not come back in lockstep.
+
+Limits are kept per process; with several API workers every worker admits
+its own share. Configuration, where PREFIX is BANKING for the API and MCP
+for the MCP server (rates in requests per second, 0 disables a limit):
+
+    PREFIX_RATE_LIMIT             all requests together (0)
+    PREFIX_RATE_BURST             requests admitted at once above the rate (the rate)
+    PREFIX_CUSTOMER_RATE_LIMIT    requests of each customer (0)
+    PREFIX_CUSTOMER_RATE_BURST    (the customer rate)
+    PREFIX_MAX_IN_FLIGHT          requests handled at a time (64)
+    PREFIX_MAX_QUEUE              requests waiting for a slot (128)
+    PREFIX_QUEUE_TIMEOUT          seconds a request waits for a slot (1)
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import time
+from collections import OrderedDict
+from typing import Callable, Collection, Optional, Tuple
+
+import httpx
+
+import telemetry
+
+rejected_requests = telemetry.registry.counter(
+    "admission_rejected_total", "Requests rejected by admission control by service and reason", ["service", "reason"])
+
+
+class TokenBucket:
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Take a token; returns 0 if there was one, else the seconds until there is"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate
+
+
+class RateLimiter:
+    """Token buckets per key; only the ``max_keys`` most recently used are kept"""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 100000):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.max_keys = max_keys
+        self.buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def take(self, key: str, now: float) -> float:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            # A bucket dropped for space was idle longest, so it had mostly refilled anyway
+            bucket = self.buckets[key] = TokenBucket(self.rate, self.burst, now)
+            if len(self.buckets) > self.max_keys:
+                self.buckets.popitem(last=False)
+        else:
+            self.buckets.move_to_end(key)
+        return bucket.take(now)
+
+
+class AdmissionController:
+    """Rate limits and the bound on requests in flight of one service"""
+
+    def __init__(self, rate: float = 0, burst: float = 0, customer_rate: float = 0, customer_burst: float = 0,
+                 max_in_flight: int = 0, max_queue: int = 0, queue_timeout: float = 1.0):
+        self.limiter = RateLimiter(rate, burst or rate) if rate > 0 else None
+        self.customer_limiter = RateLimiter(customer_rate, customer_burst or customer_rate) if customer_rate > 0 else None
+        self.max_in_flight = max_in_flight
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.slots = asyncio.Semaphore(max_in_flight) if max_in_flight > 0 else None
+        self.waiting = 0
+
+    @classmethod
+    def from_env(cls, prefix: str) -> "AdmissionController":
+        def setting(name: str, default: str) -> float:
+            return float(os.getenv(f"{prefix}_{name}", default))
+        return cls(
+            rate=setting("RATE_LIMIT", "0"),
+            burst=setting("RATE_BURST", "0"),
+            customer_rate=setting("CUSTOMER_RATE_LIMIT", "0"),
+            customer_burst=setting("CUSTOMER_RATE_BURST", "0"),
+            max_in_flight=int(setting("MAX_IN_FLIGHT", "64")),
+            max_queue=int(setting("MAX_QUEUE", "128")),
+            queue_timeout=setting("QUEUE_TIMEOUT", "1"),
+        )
+
+    def rate_limited(self, customer: Optional[str]) -> Optional[Tuple[str, float]]:
+        """(limit, seconds to wait) if a rate limit rejects the request, else None"""
+        now = time.monotonic()
+        if customer is not None and self.customer_limiter is not None:
+            wait = self.customer_limiter.take(customer, now)
+            if wait:
+                return "customer_rate", wait
+        if self.limiter is not None:
+            wait = self.limiter.take("", now)
+            if wait:
+                return "rate", wait
+        return None
+
+    async def acquire(self) -> bool:
+        """Wait for a slot to handle a request; False if the queue is full or the wait timed out"""
+        if self.slots is None:
+            return True
+        if self.slots.locked():
+            if self.waiting >= self.max_queue:
+                return False
+            self.waiting += 1
+            try:
+                await asyncio.wait_for(self.slots.acquire(), self.queue_timeout)
+            except asyncio.TimeoutError:
+                return False
+            finally:
+                self.waiting -= 1
+            return True
+        await self.slots.acquire()
+        return True
+
+    def release(self):
+        if self.slots is not None:
+            self.slots.release()
+
+
+class AdmissionMiddleware:
+    """ASGI middleware that answers requests the controller rejects with 429 or 503.
+
+    ``customer_of(scope)`` names the customer a request counts against for the
+    per-customer rate limit. Only requests with one of ``methods`` (all if
+    None) are checked; requests to ``exempt`` paths always pass.
+    """
+
+    def __init__(self, app, controller: AdmissionController, service: str,
+                 customer_of: Optional[Callable[[dict], Optional[str]]] = None,
+                 methods: Optional[Collection[str]] = None, exempt: Collection[str] = ("/health", "/metrics")):
+        self.app = app
+        self.controller = controller
+        self.service = service
+        self.customer_of = customer_of
+        self.methods = methods
+        self.exempt = exempt
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or scope["path"] in self.exempt
+                or (self.methods is not None and scope["method"] not in self.methods)):
+            return await self.app(scope, receive, send)
+        limited = self.controller.rate_limited(self.customer_of(scope) if self.customer_of else None)
+        if limited is not None:
+            reason, wait = limited
+            return await self.reject(send, 429, reason, "Rate limit exceeded", wait)
+        if not await self.controller.acquire():
+            return await self.reject(send, 503, "overloaded", "Server overloaded", self.controller.queue_timeout)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release()
+
+    async def reject(self, send, status: int, reason: str, detail: str, retry_after: float):
+        rejected_requests.inc(service=self.service, reason=reason)
+        body = json.dumps({"detail": detail}).encode()
+        await send({"type": "http.response.start", "status": status, "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            # Retry-After is in whole seconds
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode()),
+        ]})
+        await send({"type": "http.response.body", "body": body})
+
+
+def retry_delay(retry_after: str, attempt: int, backoff: float = 0.1, jitter: float = 0.5) -> Optional[float]:
+    """Seconds to wait before repeating a request, or None if Retry-After is not a delay.
+
+    The delay is the server's Retry-After, at least doubling from ``backoff``
+    with every attempt, stretched by a random share of up to ``jitter``.
+    """
+    try:
+        seconds = float(retry_after)
+    except ValueError:
+        return None
+    delay = max(seconds, backoff * 2 ** attempt)
+    return delay * (1 + random.uniform(0, jitter))
+
+
+class RetryAfterTransport(httpx.AsyncBaseTransport):
+    """httpx transport that repeats requests the server rejected with 429 or 503 and Retry-After.
+
+    Gives up, returning the rejection, after ``retries`` attempts or when the
+    server asks for a wait longer than ``max_delay`` seconds.
+    """
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, retries: int = 3, max_delay: float = 10.0):
+        self.transport = transport
+        self.retries = retries
+        self.max_delay = max_delay
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        attempt = 0
+        while True:
+            response = await self.transport.handle_async_request(request)
+            if response.status_code not in (429, 503) or attempt >= self.retries:
+                return response
+            delay = retry_delay(response.headers.get("retry-after", ""), attempt)
+            if delay is None or delay > self.max_delay:
+                return response
+            await response.aclose()
+            await asyncio.sleep(delay)
+            attempt += 1
+
+    async def aclose(self):
+        await self.transport.aclose()
@@ -0,0 +1,141 @@
+"""
+Answer cache for repeated agent questions
+
+Customers ask the same questions again and again ("show me my accounts",
+"what's my balance on ACC001"). The chat client keeps the answers of such
+turns and answers a repeated question without calling the LLM or any tool.
+
+An answer is stored under the customer, the normalized question and the
+versions it was computed from: the version of the customer's banking data
+(which changes with every write to the customer or any of their accounts,
+see /customers/{id}/versions) and of the system prompt. A question asked
+after a write, such as locking an account, therefore never finds an answer
+computed before it. Entries expire after a TTL and the least recently used
+are evicted beyond the size limit.
+
+Lookups match the normalized question exactly. With a similarity threshold
+they fall back to the most similar cached question of the customer at the
+same versions, by cosine similarity of embeddings; the default embedding is
+a local bag of character trigrams, and any ``embed`` function returning
+unit-length sparse vectors can replace it. Questions only match when they
+name the same ids, numbers and dates.
+"""
+
+import math
+import re
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from typing import Callable, Dict, FrozenSet, Hashable, Optional, Tuple
+
+WORD_PATTERN = re.compile(r"\w+")
+# Words that never change what is asked
+FILLER_WORDS = frozenset({"please", "pls", "kindly"})
+
+Embedding = Dict[str, float]
+
+
+def normalize(question: str) -> str:
+    """Lowercase words of the question without punctuation or filler words"""
+    words = WORD_PATTERN.findall(unicodedata.normalize("NFKC", question).lower())
+    return " ".join(word for word in words if word not in FILLER_WORDS)
+
+def entities(normalized: str) -> FrozenSet[str]:
+    """Words with digits (ids, amounts, dates), which must match exactly"""
+    return frozenset(word for word in normalized.split() if any(char.isdigit() for char in word))
+
+def trigram_embedding(normalized: str) -> Embedding:
+    """Unit-length bag of character trigrams"""
+    text = f" {normalized} "
+    counts = Counter(text[start:start + 3] for start in range(len(text) - 2))
+    norm = math.sqrt(sum(count * count for count in counts.values())) or 1.0
+    return {gram: count / norm for gram, count in counts.items()}
+
+def cosine(a: Embedding, b: Embedding) -> float:
+    if len(a) > len(b):
+        a, b = b, a
+    return sum(weight * b.get(key, 0.0) for key, weight in a.items())
+
+
+class _Entry:
+    __slots__ = ("answer", "stored", "embedding", "entities")
+
+    def __init__(self, answer: str, stored: float, embedding: Optional[Embedding], entities: FrozenSet[str]):
+        self.answer = answer
+        self.stored = stored
+        self.embedding = embedding
+        self.entities = entities
+
+
+class AnswerCache:
+    """LRU cache of answers with a TTL, keyed by (customer, question, versions)"""
+
+    def __init__(self, max_entries: int = 1000, ttl: float = 300.0, similarity: float = 0.0,
+                 embed: Callable[[str], Embedding] = trigram_embedding):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity = similarity
+        self.embed = embed
+        self.entries: "OrderedDict[Tuple[str, Hashable, str], _Entry]" = OrderedDict()
+        # Hits of exact and similar questions, and misses
+        self.stats = Counter()
+
+    def get(self, customer_id: str, question: str, versions: Hashable) -> Optional[str]:
+        """Cached answer to the question at these versions, or None"""
+        if not self.max_entries:
+            return None
+        normalized = normalize(question)
+        key = (customer_id, versions, normalized)
+        entry = self.entries.get(key)
+        if entry is not None and not self._expired(key, entry):
+            self.entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return entry.answer
+        if self.similarity > 0:
+            key = self._most_similar(customer_id, versions, normalized)
+            if key is not None:
+                self.entries.move_to_end(key)
+                self.stats["similar_hits"] += 1
+                return self.entries[key].answer
+        self.stats["misses"] += 1
+        return None
+
+    def put(self, customer_id: str, question: str, versions: Hashable, answer: str):
+        if not self.max_entries:
+            return
+        normalized = normalize(question)
+        key = (customer_id, versions, normalized)
+        embedding = self.embed(normalized) if self.similarity > 0 else None
+        self.entries[key] = _Entry(answer, time.monotonic(), embedding, entities(normalized))
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def invalidate(self, customer_id: str):
+        """Drop every answer of the customer, e.g. after the customer changed their data"""
+        for key in [key for key in self.entries if key[0] == customer_id]:
+            del self.entries[key]
+
+    def clear(self):
+        self.entries.clear()
+        self.stats.clear()
+
+    def _expired(self, key, entry: _Entry) -> bool:
+        if time.monotonic() - entry.stored <= self.ttl:
+            return False
+        del self.entries[key]
+        return True
+
+    def _most_similar(self, customer_id: str, versions: Hashable, normalized: str):
+        wanted_entities = entities(normalized)
+        embedding = self.embed(normalized)
+        best, best_score = None, self.similarity
+        # A list, as expired entries are dropped along the way
+        for key in [key for key in self.entries if key[0] == customer_id and key[1] == versions]:
+            entry = self.entries[key]
+            if entry.entities != wanted_entities or self._expired(key, entry):
+                continue
+            score = cosine(embedding, entry.embedding)
+            if score >= best_score:
+                best, best_score = key, score
+        return best
@@ -0,0 +1,63 @@
+"""
+Bearer tokens identifying the customer behind an MCP session
+
+Tokens are stateless: "<customer_id>.<expires>.<signature>", where expires is
+a Unix time and the signature is an HMAC-SHA256 of "<customer_id>.<expires>"
+under BANKING_MCP_TOKEN_SECRET. The MCP server verifies them per request, so
+one process can serve any number of customers without a session table.
+Tokens are valid for BANKING_MCP_TOKEN_TTL seconds (default 8 hours). In
+production these would be issued by the bank's identity provider.
+
+There is no default secret: anyone who knows the secret can act as any
+customer, so issuing or verifying a token without one raises
+MissingTokenSecret.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import time
+from typing import Optional
+
+DEFAULT_TOKEN_TTL = 8 * 3600
+
+
+class MissingTokenSecret(RuntimeError):
+    def __init__(self):
+        super().__init__("BANKING_MCP_TOKEN_SECRET is not set; set it to the same random value for the MCP "
+                         "server and the client, e.g. python -c 'import secrets; print(secrets.token_urlsafe())'")
+
+
+def token_secret() -> str:
+    """The signing secret; raises MissingTokenSecret when it is not configured"""
+    secret = os.getenv("BANKING_MCP_TOKEN_SECRET")
+    if not secret:
+        raise MissingTokenSecret()
+    return secret
+
+def _signature(payload: str) -> str:
+    digest = hmac.new(token_secret().encode(), payload.encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).decode().rstrip("=")
+
+def issue_token(customer_id: str, ttl: Optional[int] = None) -> str:
+    """Issue a bearer token for a customer, valid for ``ttl`` seconds"""
+    if ttl is None:
+        ttl = int(os.getenv("BANKING_MCP_TOKEN_TTL", DEFAULT_TOKEN_TTL))
+    payload = f"{customer_id}.{int(time.time()) + ttl}"
+    return f"{payload}.{_signature(payload)}"
+
+def verify_token(token: str) -> Optional[str]:
+    """Return the customer id of a valid, unexpired token, or None"""
+    payload, _, signature = token.rpartition(".")
+    customer_id, _, expires = payload.rpartition(".")
+    if not customer_id or not hmac.compare_digest(signature, _signature(payload)):
+        return None
+    if not expires.isdigit() or int(expires) < time.time():
+        return None
+    return customer_id
+
+
+if __name__ == "__main__":
+    import sys
+    print(issue_token(sys.argv[1] if len(sys.argv) > 1 else "CUST001"))
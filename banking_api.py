@@ -4,16 +4,84 @@ Mock Banking API for MCP Demo
 
 This module provides a mock banking API that simulates real banking operations.
 In a production environment, this would connect to actual banking systems.
+
+Run it with several worker processes against a shared SQLite database:
+
+    BANKING_STORAGE=sqlite python banking_api.py --workers 4
+
+or under an external process manager, e.g.
+``gunicorn -k uvicorn.workers.UvicornWorker -w 4 banking_api:app``.
+Each worker opens the storage backend on startup and closes it on shutdown.
 """
 
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
+from fastapi import Depends, FastAPI, HTTPException, Path, Query, Request, Response
+from fastapi.responses import JSONResponse, PlainTextResponse
+from starlette.concurrency import run_in_threadpool
+from pydantic import BaseModel, Field
 from typing import List, Optional, Dict, Any
+import argparse
+import json
+import logging
+import os
+import socket
 import uuid
+from contextlib import asynccontextmanager
 from datetime import datetime, timedelta
-import random
+from email.utils import formatdate
+
+try:
+    import orjson
+except ImportError:  # optional; the fast response path falls back to the stdlib encoder
+    orjson = None
+
+import telemetry
+from admission import AdmissionController, AdmissionMiddleware
+from id_allocator import account_number
+from ingest import DEFAULT_CHUNK_SIZE, FeedError, TransactionIngestor, detect_format
+from repository import (GLOBAL_VERSION_KEY, BankingRepository, InMemoryRepository, InvalidCursor, create_repository,
+                        version_key)
+from transaction_store import parse_timestamp
+
+# uvicorn configures its own loggers in every worker process
+logger = logging.getLogger("uvicorn.error")
 
-app = FastAPI(title="Mock Banking API", description="Demo banking API for MCP integration")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open the storage backend when a worker starts and close it when the worker stops"""
+    global repository
+    if repository is None:
+        repository = create_repository(customers, accounts, transactions, documents)
+    if isinstance(repository, InMemoryRepository) and int(os.getenv("WEB_CONCURRENCY", "1")) > 1:
+        logger.warning("In-memory storage with several workers: every worker has its own copy of the data. "
+                       "Set BANKING_STORAGE=sqlite to share it.")
+    logger.info("Worker %d started with %s", os.getpid(), type(repository).__name__)
+    yield
+    repository.close()
+    repository = None
+    logger.info("Worker %d stopped", os.getpid())
+
+def request_customer(scope) -> Optional[str]:
+    """Customer a request counts against for rate limiting.
+
+    The customer in the path, else the X-Customer-Id header the MCP server
+    sends on behalf of its session's customer. Used for rate limiting only,
+    never for authorization.
+    """
+    path = scope["path"]
+    if path.startswith("/customers/"):
+        return path.split("/", 3)[2]
+    for name, value in scope["headers"]:
+        if name == b"x-customer-id":
+            return value.decode("latin-1")
+    return None
+
+app = FastAPI(title="Mock Banking API", description="Demo banking API for MCP integration", lifespan=lifespan)
+# Every request runs in a span continuing the caller's trace (see telemetry.py)
+app.add_middleware(telemetry.TraceMiddleware, service="banking-api")
+# Rate limits and the bound on requests in flight (see admission.py). Added
+# last so it runs first: rejecting a request must cost as little as possible.
+app.add_middleware(AdmissionMiddleware, controller=AdmissionController.from_env("BANKING"), service="banking-api",
+                   customer_of=request_customer)
 
 # Mock data storage
 customers = {
@@ -194,6 +262,10 @@ documents = {
     }
 }
 
+# Storage backend serving the data above (or a persistent database, see
+# repository.py); opened per worker process by lifespan()
+repository: Optional[BankingRepository] = None
+
 # Pydantic models
 class Customer(BaseModel):
     id: str
@@ -228,6 +300,28 @@ class Transaction(BaseModel):
     status: str
     reference: str
 
+class TransactionPage(BaseModel):
+    items: List[Transaction]
+    next_cursor: Optional[str] = None
+
+class TypeTotals(BaseModel):
+    count: int
+    total: float
+
+class MonthlySummary(BaseModel):
+    month: str
+    count: int
+    net: float
+    totals: Dict[str, TypeTotals]
+
+class AccountSummary(BaseModel):
+    account_id: str
+    balance: float
+    currency: str
+    transaction_count: int
+    net_change: float
+    months: List[MonthlySummary]
+
 class CreateAccountRequest(BaseModel):
     customer_id: str
     account_type: str
@@ -240,95 +334,343 @@ class Document(BaseModel):
     content: str
     date: str
 
+class ScoredDocument(Document):
+    score: float
+
+class CreateDocumentRequest(BaseModel):
+    type: str
+    content: str
+    date: Optional[str] = None
+
+# Upper bound on the items of one batch request
+MAX_BATCH_SIZE = 100
+
+class BatchAccountsRequest(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+    customer_id: Optional[str] = None
+
+class BatchTransactionsRequest(BaseModel):
+    ids: List[str] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+    customer_id: Optional[str] = None
+
+class BatchAccountTransactionsRequest(BaseModel):
+    account_ids: List[str] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+    customer_id: Optional[str] = None
+    limit: int = Field(10, ge=1, le=500)
+    from_date: Optional[str] = None
+    to_date: Optional[str] = None
+    type: Optional[str] = None
+
+class BulkCreateAccountsRequest(BaseModel):
+    accounts: List[CreateAccountRequest] = Field(min_length=1, max_length=MAX_BATCH_SIZE)
+
+class AccountResult(BaseModel):
+    id: Optional[str] = None
+    account: Optional[Account] = None
+    error: Optional[str] = None
+
+class TransactionResult(BaseModel):
+    id: str
+    transaction: Optional[Transaction] = None
+    error: Optional[str] = None
+
+class AccountTransactionsResult(BaseModel):
+    account_id: str
+    page: Optional[TransactionPage] = None
+    error: Optional[str] = None
+
+class IngestError(BaseModel):
+    line: int
+    error: str
+
+class IngestReport(BaseModel):
+    rows: int
+    applied: int
+    duplicates: int
+    rejected: int
+    chunks: int
+    errors: List[IngestError]
+    seconds: float
+    rows_per_second: float
+
+
+def data_epoch() -> str:
+    """Identifies the data the version counters count from.
+
+    In-memory counters restart at 0 with every process, so validators built
+    from counters alone could match data from before a restart. The epoch
+    is the repository's creation time: new for every in-memory repository,
+    and stored in the database next to the counters for SQLite.
+    """
+    return format(int(repository.created_at * 1000), "x")
+
+def versioned(kind: str, param: str):
+    """Conditional GET support for reads that depend on one customer or account.
+
+    Adds ETag and Last-Modified validators built from the entity's version
+    counter, named by the path parameter `param`, and answers 304 Not Modified
+    without running the endpoint when If-None-Match has the current ETag.
+    """
+    def check_version(request: Request, response: Response):
+        key = version_key(kind, request.path_params[param])
+        versions = repository.get_versions([key, GLOBAL_VERSION_KEY])
+        etag = f'W/"{data_epoch()}.{versions[GLOBAL_VERSION_KEY][0]}.{versions[key][0]}"'
+        headers = {
+            "ETag": etag,
+            "Last-Modified": formatdate(max(modified for _, modified in versions.values()), usegmt=True),
+            "Cache-Control": "no-cache",
+        }
+        if_none_match = [tag.strip() for tag in request.headers.get("if-none-match", "").split(",")]
+        if etag in if_none_match or "*" in if_none_match:
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+    return Depends(check_version)
+
+
+# Records are validated when they are written (request models, SQLite column
+# types) and stored in API shape, so read endpoints can encode them directly
+# instead of re-validating every item against the response model.
+FAST_RESPONSES = os.getenv("BANKING_FAST_RESPONSES", "1") != "0"
+
+class FastJSONResponse(JSONResponse):
+    """Compact JSON response encoded with orjson when it is installed"""
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def records_response(content: Any, response: Response):
+    """Return API-shaped records, skipping response_model validation in fast mode.
+
+    Headers set by dependencies on `response` (such as ETags) are kept.
+    """
+    if not FAST_RESPONSES:
+        return content
+    headers = {key: value for key, value in response.headers.items() if key != "content-length"}
+    return FastJSONResponse(content, headers=headers)
+
+
+def check_dates(*values: Optional[str]):
+    """Reject date filters that are not ISO dates or timestamps"""
+    for value in values:
+        if value:
+            try:
+                parse_timestamp(value)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"Invalid date {value!r}, expected e.g. 2024-01-31")
+
 
 # API Endpoints
+# Endpoints that touch the repository are plain functions: its calls block
+# (SQLite queries, lock waits), so FastAPI runs them in its threadpool
+# instead of on the event loop.
 @app.get("/")
 async def root():
     return {"message": "Mock Banking API", "version": "1.0.0"}
 
 @app.get("/customers", response_model=List[Customer])
-async def get_customers():
+def get_customers(response: Response):
     """Get all customers"""
-    return list(customers.values())
+    return records_response(repository.list_customers(), response)
 
-@app.get("/customers/{customer_id}", response_model=Customer)
-async def get_customer(customer_id: str):
+@app.get("/customers/{customer_id}", response_model=Customer,
+         dependencies=[versioned("customer", "customer_id")])
+def get_customer(customer_id: str, response: Response):
     """Get customer by ID"""
-    if customer_id not in customers:
+    customer = repository.get_customer(customer_id)
+    if customer is None:
         raise HTTPException(status_code=404, detail="Customer not found")
-    return customers[customer_id]
+    return records_response(customer, response)
 
-@app.get("/customers/{customer_id}/accounts", response_model=List[Account])
-async def get_customer_accounts(customer_id: str):
+@app.get("/customers/{customer_id}/accounts", response_model=List[Account],
+         dependencies=[versioned("customer", "customer_id")])
+def get_customer_accounts(customer_id: str, response: Response):
     """Get all accounts for a customer"""
-    if customer_id not in customers:
+    if repository.get_customer(customer_id) is None:
         raise HTTPException(status_code=404, detail="Customer not found")
     
-    customer_accounts = [acc for acc in accounts.values() if acc["customer_id"] == customer_id]
-    return customer_accounts
+    return records_response(repository.get_customer_accounts(customer_id), response)
+
+@app.get("/customers/{customer_id}/versions")
+def get_customer_versions(customer_id: str):
+    """Version of all of a customer's data.
+
+    Changes with every write to the customer or any of their accounts, so
+    clients can key caches of anything derived from that data on it.
+    """
+    if repository.get_customer(customer_id) is None:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    keys = [GLOBAL_VERSION_KEY, version_key("customer", customer_id)]
+    keys += [version_key("account", account["id"]) for account in repository.get_customer_accounts(customer_id)]
+    versions = repository.get_versions(keys)
+    counters = ".".join(str(versions[key][0]) for key in keys)
+    return {"customer_id": customer_id, "version": f"{data_epoch()}.{counters}"}
+
+@app.get("/customers/{customer_id}/accounts/{account_id}", response_model=Account,
+         dependencies=[versioned("account", "account_id")])
+def get_customer_account(customer_id: str, account_id: str, response: Response):
+    """Get an account if it belongs to the customer (single-call ownership check)"""
+    account = repository.get_account(account_id)
+    if account is None or account["customer_id"] != customer_id:
+        raise HTTPException(status_code=404, detail="Account not found for customer")
+    return records_response(account, response)
 
 @app.get("/accounts", response_model=List[Account])
-async def get_accounts():
+def get_accounts(response: Response):
     """Get all accounts"""
-    return list(accounts.values())
+    return records_response(repository.list_accounts(), response)
 
-@app.get("/accounts/{account_id}", response_model=Account)
-async def get_account(account_id: str):
+@app.get("/accounts/{account_id}", response_model=Account,
+         dependencies=[versioned("account", "account_id")])
+def get_account(account_id: str, response: Response):
     """Get account by ID"""
-    if account_id not in accounts:
+    account = repository.get_account(account_id)
+    if account is None:
         raise HTTPException(status_code=404, detail="Account not found")
-    return accounts[account_id]
+    return records_response(account, response)
+
+def owned_account(account_id: str, customer_id: Optional[str]) -> Dict[str, Any]:
+    """The account, or a 404 if it does not exist or, when customer_id is given, belongs to someone else.
 
-@app.get("/accounts/{account_id}/transactions", response_model=List[Transaction])
-async def get_account_transactions(account_id: str):
-    """Get transaction history for an account"""
-    if account_id not in accounts:
+    Lets callers acting for a customer check ownership in the same request.
+    """
+    account = repository.get_account(account_id)
+    if account is None or (customer_id and account["customer_id"] != customer_id):
         raise HTTPException(status_code=404, detail="Account not found")
+    return account
+
+@app.get("/accounts/{account_id}/transactions", response_model=TransactionPage,
+         dependencies=[versioned("account", "account_id")])
+def get_account_transactions(
+    account_id: str,
+    response: Response,
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    from_date: Optional[str] = Query(None, alias="from"),
+    to_date: Optional[str] = Query(None, alias="to"),
+    type: Optional[str] = None,
+    customer_id: Optional[str] = None,
+):
+    """Get transaction history for an account, newest first and paginated"""
+    owned_account(account_id, customer_id)
+    check_dates(from_date, to_date)
     
-    account_transactions = [txn for txn in transactions.values() if txn["account_id"] == account_id]
-    return account_transactions
+    try:
+        items, next_cursor = repository.page_transactions(account_id, limit, cursor, from_date, to_date, type)
+    except InvalidCursor:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    return records_response({"items": items, "next_cursor": next_cursor}, response)
+
+@app.get("/accounts/{account_id}/summary", response_model=AccountSummary,
+         dependencies=[versioned("account", "account_id")])
+def get_account_summary(
+    account_id: str,
+    start: Optional[str] = Query(None, alias="from"),
+    end: Optional[str] = Query(None, alias="to"),
+    customer_id: Optional[str] = None,
+):
+    """Precomputed transaction totals of an account per month and type.
+
+    `from` and `to` are inclusive months such as 2024-01, or ISO dates or
+    timestamps (`from` inclusive, `to` exclusive). Whole months come from the
+    aggregates; the partial months at the ends of a date range are summed
+    from the transactions.
+    """
+    account = owned_account(account_id, customer_id)
+    try:
+        summary = repository.get_account_summary(account_id, start, end)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="from and to must be months such as 2024-01 or ISO dates")
+    return {**summary, "balance": account["balance"], "currency": account["currency"]}
 
-@app.get("/customers/{customer_id}/documents", response_model=List[Document])
-async def get_customer_documents(customer_id: str):
+@app.get("/accounts/{account_id}/summary/{month}", response_model=MonthlySummary,
+         dependencies=[versioned("account", "account_id")])
+def get_account_month_summary(
+    account_id: str,
+    month: str = Path(pattern=r"^\d{4}-\d{2}$"),
+    customer_id: Optional[str] = None,
+):
+    """Transaction totals of an account for one month (YYYY-MM)"""
+    owned_account(account_id, customer_id)
+    try:
+        months = repository.get_account_summary(account_id, month, month)["months"]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="month must be a month such as 2024-01")
+    return months[0] if months else {"month": month, "count": 0, "net": 0.0, "totals": {}}
+
+@app.get("/customers/{customer_id}/documents", response_model=List[Document],
+         dependencies=[versioned("customer", "customer_id")])
+def get_customer_documents(customer_id: str, response: Response):
     """Get all documents for a customer"""
-    if customer_id not in customers:
+    if repository.get_customer(customer_id) is None:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    
+    return records_response(repository.get_customer_documents(customer_id), response)
+
+@app.get("/customers/{customer_id}/documents/search", response_model=List[ScoredDocument],
+         dependencies=[versioned("customer", "customer_id")])
+def search_customer_documents(
+    customer_id: str,
+    response: Response,
+    q: str,
+    limit: int = Query(10, ge=1, le=100),
+    type: Optional[str] = None,
+    from_date: Optional[str] = Query(None, alias="from"),
+    to_date: Optional[str] = Query(None, alias="to"),
+):
+    """Full-text search of a customer's documents, ranked by BM25 relevance"""
+    if repository.get_customer(customer_id) is None:
         raise HTTPException(status_code=404, detail="Customer not found")
+    check_dates(from_date, to_date)
     
-    customer_documents = [doc for doc in documents.values() if doc["customer_id"] == customer_id]
-    return customer_documents
+    results = repository.search_documents(customer_id, q, limit, type, from_date, to_date)
+    return records_response([{**document, "score": score} for document, score in results], response)
+
+@app.post("/customers/{customer_id}/documents", response_model=Document)
+def create_document(customer_id: str, request: CreateDocumentRequest):
+    """Add a document for a customer"""
+    if repository.get_customer(customer_id) is None:
+        raise HTTPException(status_code=404, detail="Customer not found")
+    check_dates(request.date)
+    
+    document = {
+        "id": repository.next_id("document"),
+        "customer_id": customer_id,
+        "type": request.type,
+        "content": request.content,
+        "date": request.date or datetime.now().isoformat() + "Z",
+    }
+    repository.add_document(document)
+    return document
 
 @app.get("/accounts/{account_id}/lock", response_model=Account)
-async def lock_account(account_id: str):
-    """Lock an account"""
-    if account_id not in accounts:
+def lock_account(account_id: str, customer_id: Optional[str] = None):
+    """Lock an account, only if it belongs to `customer_id` when that is given"""
+    owned_account(account_id, customer_id)
+    account = repository.set_account_status(account_id, "locked")
+    if account is None:
         raise HTTPException(status_code=404, detail="Account not found")
-    
-    accounts[account_id]["status"] = "locked"
-    return accounts[account_id]
+    return account
 
-@app.post("/accounts", response_model=Account)
-async def create_account(request: CreateAccountRequest):
-    """Create a new account"""
-    if request.customer_id not in customers:
+def validate_create_account(request: CreateAccountRequest):
+    """Raise an HTTPException if an account cannot be created for the request"""
+    if repository.get_customer(request.customer_id) is None:
         raise HTTPException(status_code=404, detail="Customer not found")
     
     # Validate account type
     valid_types = ["checking", "savings", "investment"]
     if request.account_type not in valid_types:
         raise HTTPException(status_code=400, detail=f"Invalid account type. Must be one of: {valid_types}")
-    
-    # Generate new account
-    account_id = f"ACC{str(len(accounts) + 1).zfill(3)}"
-    account_number = f"{random.randint(1000, 9999)}-{random.randint(1000, 9999)}-{random.randint(1000, 9999)}-{random.randint(1000, 9999)}"
-    
+
+def new_account_record(request: CreateAccountRequest, account_id: str) -> Dict[str, Any]:
     # Set default values based on account type
     interest_rate = 0.025 if request.account_type == "savings" else 0.01
     overdraft_limit = 1000.00 if request.account_type == "checking" else 0.00
     
-    new_account = {
+    return {
         "id": account_id,
         "customer_id": request.customer_id,
-        "account_number": account_number,
+        "account_number": account_number(account_id),
         "type": request.account_type,
         "balance": request.initial_deposit,
         "currency": "USD",
@@ -337,33 +679,191 @@ async def create_account(request: CreateAccountRequest):
         "interest_rate": interest_rate,
         "overdraft_limit": overdraft_limit
     }
+
+def initial_deposit_record(request: CreateAccountRequest, account_id: str, txn_id: str) -> Dict[str, Any]:
+    return {
+        "id": txn_id,
+        "account_id": account_id,
+        "type": "deposit",
+        "amount": request.initial_deposit,
+        "description": f"Initial deposit for {request.account_type} account",
+        "date": datetime.now().isoformat() + "Z",
+        "status": "completed",
+        "reference": f"INIT-{account_id}"
+    }
+
+@app.post("/accounts", response_model=Account)
+def create_account(request: CreateAccountRequest):
+    """Create a new account"""
+    validate_create_account(request)
     
-    accounts[account_id] = new_account
+    new_account = new_account_record(request, repository.next_id("account"))
     
-    # Create initial transaction if there's a deposit
+    # Create initial transaction if there's a deposit; both are written together
+    deposits = []
     if request.initial_deposit > 0:
-        txn_id = f"TXN{str(len(transactions) + 1).zfill(3)}"
-        transactions[txn_id] = {
-            "id": txn_id,
-            "account_id": account_id,
-            "type": "deposit",
-            "amount": request.initial_deposit,
-            "description": f"Initial deposit for {request.account_type} account",
-            "date": datetime.now().isoformat() + "Z",
-            "status": "completed",
-            "reference": f"INIT-{account_id}"
-        }
+        deposits.append(initial_deposit_record(request, new_account["id"], repository.next_id("transaction")))
+    repository.create_accounts([new_account], deposits)
     
     return new_account
 
+# Batch endpoints: one request for many entities, with a result per item in
+# request order. Items fail independently; the error says why.
+@app.post("/accounts/batch", response_model=List[AccountResult])
+def get_accounts_batch(request: BatchAccountsRequest):
+    """Get several accounts by id, optionally only those of one customer"""
+    found = repository.get_accounts(request.ids)
+    results = []
+    for account_id in request.ids:
+        account = found.get(account_id)
+        if account is None or (request.customer_id and account["customer_id"] != request.customer_id):
+            results.append({"id": account_id, "error": "Account not found"})
+        else:
+            results.append({"id": account_id, "account": account})
+    return results
+
+@app.post("/accounts/transactions/batch", response_model=List[AccountTransactionsResult])
+def get_accounts_transactions_batch(request: BatchAccountTransactionsRequest):
+    """Get the latest page of transactions of several accounts"""
+    check_dates(request.from_date, request.to_date)
+    found = repository.get_accounts(request.account_ids)
+    results = []
+    for account_id in request.account_ids:
+        account = found.get(account_id)
+        if account is None or (request.customer_id and account["customer_id"] != request.customer_id):
+            results.append({"account_id": account_id, "error": "Account not found"})
+            continue
+        items, next_cursor = repository.page_transactions(account_id, request.limit, None, request.from_date,
+                                                          request.to_date, request.type)
+        results.append({"account_id": account_id, "page": {"items": items, "next_cursor": next_cursor}})
+    return results
+
+@app.post("/transactions/batch", response_model=List[TransactionResult])
+def get_transactions_batch(request: BatchTransactionsRequest):
+    """Get several transactions by id, optionally only those on one customer's accounts"""
+    found = repository.get_transactions(request.ids)
+    owners = {}
+    if request.customer_id:
+        accounts = repository.get_accounts([txn["account_id"] for txn in found.values()])
+        owners = {acc_id: account["customer_id"] for acc_id, account in accounts.items()}
+    results = []
+    for txn_id in request.ids:
+        txn = found.get(txn_id)
+        if txn is None or (request.customer_id and owners.get(txn["account_id"]) != request.customer_id):
+            results.append({"id": txn_id, "error": "Transaction not found"})
+        else:
+            results.append({"id": txn_id, "transaction": txn})
+    return results
+
+@app.post("/accounts/bulk", response_model=List[AccountResult])
+def create_accounts_bulk(request: BulkCreateAccountsRequest):
+    """Create several accounts in one request; results are in request order"""
+    results: List[Dict[str, Any]] = []
+    valid = []
+    for position, item in enumerate(request.accounts):
+        try:
+            validate_create_account(item)
+        except HTTPException as e:
+            results.append({"error": e.detail})
+        else:
+            results.append({})
+            valid.append((position, item))
+    
+    account_ids = repository.next_ids("account", len(valid))
+    deposits = [(position, item, account_id) for (position, item), account_id in zip(valid, account_ids)
+                if item.initial_deposit > 0]
+    txn_ids = repository.next_ids("transaction", len(deposits))
+    new_accounts = []
+    for (position, item), account_id in zip(valid, account_ids):
+        account = new_account_record(item, account_id)
+        new_accounts.append(account)
+        results[position] = {"id": account_id, "account": account}
+    repository.create_accounts(
+        new_accounts,
+        [initial_deposit_record(item, account_id, txn_id) for (_, item, account_id), txn_id in zip(deposits, txn_ids)],
+    )
+    return results
+
+@app.post("/accounts/bulk-lock", response_model=List[AccountResult])
+def lock_accounts_bulk(request: BatchAccountsRequest):
+    """Lock several accounts at once, optionally only those of one customer"""
+    account_ids = request.ids
+    if request.customer_id:
+        owned = repository.get_accounts(request.ids)
+        account_ids = [acc_id for acc_id, account in owned.items() if account["customer_id"] == request.customer_id]
+    locked = repository.set_accounts_status(account_ids, "locked")
+    return [{"id": account_id, "account": locked[account_id]} if account_id in locked
+            else {"id": account_id, "error": "Account not found"}
+            for account_id in request.ids]
+
+@app.post("/transactions/ingest", response_model=IngestReport)
+async def ingest_transactions(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    chunk_size: int = Query(DEFAULT_CHUNK_SIZE, ge=1, le=10000),
+):
+    """Apply an NDJSON or CSV transaction feed streamed in the request body.
+
+    The format is the ``format`` parameter, else the Content-Type
+    (application/x-ndjson or text/csv). Rows are applied in chunks of
+    ``chunk_size`` as the body arrives, each chunk all or none (see
+    ingest.py); rows whose reference was already applied to their account
+    are skipped. The report counts applied, duplicate and rejected rows and
+    the throughput in rows per second.
+    """
+    try:
+        ingestor = TransactionIngestor(repository, format or detect_format(request.headers.get("content-type", "")),
+                                       chunk_size)
+        # Chunks are written synchronously; keep the writes off the event loop
+        async for data in request.stream():
+            await run_in_threadpool(ingestor.feed, data)
+        report = await run_in_threadpool(ingestor.finish)
+    except FeedError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    logger.info("Ingested %d rows (%d applied, %d duplicates, %d rejected) at %.0f rows/s",
+                report["rows"], report["applied"], report["duplicates"], report["rejected"],
+                report["rows_per_second"])
+    return report
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    return {"status": "healthy", "timestamp": datetime.now().isoformat(), "worker": os.getpid()}
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Request, span and latency metrics of this worker in the Prometheus text format"""
+    return PlainTextResponse(telemetry.registry.render(), media_type=telemetry.PROMETHEUS_CONTENT_TYPE)
 
 if __name__ == "__main__":
     import uvicorn
+    parser = argparse.ArgumentParser(description="Run the Mock Banking API")
+    parser.add_argument("--host", default=os.getenv("BANKING_HOST", "0.0.0.0"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("BANKING_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=int(os.getenv("BANKING_WORKERS", "1")),
+                        help="worker processes; more than one needs BANKING_STORAGE=sqlite")
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+    if args.workers > 1 and os.getenv("BANKING_STORAGE", "memory").lower() == "memory":
+        parser.error("--workers > 1 needs shared storage: set BANKING_STORAGE=sqlite")
+
     print("Starting Mock Banking API...")
-    print("API will be available at: http://localhost:8000")
-    print("API documentation at: http://localhost:8000/docs")
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    print(f"API will be available at: http://localhost:{args.port}")
+    print(f"API documentation at: http://localhost:{args.port}/docs")
+    # Keep idle connections open longer than the MCP server's pooled client holds them
+    if args.workers == 1:
+        uvicorn.run(app, host=args.host, port=args.port, timeout_keep_alive=30, log_level=args.log_level)
+    else:
+        from uvicorn.supervisors import Multiprocess
+        # Each worker process imports the app and opens its own connection to the
+        # shared database. uvicorn binds the shared socket with protocol 0, which
+        # keeps asyncio from setting TCP_NODELAY on accepted connections, so every
+        # response would wait out the client's delayed ACK (~40 ms); bind it as TCP.
+        config = uvicorn.Config("banking_api:app", host=args.host, port=args.port, workers=args.workers,
+                                timeout_keep_alive=30, log_level=args.log_level)
+        sock = socket.socket(socket.AF_INET6 if ":" in args.host else socket.AF_INET, socket.SOCK_STREAM,
+                             socket.IPPROTO_TCP)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        sock.bind((args.host, args.port))
+        sock.set_inheritable(True)
+        Multiprocess(config, target=uvicorn.Server(config).run, sockets=[sock]).run()
@@ -0,0 +1,159 @@
+"""
+Async HTTP client for the Mock Banking API
+
+MCP tools share one pooled, keep-alive httpx client so concurrent agent
+sessions reuse connections instead of opening a new one per call and never
+block the MCP server's event loop. GET responses that carry an ETag are
+kept in a bounded LRU cache and revalidated with If-None-Match, so
+unchanged data comes back as an empty 304 instead of being serialized and
+transferred again. Pool size, timeouts, retries and the cache are
+configured with environment variables. Every request runs in a span of the
+current trace, carries it on in a traceparent header and is counted per
+calling tool in the MCP server's metrics (see telemetry.py), and names the
+session's customer in X-Customer-Id for the API's per-customer rate limit.
+Requests the API rejects under load (429 or 503 with Retry-After) are
+repeated after the requested delay, with jitter (see admission.py).
+Configuration:
+
+    BANKING_API_URL               base URL of the banking API (http://127.0.0.1:8000)
+    BANKING_API_POOL_SIZE         maximum number of open connections (100)
+    BANKING_API_TIMEOUT           request timeout in seconds (10)
+    BANKING_API_RETRIES           retries per request on connection errors (2)
+    BANKING_API_OVERLOAD_RETRIES  retries per request rejected under load (2)
+    BANKING_API_KEEPALIVE         seconds an idle connection is kept for reuse (20)
+    BANKING_API_CACHE_SIZE        GET responses kept for revalidation, 0 disables (10000)
+"""
+
+import os
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+import telemetry
+from admission import RetryAfterTransport
+
+# Requests are made on behalf of MCP tools, so they are spans of the MCP server
+tracer = telemetry.Tracer("mcp-server")
+backend_requests = telemetry.registry.counter(
+    "mcp_backend_requests_total", "Banking API requests by calling tool, method and status", ["tool", "method", "status"])
+backend_duration = telemetry.registry.histogram(
+    "mcp_backend_request_duration_seconds", "Banking API request latency by calling tool", ["tool", "method"])
+
+
+class BankingAPIClient:
+    """Thin wrapper around a shared httpx.AsyncClient for the banking API"""
+
+    def __init__(self, base_url: str, pool_size: int = 100, timeout: float = 10.0, retries: int = 2,
+                 cache_size: int = 10000, overload_retries: int = 2):
+        self.base_url = base_url
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.retries = retries
+        self.overload_retries = overload_retries
+        self.cache_size = cache_size
+        self._client: Optional[httpx.AsyncClient] = None
+        self._cache: "OrderedDict[Tuple[str, Tuple], httpx.Response]" = OrderedDict()
+        # Revalidations answered with 304 ("hits") or with a full response ("misses")
+        self.cache_stats = Counter()
+
+    @classmethod
+    def from_env(cls) -> "BankingAPIClient":
+        return cls(
+            base_url=os.getenv("BANKING_API_URL", "http://127.0.0.1:8000"),
+            pool_size=int(os.getenv("BANKING_API_POOL_SIZE", "100")),
+            timeout=float(os.getenv("BANKING_API_TIMEOUT", "10")),
+            retries=int(os.getenv("BANKING_API_RETRIES", "2")),
+            cache_size=int(os.getenv("BANKING_API_CACHE_SIZE", "10000")),
+            overload_retries=int(os.getenv("BANKING_API_OVERLOAD_RETRIES", "2")),
+        )
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            # Expire idle connections before the API's keep-alive timeout closes them
+            limits = httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size,
+                                  keepalive_expiry=float(os.getenv("BANKING_API_KEEPALIVE", "20")))
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                limits=limits,
+                timeout=httpx.Timeout(self.timeout),
+                # Retries cover connection failures and rejections, which are safe to repeat
+                transport=RetryAfterTransport(httpx.AsyncHTTPTransport(limits=limits, retries=self.retries),
+                                              retries=self.overload_retries),
+            )
+        return self._client
+
+    async def _send(self, method: str, path: str, headers: Optional[Dict[str, str]] = None,
+                    **kwargs: Any) -> httpx.Response:
+        """Send one request in a span, passing the trace on to the API"""
+        with tracer.span("backend.request", method=method, path=path) as current:
+            tool = current.find("tool") or "none"
+            headers = {**(headers or {}), "traceparent": current.traceparent}
+            customer = current.find("customer")
+            if customer:
+                headers["X-Customer-Id"] = customer
+            status: Any = "error"
+            started = time.perf_counter()
+            try:
+                response = await self.client.request(method, path, headers=headers, **kwargs)
+                status = response.status_code
+                current.set(status=status)
+                return response
+            finally:
+                backend_requests.inc(tool=tool, method=method, status=status)
+                backend_duration.observe(time.perf_counter() - started, tool=tool, method=method)
+
+    async def get(self, path: str, params: Optional[Dict[str, Any]] = None) -> httpx.Response:
+        """Send a GET request, dropping query parameters that are None.
+
+        GETs are idempotent, so a request that fails on a connection the server
+        has just closed is retried on a fresh connection. A cached response is
+        revalidated and returned as is when the server answers 304.
+        """
+        if params:
+            params = {key: value for key, value in params.items() if value is not None}
+        key = (path, tuple(sorted(params.items())) if params else ())
+        cached = self._cache.get(key)
+        headers = {"If-None-Match": cached.headers["etag"]} if cached is not None else None
+        for attempt in range(self.retries + 1):
+            try:
+                response = await self._send("GET", path, params=params, headers=headers)
+                break
+            except (httpx.ReadError, httpx.RemoteProtocolError):
+                if attempt == self.retries:
+                    raise
+
+        if cached is not None:
+            self.cache_stats["hits" if response.status_code == 304 else "misses"] += 1
+            if response.status_code == 304:
+                # A concurrent request may have replaced or dropped the entry meanwhile
+                if key in self._cache:
+                    self._cache.move_to_end(key)
+                return cached
+        if response.status_code == 200 and "etag" in response.headers and self.cache_size:
+            self._cache[key] = response
+            self._cache.move_to_end(key)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        else:
+            self._cache.pop(key, None)
+        return response
+
+    async def post(self, path: str, json: Any = None) -> httpx.Response:
+        """Send a POST request with a JSON body.
+
+        POSTs may not be idempotent, so only connection failures and rejections
+        under load, which never reached the API, are retried (by the transport).
+        """
+        return await self._send("POST", path, json=json)
+
+    async def aclose(self):
+        self._cache.clear()
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+banking_api = BankingAPIClient.from_env()
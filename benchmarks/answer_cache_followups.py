@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Answer cache check for follow-up questions
+
+Runs chat turns through client.py, the MCP server and the banking API with
+the scripted LLM backend, as run.py's agent tier does, and checks that
+only the first question of a conversation is answered from the answer
+cache: a question asked first in a new conversation hits the cache, while
+the same question asked as a follow-up misses it and reaches the LLM.
+
+    python benchmarks/answer_cache_followups.py
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run import ROOT, entry_for, load_corpus, prepare_database, start_api, start_mcp
+
+
+async def check(corpus, dataset):
+    import client
+    from llm_backends import ScriptedBackend
+    from prompt_manager import PromptManager
+
+    entries = [entry_for(entry, dataset, 0) for entry in corpus]
+    client.llm_backend = ScriptedBackend({entry["query"]: entry for entry in entries})
+    client.answer_cache.clear()
+    question, other = entries[0]["query"], entries[1]["query"]
+
+    async def turn(prompts, message):
+        calls = client.llm_backend.calls
+        _, stats = await client.chat_with_tools(message, prompts=prompts)
+        return stats.counts["answer_cache_hits"], client.llm_backend.calls - calls
+
+    errors = []
+    # (conversation, question, expected cache hits)
+    script = [("first", question, 0), ("second", question, 1), ("followup", other, 0), ("followup", question, 0)]
+    conversations = {}
+    for name, message, expected in script:
+        prompts = conversations.setdefault(name, PromptManager(client.prompt_manager.path))
+        hits, llm_calls = await turn(prompts, message)
+        print(f"  {name:<9} turn {len(prompts.turns)}: {message!r}: {hits} cache hits, {llm_calls} LLM calls")
+        if hits != expected or (llm_calls == 0) != bool(expected):
+            errors.append(f"turn {len(prompts.turns)} of the {name} conversation: expected {expected} cache hits, "
+                          f"got {hits} with {llm_calls} LLM calls")
+    await client.close_mcp_session()
+    return errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=100, help="dataset size in customers")
+    parser.add_argument("--transactions-per-account", type=int, default=20)
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "benchmarks", "corpus.jsonl"))
+    parser.add_argument("--api-port", type=int, default=8100)
+    parser.add_argument("--mcp-port", type=int, default=8110)
+    args = parser.parse_args()
+
+    # server.py and client.py read these at import time; the MCP server runs in
+    # this process, so a throwaway secret signs and verifies the session token
+    os.environ["BANKING_API_URL"] = f"http://127.0.0.1:{args.api_port}"
+    os.environ["MCP_SERVER_URL"] = f"http://127.0.0.1:{args.mcp_port}/mcp"
+    os.environ.setdefault("BANKING_MCP_TOKEN_SECRET", secrets.token_urlsafe())
+    os.chdir(ROOT)
+
+    corpus = load_corpus(args.corpus)
+    db_path, dataset = prepare_database(args)
+    os.environ["DEMO_CUSTOMER_ID"] = dataset.customer_id(0)
+    api = start_api(db_path, args.api_port)
+    try:
+        start_mcp(args.mcp_port, Counter())
+        errors = asyncio.run(check(corpus, dataset))
+    finally:
+        api.terminate()
+        api.wait()
+    for error in errors:
+        print(f"FAIL: {error}")
+    if errors:
+        raise SystemExit(1)
+    print("Only first questions were answered from the cache")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Request validation and ownership checks of the banking API
+
+Runs the API in-process on each storage backend, seeded with the mock data,
+and sends requests that must be rejected: malformed input must get a 4xx
+instead of a wrong or empty 200, and per-account reads on behalf of a
+customer who does not own the account must be refused. Well-formed
+counterparts of the same requests must succeed.
+
+    python benchmarks/api_checks.py
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from fastapi.testclient import TestClient
+
+import banking_api
+from repository import encode_cursor
+
+# (description, method, path, query parameters or JSON body, expected status)
+CHECKS = [
+    ("first page of transactions", "GET", "/accounts/ACC001/transactions", {"limit": 1}, 200),
+    ("cursor with a valid date", "GET", "/accounts/ACC001/transactions",
+     {"cursor": encode_cursor("2024-01-20T00:00:00Z", "TXN999")}, 200),
+    ("cursor with a malformed date", "GET", "/accounts/ACC001/transactions",
+     {"cursor": encode_cursor("yesterday", "TXN001")}, 400),
+    ("cursor that is not base64 JSON", "GET", "/accounts/ACC001/transactions", {"cursor": "not-a-cursor"}, 400),
+    ("summary for the account owner", "GET", "/accounts/ACC001/summary", {"customer_id": "CUST001"}, 200),
+    ("summary for another customer", "GET", "/accounts/ACC001/summary", {"customer_id": "CUST002"}, 404),
+    ("month summary for the account owner", "GET", "/accounts/ACC001/summary/2024-01", {"customer_id": "CUST001"}, 200),
+    ("month summary for another customer", "GET", "/accounts/ACC001/summary/2024-01", {"customer_id": "CUST002"}, 404),
+    ("month summary of month 13", "GET", "/accounts/ACC001/summary/2024-13", {}, 400),
+    ("document search with dates", "GET", "/customers/CUST001/documents/search",
+     {"q": "statement", "from": "2024-01-01", "to": "2024-12-31T23:59:59Z"}, 200),
+    ("document search with a malformed from", "GET", "/customers/CUST001/documents/search",
+     {"q": "statement", "from": "last month"}, 400),
+    ("document search with a malformed to", "GET", "/customers/CUST001/documents/search",
+     {"q": "statement", "to": "2024-02-30"}, 400),
+    ("document with a date", "POST", "/customers/CUST001/documents",
+     {"type": "note", "content": "Checked", "date": "2024-06-30"}, 200),
+    ("document without a date", "POST", "/customers/CUST001/documents", {"type": "note", "content": "Checked"}, 200),
+    ("document with a malformed date", "POST", "/customers/CUST001/documents",
+     {"type": "note", "content": "Checked", "date": "June 30th"}, 400),
+]
+
+
+def run_checks(client):
+    failures = []
+    for description, method, path, data, expected in CHECKS:
+        if method == "GET":
+            response = client.get(path, params=data)
+        else:
+            response = client.request(method, path, json=data)
+        if response.status_code != expected:
+            failures.append(f"{description}: {method} {path} answered {response.status_code}, expected {expected}: "
+                            f"{response.text[:120]}")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.parse_args()
+
+    failures = []
+    for storage in ("memory", "sqlite"):
+        os.environ["BANKING_STORAGE"] = storage
+        os.environ["BANKING_DB_PATH"] = os.path.join(tempfile.mkdtemp(prefix="api-checks-"), "banking.db")
+        with TestClient(banking_api.app, raise_server_exceptions=False) as client:
+            storage_failures = run_checks(client)
+        print(f"{storage}: {len(CHECKS) - len(storage_failures)} of {len(CHECKS)} checks passed")
+        failures.extend(f"{storage}: {failure}" for failure in storage_failures)
+    for failure in failures:
+        print(f"  FAIL: {failure}")
+    if failures:
+        raise SystemExit(1)
+    print("Every request was answered as expected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Concurrent read/write check for the repositories
+
+One writer thread ingests transactions (in new months, so the aggregates
+grow new keys) and adds documents with new words, while reader threads
+share the repository and read account summaries, transaction pages,
+document searches and customer documents. Any exception in a reader, such
+as a dict changing size while a read iterates it, fails the run. Reports
+reads per second.
+
+    python benchmarks/concurrent_reads.py --storage memory --readers 4 --writes 2000
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from bulk_load import SyntheticDataset
+from repository import InMemoryRepository, SQLiteRepository
+
+CUSTOMERS = 20
+
+
+def write(repository, dataset, writes, done):
+    try:
+        for n in range(writes):
+            customer = n % CUSTOMERS
+            account_id = dataset.customer_account_ids(customer)[0]
+            # A new month and type every few writes, so the aggregates get new keys
+            repository.ingest_transactions([{
+                "id": repository.next_id("transaction"), "account_id": account_id, "type": f"fee-{n % 7}",
+                "amount": -1.0, "description": "Concurrent read check", "status": "completed",
+                "date": f"{2030 + n // 12 % 50}-{n % 12 + 1:02d}-15T12:00:00Z", "reference": f"READ-CHECK-{n}",
+            }])
+            repository.add_document({
+                "id": repository.next_id("document"), "customer_id": dataset.customer_id(customer),
+                "type": "note", "date": "2024-06-30", "content": f"statement note word{n} account {account_id}",
+            })
+    finally:
+        done.set()
+
+def read(repository, dataset, done, counts, errors):
+    n = 0
+    try:
+        while not done.is_set():
+            customer = n % CUSTOMERS
+            account_id = dataset.customer_account_ids(customer)[0]
+            repository.get_account_summary(account_id)
+            repository.get_account_summary(account_id, "2030-01", "2040-12")
+            repository.page_transactions(account_id, 20)
+            repository.search_documents(dataset.customer_id(customer), "statement note account", 10)
+            repository.get_customer_documents(dataset.customer_id(customer))
+            n += 1
+    except Exception as e:
+        errors.append(f"{type(e).__name__}: {e}")
+    counts.append(n * 5)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage", choices=["memory", "sqlite"], default="memory")
+    parser.add_argument("--readers", type=int, default=4, help="reader threads")
+    parser.add_argument("--writes", type=int, default=2000, help="transactions and documents written")
+    args = parser.parse_args()
+
+    if args.storage == "memory":
+        repository = InMemoryRepository({}, {}, {}, {})
+    else:
+        repository = SQLiteRepository(os.path.join(tempfile.mkdtemp(prefix="concurrent-reads-"), "banking.db"))
+    dataset = SyntheticDataset(repository, CUSTOMERS, transactions_per_account=5)
+    dataset.load(repository)
+
+    done = threading.Event()
+    counts, errors = [], []
+    readers = [threading.Thread(target=read, args=(repository, dataset, done, counts, errors))
+               for _ in range(args.readers)]
+    started = time.perf_counter()
+    for reader in readers:
+        reader.start()
+    write(repository, dataset, args.writes, done)
+    for reader in readers:
+        reader.join()
+    elapsed = time.perf_counter() - started
+    repository.close()
+
+    print(f"{args.storage}: {args.readers} readers made {sum(counts)} reads during {args.writes} writes "
+          f"in {elapsed:.2f}s ({sum(counts) / elapsed:,.0f} reads/s)")
+    for error in errors[:10]:
+        print(f"  FAIL: {error}")
+    if errors:
+        raise SystemExit(1)
+    print("No read failed")
+
+
+if __name__ == "__main__":
+    main()
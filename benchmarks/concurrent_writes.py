@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Concurrent write check for the repositories
+
+Several writers (threads sharing one repository, or processes with their own
+connection to one SQLite database) create accounts with an opening deposit
+and lock accounts at the same time. Afterwards it checks that no write was
+lost or duplicated: every created account exists exactly once with a unique
+account number and exactly one deposit, ids increase within each writer, and
+every locked account is locked. Reports writes per second.
+
+    python benchmarks/concurrent_writes.py --storage sqlite --processes 4 --threads 2 --accounts 500
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from id_allocator import account_number, id_number
+from repository import InMemoryRepository, SQLiteRepository
+
+CUSTOMERS = [f"CUST{n:03d}" for n in range(1, 11)]
+LOCK_EVERY = 5
+
+
+def seed(repository):
+    repository.bulk_load(customers=[
+        {"id": customer_id, "name": "Load Test", "email": "load@test", "phone": "-", "address": "-",
+         "date_of_birth": "1990-01-01", "ssn": "***", "risk_profile": "moderate", "created_date": "2024-01-01"}
+        for customer_id in CUSTOMERS
+    ])
+    repository.reserve_ids("customer", len(CUSTOMERS))
+
+def write(repository, writer, accounts, created):
+    """Create ``accounts`` accounts with a deposit, locking an earlier one every LOCK_EVERY writes"""
+    for n in range(accounts):
+        account_id = repository.next_id("account")
+        account = {
+            "id": account_id, "customer_id": CUSTOMERS[n % len(CUSTOMERS)], "account_number": account_number(account_id),
+            "type": "checking", "balance": 100.0, "currency": "USD", "status": "active",
+            "created_date": "2024-01-01", "interest_rate": 0.01, "overdraft_limit": 0.0,
+        }
+        deposit = {
+            "id": repository.next_id("transaction"), "account_id": account_id, "type": "deposit", "amount": 100.0,
+            "description": f"Initial deposit by writer {writer}", "date": datetime.now().isoformat() + "Z",
+            "status": "completed", "reference": f"INIT-{account_id}",
+        }
+        repository.create_accounts([account], [deposit])
+        created.append(account_id)
+        if n % LOCK_EVERY == LOCK_EVERY - 1:
+            repository.set_account_status(created[n - LOCK_EVERY + 1], "locked")
+
+def run_threads(repository, first_writer, threads, accounts):
+    """Run writer threads on one repository; returns the account ids each created"""
+    created = [[] for _ in range(threads)]
+    workers = [threading.Thread(target=write, args=(repository, first_writer + k, accounts, created[k]))
+               for k in range(threads)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return created
+
+def process_main(path, first_writer, threads, accounts, results):
+    repository = SQLiteRepository(path)
+    results.put(run_threads(repository, first_writer, threads, accounts))
+    repository.close()
+
+def check(repository, created):
+    errors = []
+    all_ids = [account_id for ids in created for account_id in ids]
+    if len(set(all_ids)) != len(all_ids):
+        errors.append(f"{len(all_ids) - len(set(all_ids))} duplicate account ids handed out")
+    for ids in created:
+        numbers = [id_number("account", account_id) for account_id in ids]
+        if numbers != sorted(numbers):
+            errors.append("account ids of a writer are not increasing")
+            break
+    accounts = repository.get_accounts(all_ids)
+    if len(accounts) != len(set(all_ids)):
+        errors.append(f"{len(set(all_ids)) - len(accounts)} created accounts are missing")
+    numbers = {account["account_number"] for account in accounts.values()}
+    if len(numbers) != len(accounts):
+        errors.append(f"{len(accounts) - len(numbers)} duplicate account numbers")
+    for account_id in accounts:
+        count = repository.get_account_summary(account_id)["transaction_count"]
+        if count != 1:
+            errors.append(f"{account_id} has {count} deposits")
+    for ids in created:
+        for n in range(LOCK_EVERY - 1, len(ids), LOCK_EVERY):
+            account = accounts.get(ids[n - LOCK_EVERY + 1])
+            if account is not None and account["status"] != "locked":
+                errors.append(f"{account['id']} was not locked")
+    return len(all_ids), errors
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--storage", choices=["memory", "sqlite"], default="sqlite")
+    parser.add_argument("--processes", type=int, default=4, help="writer processes (sqlite only)")
+    parser.add_argument("--threads", type=int, default=2, help="writer threads per process")
+    parser.add_argument("--accounts", type=int, default=250, help="accounts created per writer")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    if args.storage == "memory":
+        repository = InMemoryRepository({}, {}, {}, {})
+        seed(repository)
+        started = time.perf_counter()
+        created = run_threads(repository, 0, args.threads, args.accounts)
+        writers = args.threads
+    else:
+        directory = tempfile.mkdtemp(prefix="concurrent-writes-")
+        path = os.path.join(directory, "banking.db")
+        repository = SQLiteRepository(path)
+        seed(repository)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target=process_main,
+                                             args=(path, k * args.threads, args.threads, args.accounts, results))
+                     for k in range(args.processes)]
+        started = time.perf_counter()
+        for process in processes:
+            process.start()
+        created = [ids for _ in processes for ids in results.get()]
+        for process in processes:
+            process.join()
+        writers = args.processes * args.threads
+    elapsed = time.perf_counter() - started
+
+    count, errors = check(repository, created)
+    # Each account is one create (account and deposit together), plus a lock every LOCK_EVERY accounts
+    writes = count + count // LOCK_EVERY
+    print(f"{args.storage}: {writers} writers created {count} accounts and locked {count // LOCK_EVERY} "
+          f"in {elapsed:.2f}s ({writes / elapsed:,.0f} writes/s)")
+    for error in errors[:20]:
+        print(f"  ERROR {error}")
+    repository.close()
+    if errors:
+        sys.exit(1)
+    print("  no lost or duplicated writes")
+
+
+if __name__ == "__main__":
+    main()
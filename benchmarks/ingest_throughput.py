@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Throughput of streaming transaction ingestion
+
+Writes a synthetic daily feed of --rows transactions over the accounts of
+the benchmark dataset (see run.py), as NDJSON and CSV, and loads it into a
+copy of the dataset's SQLite database with ingest.py: directly, at each
+--chunk-sizes, and streamed through the API's POST /transactions/ingest.
+Each load is run twice; the second run finds every reference already
+applied, which is what reloading a feed after a failure costs. After the
+first direct load it checks that every account's balance moved by exactly
+the sum of its feed rows.
+
+    python benchmarks/ingest_throughput.py --rows 200000 --chunk-sizes 100 1000 10000
+"""
+
+import argparse
+import json
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run import ROOT, prepare_database, start_api
+
+sys.path.insert(0, ROOT)
+
+from ingest import ingest_file, post_file
+from repository import SQLiteRepository
+
+
+def write_feeds(directory, rows, accounts, seed):
+    """Write the feed as feed.ndjson and feed.csv; returns the expected balance change per account"""
+    rng = random.Random(seed)
+    totals = defaultdict(float)
+    with open(os.path.join(directory, "feed.ndjson"), "w") as ndjson, \
+            open(os.path.join(directory, "feed.csv"), "w") as csv_feed:
+        csv_feed.write("account_id,type,amount,date,reference,description\n")
+        for n in range(rows):
+            account_id = f"ACC{rng.randint(1, accounts):03d}"
+            txn_type = rng.choice(["deposit", "withdrawal", "transfer"])
+            amount = round(rng.uniform(5, 2500), 2) * (1 if txn_type == "deposit" else -1)
+            row = {"account_id": account_id, "type": txn_type, "amount": amount,
+                   "date": f"2024-06-30T{n * 86400 // rows // 3600:02d}:{n * 86400 // rows // 60 % 60:02d}:00Z",
+                   "reference": f"FEED-20240630-{n}", "description": f"Daily feed {txn_type}"}
+            totals[account_id] += amount
+            ndjson.write(json.dumps(row) + "\n")
+            csv_feed.write(",".join(str(row[field]) for field in
+                                    ("account_id", "type", "amount", "date", "reference", "description")) + "\n")
+    return totals
+
+
+def balances(db_path):
+    with sqlite3.connect(db_path) as conn:
+        return dict(conn.execute("SELECT id, balance FROM accounts"))
+
+
+def report_line(label, report):
+    print(f"{label:<30}  {report['rows']:>9,}  {report['applied']:>9,}  {report['duplicates']:>10,}  "
+          f"{report['rejected']:>8,}  {report['seconds']:>8.2f}  {report['rows_per_second']:>10,.0f}", flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100_000, help="rows in the feed")
+    parser.add_argument("--chunk-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--customers", type=int, default=1000, help="dataset size in customers")
+    parser.add_argument("--transactions-per-account", type=int, default=20)
+    parser.add_argument("--api-port", type=int, default=8100)
+    parser.add_argument("--skip-api", action="store_true", help="only load directly into the database")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    db_path, dataset = prepare_database(args)
+    accounts = args.customers * dataset.accounts_per_customer
+    print(f"{'load':<30}  {'rows':>9}  {'applied':>9}  {'duplicates':>10}  {'rejected':>8}  {'seconds':>8}  "
+          f"{'rows/s':>10}")
+    with tempfile.TemporaryDirectory() as directory:
+        expected = write_feeds(directory, args.rows, accounts, args.seed)
+        copy = os.path.join(directory, "ingest.db")
+        runs = [(f"{feed_format}, chunks of {chunk_size}", feed_format, chunk_size)
+                for chunk_size in args.chunk_sizes for feed_format in ("ndjson", "csv")]
+        for n, (label, feed_format, chunk_size) in enumerate(runs):
+            shutil.copy(db_path, copy)
+            before = balances(copy) if n == 0 else None
+            feed = os.path.join(directory, f"feed.{feed_format}")
+            for attempt in ("", " again"):
+                repository = SQLiteRepository(copy)
+                try:
+                    report_line(label + attempt, ingest_file(repository, feed, feed_format, chunk_size))
+                finally:
+                    repository.close()
+                if before is not None:
+                    after = balances(copy)
+                    wrong = [account_id for account_id, total in expected.items()
+                             if abs(after[account_id] - before[account_id] - total) > 0.01]
+                    if wrong:
+                        raise SystemExit(f"Balances of {len(wrong)} accounts are off, e.g. {wrong[0]}")
+                    before = None
+            os.remove(copy)
+
+        if not args.skip_api:
+            shutil.copy(db_path, copy)
+            api = start_api(copy, args.api_port)
+            try:
+                for attempt in ("", " again"):
+                    report_line("ndjson via API" + attempt,
+                                post_file(f"http://127.0.0.1:{args.api_port}", os.path.join(directory, "feed.ndjson"),
+                                          "ndjson"))
+            finally:
+                api.terminate()
+                api.wait()
+    print("Balances match the feed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Latency of the banking API under overload, with and without admission control
+
+Sends the api tier requests of the corpus (see run.py) at fixed offered
+rates, open loop: requests start on schedule whether or not earlier ones
+have finished, as independent agent sessions would. Latency is measured
+from the scheduled start, so waiting for a connection counts too. Each rate
+is run against the API with admission control off (no bound on requests in
+flight) and on (the configured BANKING_MAX_IN_FLIGHT / BANKING_MAX_QUEUE /
+BANKING_QUEUE_TIMEOUT). Requests answered 429 or 503 are counted as shed, not
+retried, and left out of the latency percentiles.
+
+    python benchmarks/overload.py --rates 200 400 800 1600 --duration 10
+
+Without admission control, p99 grows with the overload and the duration of
+the run; with it, p99 stays near the queue timeout and the excess is shed.
+Rejecting a request still costs the API some CPU; run the load generator on
+cores the API does not use, or far beyond the API's capacity the generator
+and the rejections take the CPU the admitted requests need.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from typing import Optional
+from urllib.parse import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run import TOOL_REQUESTS, entry_for, entry_tool_calls, load_corpus, percentile, prepare_database, start_api
+
+
+class RawClient:
+    """Keep-alive HTTP/1.1 client on bare asyncio streams.
+
+    The load generator shares the machine with the API, so it must cost far
+    less per request than the API does to offer more than the API can serve.
+    """
+
+    def __init__(self, host: str, port: int, connections: int):
+        self.host = host
+        self.port = port
+        self.slots = asyncio.Semaphore(connections)
+        self.idle = []
+
+    async def request(self, method: str, target: str, body: Optional[bytes] = None) -> int:
+        """Send a request and return the response status"""
+        async with self.slots:
+            reader, writer = self.idle.pop() if self.idle else await asyncio.open_connection(self.host, self.port)
+            try:
+                head = f"{method} {target} HTTP/1.1\r\nHost: {self.host}\r\n"
+                if body is not None:
+                    head += f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n"
+                writer.write(head.encode() + b"\r\n" + (body or b""))
+                status = int((await reader.readline()).split()[1])
+                length = 0
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b""):
+                        break
+                    name, _, value = line.partition(b":")
+                    if name.lower() == b"content-length":
+                        length = int(value)
+                await reader.readexactly(length)
+            except BaseException:
+                writer.close()
+                raise
+            self.idle.append((reader, writer))
+            return status
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+
+
+async def offer(args, rate, corpus, dataset):
+    """Send requests at ``rate`` per second for ``args.duration`` seconds"""
+    rng = random.Random(args.seed)
+    corpus = [entry for entry in corpus if entry_tool_calls(entry)]
+    latencies, shed, errors = [], 0, 0
+    http = RawClient("127.0.0.1", args.api_port, args.connections)
+
+    async def request(scheduled, method, target, body):
+        nonlocal shed, errors
+        try:
+            status = await asyncio.wait_for(http.request(method, target, body), args.timeout)
+        except (OSError, ValueError, IndexError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+            errors += 1
+            return
+        if status in (429, 503):
+            shed += 1
+        elif status >= 400:
+            errors += 1
+        else:
+            latencies.append(time.perf_counter() - scheduled)
+
+    tasks = []
+    started = time.perf_counter()
+    for n in range(int(rate * args.duration)):
+        customer_index = rng.randrange(args.customers)
+        call = entry_tool_calls(entry_for(rng.choice(corpus), dataset, customer_index))[0]
+        method, path, params = TOOL_REQUESTS[call["name"]](dataset.customer_id(customer_index), call["arguments"])
+        params = {key: value for key, value in params.items() if value is not None}
+        if method == "GET":
+            target, body = path + ("?" + urlencode(params) if params else ""), None
+        else:
+            target, body = path, json.dumps(params).encode()
+        scheduled = started + n / rate
+        await asyncio.sleep(max(0.0, scheduled - time.perf_counter()))
+        tasks.append(asyncio.create_task(request(scheduled, method, target, body)))
+    sent = time.perf_counter() - started
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+    http.close()
+
+    latencies.sort()
+    return {
+        "offered": len(tasks) / sent if sent else 0.0,
+        "goodput": len(latencies) / elapsed,
+        "shed": shed / len(tasks),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rates", type=float, nargs="+", default=[200, 400, 800, 1600], help="offered requests/s")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds per rate")
+    parser.add_argument("--max-in-flight", type=int, default=16, help="BANKING_MAX_IN_FLIGHT with admission on")
+    parser.add_argument("--max-queue", type=int, default=32, help="BANKING_MAX_QUEUE with admission on")
+    parser.add_argument("--queue-timeout", type=float, default=0.1, help="BANKING_QUEUE_TIMEOUT with admission on")
+    parser.add_argument("--connections", type=int, default=512, help="client connection limit")
+    parser.add_argument("--timeout", type=float, default=60.0, help="request timeout in seconds")
+    parser.add_argument("--customers", type=int, default=1000, help="dataset size in customers")
+    parser.add_argument("--transactions-per-account", type=int, default=20)
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus.jsonl"))
+    parser.add_argument("--api-port", type=int, default=8100)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    corpus = load_corpus(args.corpus)
+    db_path, dataset = prepare_database(args)
+    modes = {
+        "off": {"BANKING_MAX_IN_FLIGHT": "0"},
+        "on": {"BANKING_MAX_IN_FLIGHT": str(args.max_in_flight), "BANKING_MAX_QUEUE": str(args.max_queue),
+               "BANKING_QUEUE_TIMEOUT": str(args.queue_timeout)},
+    }
+    print(f"{'admission':>9}  {'offered/s':>9}  {'goodput/s':>9}  {'shed':>6}  {'p50 ms':>8}  {'p99 ms':>8}  {'errors':>6}")
+    for mode, settings in modes.items():
+        # start_api passes its environment on to the API
+        os.environ.update(settings)
+        api = start_api(db_path, args.api_port)
+        try:
+            for rate in args.rates:
+                result = asyncio.run(offer(args, rate, corpus, dataset))
+                print(f"{mode:>9}  {result['offered']:>9,.0f}  {result['goodput']:>9,.0f}  {result['shed']:>6.1%}  "
+                      f"{result['p50_ms']:>8.1f}  {result['p99_ms']:>8.1f}  {result['errors']:>6}", flush=True)
+        finally:
+            api.terminate()
+            api.wait()
+            for name in settings:
+                del os.environ[name]
+
+
+if __name__ == "__main__":
+    main()
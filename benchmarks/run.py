@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Load-testing and benchmark harness for the banking agent stack
+
+Replays the request corpus (benchmarks/corpus.jsonl) against three tiers:
+
+    api     direct HTTP requests to banking_api.py
+    mcp     MCP tool calls to server.py, one session per virtual user
+    agent   full client.py agent turns, with the scripted LLM backend
+            (llm_backends.py) standing in for the Mistral API
+
+The harness seeds a SQLite database of the requested size with bulk_load.py
+(cached in benchmarks/.data), starts the API in a subprocess and the MCP
+server in a background thread, and reports p50/p95/p99 latency, throughput
+and backend calls per tool at the requested concurrency.
+
+    python benchmarks/run.py --tier all --concurrency 16 --customers 10000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextvars import ContextVar
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+from bulk_load import SyntheticDataset
+from repository import SQLiteRepository
+
+# HTTP requests the api tier sends for each corpus tool call
+TOOL_REQUESTS = {
+    "list_accounts": lambda customer, args: ("GET", f"/customers/{customer}/accounts", {}),
+    "get_account_balance": lambda customer, args: ("GET", f"/customers/{customer}/accounts/{args['account_id']}", {}),
+    "list_transactions": lambda customer, args: ("GET", f"/accounts/{args['account_id']}/transactions", {
+        "limit": args.get("limit", 20), "from": args.get("from_date"), "to": args.get("to_date"),
+        "type": args.get("transaction_type"), "customer_id": customer}),
+    "search_documents": lambda customer, args: ("GET", f"/customers/{customer}/documents/search", {
+        "q": args["query"], "limit": args.get("limit", 10), "type": args.get("document_type")}),
+    "get_user_profile": lambda customer, args: ("GET", f"/customers/{customer}", {}),
+    "lock_account": lambda customer, args: ("GET", f"/accounts/{args['account_id']}/lock", {"customer_id": customer}),
+    "get_account_summary": lambda customer, args: ("GET", f"/accounts/{args['account_id']}/summary", {
+        "from": args.get("from_month"), "to": args.get("to_month"), "customer_id": customer}),
+    "get_account_balances": lambda customer, args: ("POST", "/accounts/batch", {
+        "ids": args["account_ids"], "customer_id": customer}),
+    "list_transactions_batch": lambda customer, args: ("POST", "/accounts/transactions/batch", {
+        "account_ids": args["account_ids"], "customer_id": customer, "limit": args.get("limit", 10)}),
+    "lock_accounts": lambda customer, args: ("POST", "/accounts/bulk-lock", {
+        "ids": args["account_ids"], "customer_id": customer}),
+}
+
+
+def load_corpus(path):
+    with open(path) as corpus_file:
+        return [json.loads(line) for line in corpus_file if line.strip()]
+
+def fill(value, placeholders):
+    """Substitute {placeholders} in every string of a corpus entry"""
+    if isinstance(value, str):
+        for key, replacement in placeholders.items():
+            value = value.replace("{" + key + "}", replacement)
+        return value
+    if isinstance(value, list):
+        return [fill(item, placeholders) for item in value]
+    if isinstance(value, dict):
+        return {key: fill(item, placeholders) for key, item in value.items()}
+    return value
+
+def entry_for(entry, dataset, customer_index):
+    accounts = dataset.customer_account_ids(customer_index)
+    return fill(entry, {"account_id": accounts[0], "second_account_id": accounts[-1]})
+
+def entry_tool_calls(entry):
+    return entry.get("tool_calls", []) + entry.get("then", [])
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Recorder:
+    """Collects latencies and errors of one benchmark tier"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.extra = defaultdict(list)
+
+    def summary(self, elapsed):
+        ordered = sorted(self.latencies)
+        result = {
+            "requests": len(ordered),
+            "errors": self.errors,
+            "throughput": len(ordered) / elapsed if elapsed else 0.0,
+            "p50_ms": percentile(ordered, 0.50) * 1000,
+            "p95_ms": percentile(ordered, 0.95) * 1000,
+            "p99_ms": percentile(ordered, 0.99) * 1000,
+        }
+        for name, values in self.extra.items():
+            ordered = sorted(values)
+            result[f"{name}_p50_ms"] = percentile(ordered, 0.50) * 1000
+            result[f"{name}_p95_ms"] = percentile(ordered, 0.95) * 1000
+        return result
+
+
+async def run_workers(concurrency, worker):
+    """Run `concurrency` virtual users and return the wall time"""
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(user) for user in range(concurrency)))
+    return time.perf_counter() - started
+
+
+def prepare_database(args):
+    os.makedirs(os.path.join(ROOT, "benchmarks", ".data"), exist_ok=True)
+    path = os.path.join(ROOT, "benchmarks", ".data",
+                        f"bench-{args.customers}-{args.transactions_per_account}.db")
+    fresh = not os.path.exists(path)
+    repository = SQLiteRepository(path)
+    dataset = SyntheticDataset(repository, args.customers, transactions_per_account=args.transactions_per_account)
+    if fresh:
+        print(f"Seeding {path} ...", flush=True)
+        dataset.load(repository)
+    else:
+        # Ids of the existing synthetic data start at 1. Drop the ranges the
+        # dataset just reserved, and any left by earlier runs, so sequences
+        # restart after the stored ids instead of growing with every run.
+        dataset.customer_start = dataset.account_start = dataset.transaction_start = dataset.document_start = 1
+        repository.conn.execute("DELETE FROM id_sequences")
+    repository.close()
+    return path, dataset
+
+def start_api(db_path, port, workers=1):
+    env = dict(os.environ, BANKING_STORAGE="sqlite", BANKING_DB_PATH=db_path)
+    process = subprocess.Popen(
+        [sys.executable, "banking_api.py", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL,
+    )
+    # Wait until every worker answers; connections are spread across workers
+    # by the kernel, so keep asking until all worker ids have been seen
+    seen = set()
+    deadline = time.monotonic() + 10 + 2 * workers
+    while time.monotonic() < deadline:
+        try:
+            seen.add(httpx.get(f"http://127.0.0.1:{port}/health").json()["worker"])
+            if len(seen) == workers:
+                return process
+            time.sleep(0.01)
+        except httpx.TransportError:
+            time.sleep(0.1)
+    process.terminate()
+    raise RuntimeError("Banking API did not start")
+
+def start_mcp(port, backend_calls):
+    """Start server.py's MCP app in a background thread, counting backend calls per tool"""
+    import uvicorn
+    from fastmcp.server.middleware import Middleware
+
+    import server
+
+    current_tool = ContextVar("current_tool", default=None)
+
+    class ToolTagMiddleware(Middleware):
+        async def on_call_tool(self, context, call_next):
+            token = current_tool.set(context.message.name)
+            try:
+                return await call_next(context)
+            finally:
+                current_tool.reset(token)
+
+    def counting(send):
+        async def send_counted(*args, **kwargs):
+            backend_calls[current_tool.get()] += 1
+            return await send(*args, **kwargs)
+        return send_counted
+
+    server.mcp.add_middleware(ToolTagMiddleware())
+    server.banking_api.get = counting(server.banking_api.get)
+    server.banking_api.post = counting(server.banking_api.post)
+    app = server.mcp.http_app(middleware=server.http_middleware)
+    uvicorn_server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=uvicorn_server.run, daemon=True).start()
+    while not uvicorn_server.started:
+        time.sleep(0.05)
+    return uvicorn_server
+
+
+async def bench_api(args, corpus, dataset):
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    work = [(entry_for(rng.choice(corpus), dataset, n), dataset.customer_id(n))
+            for n in (rng.randrange(args.customers) for _ in range(args.requests))]
+    limits = httpx.Limits(max_connections=args.concurrency)
+
+    async with httpx.AsyncClient(base_url=args.api_url, limits=limits) as http:
+        async def worker(user):
+            while work:
+                entry, customer = work.pop()
+                for call in entry_tool_calls(entry):
+                    method, path, params = TOOL_REQUESTS[call["name"]](customer, call["arguments"])
+                    params = {key: value for key, value in params.items() if value is not None}
+                    started = time.perf_counter()
+                    try:
+                        if method == "GET":
+                            response = await http.request(method, path, params=params)
+                        else:
+                            response = await http.request(method, path, json=params)
+                        response.raise_for_status()
+                    except httpx.HTTPError:
+                        recorder.errors += 1
+                    recorder.latencies.append(time.perf_counter() - started)
+
+        elapsed = await run_workers(args.concurrency, worker)
+    return recorder.summary(elapsed)
+
+async def bench_mcp(args, corpus, dataset, backend_calls):
+    from fastmcp import Client
+    from fastmcp.client.transports import StreamableHttpTransport
+
+    import server
+    from auth import issue_token
+
+    server.banking_api.cache_stats.clear()
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    remaining = [args.requests]
+    tool_calls = Counter()
+    backend_calls.clear()
+
+    async def worker(user):
+        customer_index = rng.randrange(args.customers)
+        transport = StreamableHttpTransport(args.mcp_url, auth=issue_token(dataset.customer_id(customer_index)))
+        async with Client(transport) as mcp:
+            while remaining[0] > 0:
+                remaining[0] -= 1
+                for call in entry_tool_calls(entry_for(rng.choice(corpus), dataset, customer_index)):
+                    started = time.perf_counter()
+                    try:
+                        await mcp.call_tool(call["name"], call["arguments"])
+                    except Exception:
+                        recorder.errors += 1
+                    recorder.latencies.append(time.perf_counter() - started)
+                    tool_calls[call["name"]] += 1
+
+    elapsed = await run_workers(args.concurrency, worker)
+    result = recorder.summary(elapsed)
+    result["backend_calls_per_tool"] = {name: backend_calls[name] / count for name, count in sorted(tool_calls.items())}
+    result["revalidations"] = dict(server.banking_api.cache_stats)
+    return result
+
+async def bench_agent(args, corpus, dataset, backend_calls):
+    import client
+    from llm_backends import ScriptedBackend
+    from prompt_manager import PromptManager
+
+    entries = [entry_for(entry, dataset, 0) for entry in corpus]
+    client.llm_backend = ScriptedBackend({entry["query"]: entry for entry in entries},
+                                         args.llm_first_token_ms / 1000, args.llm_token_ms / 1000)
+    client.answer_cache.clear()
+    recorder = Recorder()
+    rng = random.Random(args.seed)
+    remaining = [args.requests]
+    backend_calls.clear()
+
+    async def worker(user):
+        prompts = PromptManager(client.prompt_manager.path)
+        while remaining[0] > 0:
+            remaining[0] -= 1
+            entry = rng.choice(entries)
+            started = time.perf_counter()
+            first_token = []
+            try:
+                await client.chat_with_tools(
+                    entry["query"], prompts=prompts,
+                    on_token=lambda token: first_token or first_token.append(time.perf_counter() - started),
+                )
+            except Exception:
+                recorder.errors += 1
+            recorder.latencies.append(time.perf_counter() - started)
+            if first_token:
+                recorder.extra["first_token"].append(first_token[0])
+            prompts.clear()
+
+    elapsed = await run_workers(args.concurrency, worker)
+    await client.close_mcp_session()
+    result = recorder.summary(elapsed)
+    result["llm_calls_per_turn"] = client.llm_backend.calls / max(result["requests"], 1)
+    result["backend_calls_per_turn"] = sum(backend_calls.values()) / max(result["requests"], 1)
+    result["answer_cache"] = dict(client.answer_cache.stats)
+    return result
+
+
+def print_report(tier, result):
+    print(f"\n[{tier}] {result['requests']} requests, {result['errors']} errors, "
+          f"{result['throughput']:,.1f} req/s")
+    print(f"  latency p50 {result['p50_ms']:.1f} ms, p95 {result['p95_ms']:.1f} ms, p99 {result['p99_ms']:.1f} ms")
+    if "first_token_p50_ms" in result:
+        print(f"  time to first token p50 {result['first_token_p50_ms']:.1f} ms, "
+              f"p95 {result['first_token_p95_ms']:.1f} ms")
+    for name, calls in result.get("backend_calls_per_tool", {}).items():
+        print(f"  {name}: {calls:.2f} backend calls per call")
+    if "revalidations" in result:
+        print(f"  cache revalidations: {result['revalidations'].get('hits', 0)} not modified, "
+              f"{result['revalidations'].get('misses', 0)} changed")
+    for key in ("llm_calls_per_turn", "backend_calls_per_turn"):
+        if key in result:
+            print(f"  {key.replace('_', ' ')}: {result[key]:.2f}")
+    if "answer_cache" in result:
+        print(f"  answer cache: {result['answer_cache'].get('hits', 0)} hits, "
+              f"{result['answer_cache'].get('similar_hits', 0)} similar hits, "
+              f"{result['answer_cache'].get('misses', 0)} misses")
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tier", choices=["api", "mcp", "agent", "all"], default="all")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=500, help="corpus entries replayed per tier")
+    parser.add_argument("--customers", type=int, default=1000, help="dataset size in customers")
+    parser.add_argument("--transactions-per-account", type=int, default=20)
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "benchmarks", "corpus.jsonl"))
+    parser.add_argument("--api-port", type=int, default=8100)
+    parser.add_argument("--api-workers", type=int, default=1, help="banking API worker processes")
+    parser.add_argument("--mcp-port", type=int, default=8110)
+    parser.add_argument("--llm-first-token-ms", type=float, default=0.0, help="synthetic LLM latency")
+    parser.add_argument("--llm-token-ms", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results as JSON to this file")
+    args = parser.parse_args()
+    args.api_url = f"http://127.0.0.1:{args.api_port}"
+    args.mcp_url = f"http://127.0.0.1:{args.mcp_port}/mcp"
+
+    # server.py and client.py read these at import time; the MCP server runs in
+    # this process, so a throwaway secret signs and verifies the session tokens
+    os.environ["BANKING_API_URL"] = args.api_url
+    os.environ.setdefault("BANKING_MCP_TOKEN_SECRET", secrets.token_urlsafe())
+    os.environ["MCP_SERVER_URL"] = args.mcp_url
+    os.chdir(ROOT)
+
+    corpus = load_corpus(args.corpus)
+    db_path, dataset = prepare_database(args)
+    os.environ["DEMO_CUSTOMER_ID"] = dataset.customer_id(0)
+    api = start_api(db_path, args.api_port, args.api_workers)
+    results = {}
+    try:
+        tiers = ["api", "mcp", "agent"] if args.tier == "all" else [args.tier]
+        backend_calls = Counter()
+        if "mcp" in tiers or "agent" in tiers:
+            start_mcp(args.mcp_port, backend_calls)
+        for tier in tiers:
+            if tier == "api":
+                results[tier] = await bench_api(args, corpus, dataset)
+            elif tier == "mcp":
+                results[tier] = await bench_mcp(args, corpus, dataset, backend_calls)
+            else:
+                results[tier] = await bench_agent(args, corpus, dataset, backend_calls)
+            print_report(tier, results[tier])
+    finally:
+        api.terminate()
+        api.wait()
+
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump({"config": {key: value for key, value in vars(args).items()}, "results": results},
+                      output_file, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
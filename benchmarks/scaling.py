@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""
+Throughput scaling of the banking API with the number of worker processes
+
+Starts the API against the same seeded SQLite database with 1, 2, 4, ...
+workers (banking_api.py --workers N), replays the api tier of the corpus
+(see run.py) from several load generator processes at a time, and prints the
+throughput curve and the speedup over one worker.
+
+    python benchmarks/scaling.py --workers 1 2 4 8 --clients 4 --concurrency 16 --customers 10000
+
+Run the load generators on cores the API does not use, or leave enough cores
+for both: on a machine with fewer cores than workers plus clients the curve
+flattens where the CPUs run out, not where the API stops scaling.
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run import bench_api, load_corpus, prepare_database, start_api
+
+
+def client_main(args, seed, corpus, dataset):
+    args = argparse.Namespace(**{**vars(args), "seed": seed})
+    return asyncio.run(bench_api(args, corpus, dataset))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to measure")
+    parser.add_argument("--clients", type=int, default=2, help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=8, help="virtual users per load generator")
+    parser.add_argument("--requests", type=int, default=500, help="corpus entries replayed per load generator")
+    parser.add_argument("--customers", type=int, default=1000, help="dataset size in customers")
+    parser.add_argument("--transactions-per-account", type=int, default=20)
+    parser.add_argument("--corpus", default=os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus.jsonl"))
+    parser.add_argument("--api-port", type=int, default=8100)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    args.api_url = f"http://127.0.0.1:{args.api_port}"
+
+    corpus = load_corpus(args.corpus)
+    db_path, dataset = prepare_database(args)
+    print(f"{os.cpu_count()} CPUs, {args.clients} load generators x {args.concurrency} virtual users")
+    print(f"{'workers':>7}  {'req/s':>9}  {'speedup':>7}  {'p50 ms':>7}  {'p95 ms':>7}  {'errors':>6}")
+    baseline = None
+    for workers in args.workers:
+        api = start_api(db_path, args.api_port, workers)
+        try:
+            with multiprocessing.Pool(args.clients) as pool:
+                results = pool.starmap(client_main, [(args, args.seed + k, corpus, dataset)
+                                                     for k in range(args.clients)])
+        finally:
+            api.terminate()
+            api.wait()
+        # The load generators run side by side, so their throughputs add up;
+        # latency is reported for the slowest of them
+        throughput = sum(result["throughput"] for result in results)
+        baseline = baseline or throughput
+        print(f"{workers:>7}  {throughput:>9,.1f}  {throughput / baseline:>6.2f}x  "
+              f"{max(result['p50_ms'] for result in results):>7.1f}  "
+              f"{max(result['p95_ms'] for result in results):>7.1f}  "
+              f"{sum(result['errors'] for result in results):>6}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Response serialization benchmark for the banking API
+
+Serves large transaction pages and account lists from an in-memory
+repository through the full ASGI stack, once with response_model validation
+and once with the fast response path (records encoded directly with orjson,
+or the stdlib encoder when orjson is not installed), and reports the time
+per request of both.
+
+    python benchmarks/serialization.py --transactions 100000 --limit 500
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+import httpx
+
+import banking_api
+from bulk_load import SyntheticDataset
+from repository import InMemoryRepository
+
+
+async def measure(path, requests):
+    transport = httpx.ASGITransport(app=banking_api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        body = (await http.get(path)).content
+        started = time.perf_counter()
+        for _ in range(requests):
+            response = await http.get(path)
+            response.raise_for_status()
+        return (time.perf_counter() - started) / requests, len(body)
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=2000, help="customers in the account list")
+    parser.add_argument("--transactions", type=int, default=20000, help="transactions of the benchmarked account")
+    parser.add_argument("--limit", type=int, default=500, help="transaction page size")
+    parser.add_argument("--requests", type=int, default=50)
+    args = parser.parse_args()
+
+    repository = InMemoryRepository({}, {}, {}, {})
+    SyntheticDataset(repository, args.customers, accounts_per_customer=1, transactions_per_account=0,
+                     documents_per_customer=0).load(repository)
+    SyntheticDataset(repository, 1, transactions_per_account=args.transactions, documents_per_customer=0).load(repository)
+    banking_api.repository = repository
+    account_id = repository.list_accounts()[-1]["id"]
+
+    print(f"Encoder: {'orjson' if banking_api.orjson is not None else 'json (install orjson for the fastest path)'}")
+    paths = {
+        f"transaction page ({args.limit} items)": f"/accounts/{account_id}/transactions?limit={args.limit}",
+        f"account list ({len(repository.accounts)} items)": "/accounts",
+    }
+    for name, path in paths.items():
+        banking_api.FAST_RESPONSES = False
+        validated, size = await measure(path, args.requests)
+        banking_api.FAST_RESPONSES = True
+        fast, fast_size = await measure(path, args.requests)
+        print(f"{name}: validated {validated * 1000:.2f} ms ({size:,} bytes), "
+              f"fast {fast * 1000:.2f} ms ({fast_size:,} bytes), {validated / fast:.1f}x faster")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Concurrency stress test for per-session user context in server.py
+
+Opens many concurrent MCP sessions, each authenticated as a different
+customer, and interleaves tool calls across them. Every result must belong
+to the session's own customer; any cross-session leakage fails the run.
+A session with a forged token must be rejected.
+
+Requires the banking API and MCP server to be running, with the MCP
+server's BANKING_MCP_TOKEN_SECRET set here as well to issue the tokens. With the mock data
+use --customers 3; against a bulk-loaded database use a larger number.
+
+    python benchmarks/session_isolation.py --sessions 1000 --customers 3
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from fastmcp import Client
+from fastmcp.client.transports import StreamableHttpTransport
+from fastmcp.exceptions import ToolError
+
+from auth import issue_token
+
+
+def customer_id(n: int) -> str:
+    return f"CUST{str(n).zfill(3)}"
+
+async def run_session(url: str, customer: str, calls: int, start: asyncio.Event) -> list:
+    """Run interleaved tool calls as one customer and return any leaked results"""
+    leaks = []
+    async with Client(StreamableHttpTransport(url, auth=issue_token(customer))) as client:
+        await start.wait()
+        for _ in range(calls):
+            profile = (await client.call_tool("get_user_profile", {})).structured_content
+            if profile["id"] != customer:
+                leaks.append(("get_user_profile", customer, profile["id"]))
+            accounts = (await client.call_tool("list_accounts", {})).structured_content["result"]
+            leaks.extend(("list_accounts", customer, account["customer_id"])
+                         for account in accounts if account["customer_id"] != customer)
+            await asyncio.sleep(0)
+    return leaks
+
+async def forged_token_rejected(url: str) -> bool:
+    # CUST001's signature presented as CUST002
+    forged = "CUST002." + issue_token("CUST001").split(".", 1)[1]
+    async with Client(StreamableHttpTransport(url, auth=forged)) as client:
+        try:
+            await client.call_tool("get_user_profile", {})
+        except ToolError:
+            return True
+    return False
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://127.0.0.1:8010/mcp")
+    parser.add_argument("--sessions", type=int, default=200)
+    parser.add_argument("--customers", type=int, default=3)
+    parser.add_argument("--calls", type=int, default=5, help="tool call pairs per session")
+    args = parser.parse_args()
+
+    start = asyncio.Event()
+    tasks = [asyncio.create_task(run_session(args.url, customer_id(n % args.customers + 1), args.calls, start))
+             for n in range(args.sessions)]
+    await asyncio.sleep(1)
+    started = time.perf_counter()
+    start.set()
+    results = await asyncio.gather(*tasks, return_exceptions=True)
+    elapsed = time.perf_counter() - started
+
+    errors = [result for result in results if isinstance(result, BaseException)]
+    leaks = [leak for result in results if isinstance(result, list) for leak in result]
+    rejected = await forged_token_rejected(args.url)
+    total_calls = args.sessions * args.calls * 2
+    print(f"{args.sessions} sessions, {total_calls} tool calls in {elapsed:.2f}s "
+          f"({total_calls / elapsed:,.0f} calls/s)")
+    print(f"errors: {len(errors)}, leaked results: {len(leaks)}, forged token rejected: {rejected}")
+    for error in errors[:5]:
+        print(f"  error: {error!r}")
+    for leak in leaks[:5]:
+        print(f"  leak: {leak}")
+    return 0 if not errors and not leaks and rejected else 1
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Account summaries over date ranges
+
+Seeds both repositories with the same synthetic transactions and asks for
+summaries over random ranges: months, dates and timestamps, mixed. Every
+summary's monthly count and total per transaction type must equal a sum
+over the account's transactions in the range, so whole months read from
+the aggregates and partial months summed from the transactions must agree.
+Reports the time per summary.
+
+    python benchmarks/summary_ranges.py --accounts 200 --ranges 2000
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from bulk_load import SyntheticDataset
+from repository import InMemoryRepository, SQLiteRepository
+from transaction_store import parse_timestamp
+
+
+def random_bound(rng):
+    """None, a month, a date or a timestamp within the synthetic history"""
+    year, month, day = rng.randint(2019, 2025), rng.randint(1, 12), rng.randint(1, 28)
+    return rng.choice([
+        None,
+        f"{year}-{month:02d}",
+        f"{year}-{month:02d}-{day:02d}",
+        f"{year}-{month:02d}-01",
+        f"{year}-{month:02d}-{day:02d}T{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00Z",
+    ])
+
+def range_instants(start, end):
+    """The range as [low, high) timestamps; months are inclusive"""
+    def month_after(month):
+        year, number = int(month[:4]), int(month[5:7])
+        return f"{year + number // 12:04d}-{number % 12 + 1:02d}"
+    low = parse_timestamp(f"{start}-01" if start and len(start) == 7 else start) if start else None
+    high = parse_timestamp(f"{month_after(end)}-01" if len(end) == 7 else end) if end else None
+    return low, high
+
+def expected_months(transactions, start, end):
+    low, high = range_instants(start, end)
+    totals = defaultdict(lambda: [0, 0.0])
+    for txn in transactions:
+        timestamp = parse_timestamp(txn["date"])
+        if (low is None or timestamp >= low) and (high is None or timestamp < high):
+            type_totals = totals[(txn["date"][:7], txn["type"])]
+            type_totals[0] += 1
+            type_totals[1] += txn["amount"]
+    return {key: (count, round(total, 2)) for key, (count, total) in totals.items()}
+
+def summary_months(summary):
+    return {(month["month"], txn_type): (totals["count"], totals["total"])
+            for month in summary["months"] for txn_type, totals in month["totals"].items()}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=200)
+    parser.add_argument("--transactions-per-account", type=int, default=50)
+    parser.add_argument("--ranges", type=int, default=2000, help="summaries asked per backend")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    repositories = {
+        "memory": InMemoryRepository({}, {}, {}, {}),
+        "sqlite": SQLiteRepository(os.path.join(tempfile.mkdtemp(prefix="summary-ranges-"), "banking.db")),
+    }
+    errors = []
+    for name, repository in repositories.items():
+        dataset = SyntheticDataset(repository, args.accounts, accounts_per_customer=1,
+                                   transactions_per_account=args.transactions_per_account)
+        dataset.load(repository)
+        by_account = defaultdict(list)
+        for txn in dataset.transaction_records():
+            by_account[txn["account_id"]].append(txn)
+
+        rng = random.Random(args.seed)
+        queries = []
+        for _ in range(args.ranges):
+            account_id = dataset.customer_account_ids(rng.randrange(args.accounts))[0]
+            start, end = random_bound(rng), random_bound(rng)
+            if start and end and range_instants(start, None)[0] > range_instants(None, end)[1]:
+                start, end = end, start
+            queries.append((account_id, start, end))
+
+        started = time.perf_counter()
+        summaries = [repository.get_account_summary(*query) for query in queries]
+        elapsed = time.perf_counter() - started
+        for (account_id, start, end), summary in zip(queries, summaries):
+            expected = expected_months(by_account[account_id], start, end)
+            found = summary_months(summary)
+            if found != expected:
+                wrong = sorted(key for key in found.keys() | expected.keys() if found.get(key) != expected.get(key))
+                errors.append(f"{name}: {account_id} from {start} to {end}: totals of {wrong[0]} are "
+                              f"{found.get(wrong[0])}, expected {expected.get(wrong[0])}")
+        print(f"{name}: {len(queries)} range summaries, {elapsed / len(queries) * 1e6:.0f} us each")
+        repository.close()
+
+    for error in errors[:10]:
+        print(f"  FAIL: {error}")
+    if errors:
+        raise SystemExit(1)
+    print("Every range summary matches the transactions")
+
+
+if __name__ == "__main__":
+    main()
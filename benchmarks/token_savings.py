@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Token savings of result shaping on the request corpus
+
+Replays every tool call of the corpus (benchmarks/corpus.jsonl) through the
+MCP server against a seeded database, as run.py does, and compares the
+estimated tokens of each result sent to the model as ``str(result)`` with
+the shaped text of result_shaping.py. Prints the totals per tool and how
+many results were truncated at the token budget.
+
+    python benchmarks/token_savings.py --customers 1000 --budget 1500
+"""
+
+import argparse
+import asyncio
+import os
+import secrets
+import sys
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from run import ROOT, entry_for, entry_tool_calls, load_corpus, prepare_database, start_api, start_mcp
+
+
+async def measure(args, corpus, dataset):
+    from fastmcp import Client
+    from fastmcp.client.transports import StreamableHttpTransport
+
+    from auth import issue_token
+    from result_shaping import token_counts, tool_result_text
+
+    # tool -> [calls, raw tokens, shaped tokens, truncated results]
+    totals = defaultdict(lambda: [0, 0, 0, 0])
+    for customer_index in range(min(args.samples, args.customers)):
+        transport = StreamableHttpTransport(args.mcp_url, auth=issue_token(dataset.customer_id(customer_index)))
+        async with Client(transport) as mcp:
+            for entry in corpus:
+                for call in entry_tool_calls(entry_for(entry, dataset, customer_index)):
+                    result = await mcp.call_tool(call["name"], call["arguments"], raise_on_error=False)
+                    raw, shaped = token_counts(call["name"], result, args.budget)
+                    tool = totals[call["name"]]
+                    tool[0] += 1
+                    tool[1] += raw
+                    tool[2] += shaped
+                    tool[3] += "more available" in tool_result_text(call["name"], result, args.budget)
+    return totals
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--customers", type=int, default=1000, help="dataset size in customers")
+    parser.add_argument("--transactions-per-account", type=int, default=20)
+    parser.add_argument("--samples", type=int, default=5, help="customers the corpus is replayed for")
+    parser.add_argument("--budget", type=int, default=1500, help="token budget per tool result")
+    parser.add_argument("--corpus", default=os.path.join(ROOT, "benchmarks", "corpus.jsonl"))
+    parser.add_argument("--api-port", type=int, default=8100)
+    parser.add_argument("--mcp-port", type=int, default=8110)
+    args = parser.parse_args()
+    args.mcp_url = f"http://127.0.0.1:{args.mcp_port}/mcp"
+
+    # server.py reads this at import time; the MCP server runs in this process,
+    # so a throwaway secret signs and verifies the session tokens
+    os.environ["BANKING_API_URL"] = f"http://127.0.0.1:{args.api_port}"
+    os.environ.setdefault("BANKING_MCP_TOKEN_SECRET", secrets.token_urlsafe())
+    os.chdir(ROOT)
+
+    corpus = load_corpus(args.corpus)
+    db_path, dataset = prepare_database(args)
+    api = start_api(db_path, args.api_port)
+    try:
+        start_mcp(args.mcp_port, defaultdict(int))
+        totals = asyncio.run(measure(args, corpus, dataset))
+    finally:
+        api.terminate()
+        api.wait()
+
+    print(f"{'tool':<24}  {'calls':>5}  {'raw tokens':>10}  {'shaped':>8}  {'saved':>6}  {'truncated':>9}")
+    for name, (calls, raw, shaped, truncated) in sorted(totals.items()):
+        print(f"{name:<24}  {calls:>5}  {raw:>10,}  {shaped:>8,}  {1 - shaped / raw:>6.0%}  {truncated:>9}")
+    calls, raw, shaped, truncated = (sum(column) for column in zip(*totals.values()))
+    print(f"{'total':<24}  {calls:>5}  {raw:>10,}  {shaped:>8,}  {1 - shaped / raw:>6.0%}  {truncated:>9}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+Memory footprint of the in-memory transaction storage
+
+Loads the same synthetic transactions into a dict per row (the previous
+layout) and into the ColumnarTransactionStore, and reports bytes per
+transaction of both, plus the time of a date-range page of one account's transactions of one
+type, as GET /accounts/{id}/transactions reads them, and of a date-range sum
+per type, as summaries over partial months compute it.
+
+    python benchmarks/transaction_memory.py --accounts 1000 --transactions-per-account 200
+"""
+
+import argparse
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.insert(0, ROOT)
+
+from bulk_load import SyntheticDataset
+from repository import InMemoryRepository
+from transaction_store import ColumnarTransactionStore, parse_timestamp
+
+
+def allocated(build):
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    gc.collect()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--accounts", type=int, default=1000)
+    parser.add_argument("--transactions-per-account", type=int, default=200)
+    args = parser.parse_args()
+
+    dataset = SyntheticDataset(InMemoryRepository({}, {}, {}, {}), args.accounts, accounts_per_customer=1,
+                               transactions_per_account=args.transactions_per_account)
+    count = args.accounts * args.transactions_per_account
+
+    rows, dict_bytes = allocated(lambda: {txn["id"]: txn for txn in dataset.transaction_records()})
+    del rows
+
+    def build_store():
+        store = ColumnarTransactionStore()
+        for txn in dataset.transaction_records():
+            store.append(txn)
+        return store
+
+    store, store_bytes = allocated(build_store)
+    print(f"{count:,} transactions")
+    print(f"  dict per row: {dict_bytes / count:,.0f} bytes per transaction")
+    print(f"  columnar:     {store_bytes / count:,.0f} bytes per transaction ({dict_bytes / store_bytes:.1f}x smaller)")
+
+    account_id = dataset.customer_account_ids(0)[0]
+    calls = 1000
+    started = time.perf_counter()
+    for _ in range(calls):
+        store.page(account_id, 50, None, parse_timestamp("2021-01-01"), parse_timestamp("2023-01-01"), "deposit")
+    print(f"  range page over one account: {(time.perf_counter() - started) / calls * 1e6:.1f} us per call")
+    started = time.perf_counter()
+    for _ in range(calls):
+        store.sum_amounts(account_id, parse_timestamp("2021-01-01"), parse_timestamp("2023-01-01"))
+    print(f"  range sum over one account: {(time.perf_counter() - started) / calls * 1e6:.1f} us per call")
+
+
+if __name__ == "__main__":
+    main()
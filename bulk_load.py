@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Bulk loader for synthetic banking data
+
+Seeds a storage backend with large numbers of synthetic customers, accounts,
+transactions and documents for load tests. Records are generated lazily and
+written in chunks, so memory use stays flat regardless of dataset size.
+
+Example:
+    python bulk_load.py --db banking.db --customers 1000000 --transactions-per-account 20
+"""
+
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+from typing import Any, Dict, Iterator, List
+
+from id_allocator import format_id
+from repository import BankingRepository, SQLiteRepository
+
+ACCOUNT_TYPES = ["checking", "savings", "investment"]
+TRANSACTION_TYPES = ["deposit", "withdrawal", "transfer"]
+RISK_PROFILES = ["conservative", "moderate", "aggressive"]
+FIRST_NAMES = ["John", "Sarah", "Michael", "Emma", "David", "Olivia", "James", "Sophia", "Daniel", "Mia"]
+LAST_NAMES = ["Smith", "Johnson", "Chen", "Brown", "Garcia", "Miller", "Davis", "Martinez", "Lee", "Walker"]
+HISTORY_START = datetime(2020, 1, 1)
+HISTORY_DAYS = 5 * 365
+
+
+class SyntheticDataset:
+    """Deterministic generator of synthetic banking records.
+
+    Every record is derived from the seed and its own position, so the
+    generators can be consumed independently and in any order.
+    """
+
+    def __init__(self, repository: BankingRepository, customers: int, accounts_per_customer: int = 2,
+                 transactions_per_account: int = 20, documents_per_customer: int = 2, seed: int = 42):
+        self.customers = customers
+        self.accounts_per_customer = accounts_per_customer
+        self.transactions_per_account = transactions_per_account
+        self.documents_per_customer = documents_per_customer
+        self.seed = seed
+        # Reserve the id ranges up front, so concurrent writers cannot take them
+        accounts = customers * accounts_per_customer
+        self.customer_start = repository.reserve_ids("customer", customers)
+        self.account_start = repository.reserve_ids("account", accounts)
+        self.transaction_start = repository.reserve_ids("transaction", accounts * transactions_per_account)
+        self.document_start = repository.reserve_ids("document", customers * documents_per_customer)
+
+    def _rng(self, *key) -> random.Random:
+        # String seeds are hashed with SHA-512, so this is stable across processes
+        return random.Random(":".join(map(str, (self.seed,) + key)))
+
+    def customer_id(self, n: int) -> str:
+        """Id of the n-th synthetic customer"""
+        return format_id("customer", self.customer_start + n)
+
+    def customer_account_ids(self, n: int) -> List[str]:
+        """Ids of the accounts of the n-th synthetic customer"""
+        first = self.account_start + n * self.accounts_per_customer
+        return [format_id("account", first + k) for k in range(self.accounts_per_customer)]
+
+    def customer_records(self) -> Iterator[Dict[str, Any]]:
+        for n in range(self.customers):
+            rng = self._rng("customer", n)
+            first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+            created = HISTORY_START + timedelta(days=rng.randrange(HISTORY_DAYS))
+            yield {
+                "id": format_id("customer", self.customer_start + n),
+                "name": f"{first} {last}",
+                "email": f"{first.lower()}.{last.lower()}{n}@email.com",
+                "phone": f"+1-555-{rng.randrange(10000):04d}",
+                "address": f"{rng.randrange(1, 9999)} Main St, Anytown, USA",
+                "date_of_birth": f"{rng.randrange(1940, 2005)}-{rng.randrange(1, 13):02d}-{rng.randrange(1, 29):02d}",
+                "ssn": f"{rng.randrange(100, 999)}-{rng.randrange(10, 99)}-{rng.randrange(1000, 9999)}",
+                "risk_profile": rng.choice(RISK_PROFILES),
+                "created_date": created.strftime("%Y-%m-%d"),
+            }
+
+    def account_records(self) -> Iterator[Dict[str, Any]]:
+        for n in range(self.customers * self.accounts_per_customer):
+            rng = self._rng("account", n)
+            account_type = rng.choice(ACCOUNT_TYPES)
+            yield {
+                "id": format_id("account", self.account_start + n),
+                "customer_id": format_id("customer", self.customer_start + n // self.accounts_per_customer),
+                "account_number": "-".join(f"{rng.randrange(1000, 10000)}" for _ in range(4)),
+                "type": account_type,
+                "balance": round(rng.uniform(0, 50000), 2),
+                "currency": "USD",
+                "status": "active",
+                "created_date": (HISTORY_START + timedelta(days=rng.randrange(365))).strftime("%Y-%m-%d"),
+                "interest_rate": 0.025 if account_type == "savings" else 0.01,
+                "overdraft_limit": 1000.00 if account_type == "checking" else 0.00,
+            }
+
+    def transaction_records(self) -> Iterator[Dict[str, Any]]:
+        txn_number = self.transaction_start
+        step = HISTORY_DAYS * 86400 // max(self.transactions_per_account, 1)
+        for n in range(self.customers * self.accounts_per_customer):
+            rng = self._rng("transactions", n)
+            account_id = format_id("account", self.account_start + n)
+            when = HISTORY_START
+            for _ in range(self.transactions_per_account):
+                when += timedelta(seconds=rng.randrange(1, step + 1))
+                txn_type = rng.choice(TRANSACTION_TYPES)
+                amount = round(rng.uniform(5, 2500), 2)
+                yield {
+                    "id": format_id("transaction", txn_number),
+                    "account_id": account_id,
+                    "type": txn_type,
+                    "amount": amount if txn_type == "deposit" else -amount,
+                    "description": f"Synthetic {txn_type}",
+                    "date": when.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                    "status": "completed",
+                    "reference": f"SYN-{txn_number}",
+                }
+                txn_number += 1
+
+    def document_records(self) -> Iterator[Dict[str, Any]]:
+        for n in range(self.customers * self.documents_per_customer):
+            rng = self._rng("document", n)
+            customer_number = self.customer_start + n // self.documents_per_customer
+            account_id = format_id("account", self.account_start
+                                   + (n // self.documents_per_customer) * self.accounts_per_customer)
+            when = HISTORY_START + timedelta(days=rng.randrange(HISTORY_DAYS))
+            yield {
+                "id": format_id("document", self.document_start + n),
+                "customer_id": format_id("customer", customer_number),
+                "type": "statement",
+                "content": f"Customer statement for account {account_id}. "
+                           f"Account balance per {when:%d %B %Y} is ${rng.uniform(0, 50000):.2f}.",
+                "date": when.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            }
+
+    def load(self, repository: BankingRepository):
+        repository.bulk_load(self.customer_records(), self.account_records(),
+                             self.transaction_records(), self.document_records())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Seed a banking database with synthetic load test data")
+    parser.add_argument("--db", default="banking.db", help="SQLite database path")
+    parser.add_argument("--customers", type=int, default=1000)
+    parser.add_argument("--accounts-per-customer", type=int, default=2)
+    parser.add_argument("--transactions-per-account", type=int, default=20)
+    parser.add_argument("--documents-per-customer", type=int, default=2)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    repository = SQLiteRepository(args.db)
+    dataset = SyntheticDataset(repository, args.customers, args.accounts_per_customer,
+                               args.transactions_per_account, args.documents_per_customer, args.seed)
+    started = time.perf_counter()
+    dataset.load(repository)
+    elapsed = time.perf_counter() - started
+    repository.close()
+
+    accounts = args.customers * args.accounts_per_customer
+    rows = args.customers + accounts + accounts * args.transactions_per_account + args.customers * args.documents_per_customer
+    print(f"Loaded {args.customers} customers, {accounts} accounts, "
+          f"{accounts * args.transactions_per_account} transactions into {args.db} "
+          f"in {elapsed:.1f}s ({rows / elapsed:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,102 +1,422 @@
 import asyncio
+import datetime
 import json
 import os
+import time
+from collections import Counter
+from contextlib import AsyncExitStack
+from contextvars import ContextVar
+from typing import Optional
+import httpx
+import mcp.types
 from dotenv import load_dotenv
 from fastmcp import Client
+from fastmcp.client.messages import MessageHandler
 from fastmcp.client.transports import StreamableHttpTransport
-import yaml
-from mistralai import Mistral
+from admission import RetryAfterTransport
+from answer_cache import AnswerCache
+from auth import issue_token
+from llm_backends import create_llm_backend
+from prompt_manager import PromptManager
+from result_shaping import tool_result_text
+import telemetry
 
-MODEL_NAME = "mistral-large-latest"
 load_dotenv()
+tracer = telemetry.Tracer("chat-client")
 
-mcp_client = Client(StreamableHttpTransport("http://127.0.0.1:8010/mcp"))
-mistral_client = Mistral(api_key=os.getenv("MISTRAL_API_KEY"))
+# Agent loop budget per user message
+MAX_STEPS = int(os.getenv("AGENT_MAX_STEPS", "5"))
+TURN_TIMEOUT = float(os.getenv("AGENT_TURN_TIMEOUT", "60"))
+MAX_PARALLEL_TOOLS = int(os.getenv("AGENT_MAX_PARALLEL_TOOLS", "4"))
 
+# Retries of MCP requests the server rejects under load (429 or 503 with Retry-After)
+MCP_OVERLOAD_RETRIES = int(os.getenv("MCP_OVERLOAD_RETRIES", "3"))
+
+# Tool results are projected, tabulated and truncated to this many tokens
+# before they reach the model; TOOL_RESULT_SHAPING=0 sends them unshaped
+TOOL_RESULT_SHAPING = os.getenv("TOOL_RESULT_SHAPING", "1") != "0"
+TOOL_RESULT_TOKEN_BUDGET = int(os.getenv("TOOL_RESULT_TOKEN_BUDGET", "1500"))
+
+# Bearer token identifying the customer; when none is configured a demo token
+# is issued, which needs the server's BANKING_MCP_TOKEN_SECRET
+mcp_token = os.getenv("BANKING_MCP_TOKEN") or issue_token(os.getenv("DEMO_CUSTOMER_ID", "CUST001"))
+
+# Converted tool schemas, dropped when the server announces a changed tool list
+mistral_tools_cache = None
+
+# Tools the server marks read-only; answers that used only these can be cached
+read_only_tools = set()
+
+# Answers to repeated questions, reused while the customer's data and the
+# system prompt are unchanged (see answer_cache.py); ANSWER_CACHE_SIZE=0 disables it
+answer_cache = AnswerCache(
+    max_entries=int(os.getenv("ANSWER_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("ANSWER_CACHE_TTL", "300")),
+    similarity=float(os.getenv("ANSWER_CACHE_SIMILARITY", "0")),
+)
+DATA_VERSION_URI = "banking://customer/versions"
+
+class TurnStats:
+    """MCP protocol work and latency of one chat turn"""
+    def __init__(self, trace_id=None):
+        self.trace_id = trace_id
+        # mcp_handshakes, tool_list_fetches, tool_calls, answer_cache_hits
+        self.counts = Counter()
+        # Latency of each agent loop step
+        self.steps = []
+        self.first_token_seconds = None
+
+# Stats of the turn being run. Each turn runs in its own context, so
+# concurrent turns (and their tool call tasks) count into their own stats.
+_turn_stats: ContextVar[Optional[TurnStats]] = ContextVar("turn_stats", default=None)
+
+def count_turn_work(name: str):
+    """Count MCP protocol work against the current turn, if any"""
+    stats = _turn_stats.get()
+    if stats is not None:
+        stats.counts[name] += 1
+
+class ToolListChangedHandler(MessageHandler):
+    """Invalidates the cached tool schemas on list-changed notifications"""
+    async def on_tool_list_changed(self, message):
+        global mistral_tools_cache
+        mistral_tools_cache = None
+
+class TracedClient(Client):
+    """MCP client that passes the current trace to the server in the `_meta` of tool calls.
+
+    The SDK's `ClientSession.call_tool` takes no request metadata, and an HTTP
+    header would not carry the trace either: the streamable HTTP transport
+    sends every request from its own writer task, outside the turn's context.
+    So the tools/call request is built here, and its result is validated
+    against the tool's output schema as `call_tool` would.
+    """
+    async def call_tool_mcp(self, name, arguments, progress_handler=None, timeout=None):
+        traceparent = telemetry.current_traceparent()
+        if traceparent is None:
+            return await super().call_tool_mcp(name, arguments, progress_handler, timeout)
+        if isinstance(timeout, (int, float)):
+            timeout = datetime.timedelta(seconds=timeout)
+        params = mcp.types.CallToolRequestParams(name=name, arguments=arguments,
+                                                 _meta=mcp.types.RequestParams.Meta(traceparent=traceparent))
+        result = await self.session.send_request(
+            mcp.types.ClientRequest(mcp.types.CallToolRequest(method="tools/call", params=params)),
+            mcp.types.CallToolResult,
+            request_read_timeout_seconds=timeout,
+            progress_callback=progress_handler or self._progress_handler,
+        )
+        if not result.isError:
+            # The structured output check of ClientSession.call_tool
+            await self.session._validate_tool_result(name, result)
+        return result
+
+def mcp_http_client(headers=None, timeout=None, auth=None):
+    """HTTP client of the MCP transport that waits and retries when the server sheds load.
+
+    The MCP transport closes the session on any error status, so rejections
+    are retried below it, after the server's Retry-After with jitter.
+    """
+    return httpx.AsyncClient(
+        headers=headers, timeout=timeout or httpx.Timeout(30.0), auth=auth, follow_redirects=True,
+        transport=RetryAfterTransport(httpx.AsyncHTTPTransport(), retries=MCP_OVERLOAD_RETRIES),
+    )
+
+mcp_client = TracedClient(
+    StreamableHttpTransport(os.getenv("MCP_SERVER_URL", "http://127.0.0.1:8010/mcp"), auth=mcp_token,
+                            httpx_client_factory=mcp_http_client),
+    message_handler=ToolListChangedHandler(),
+)
+mcp_session = AsyncExitStack()
+llm_backend = create_llm_backend()
+prompt_manager = PromptManager(
+    os.getenv("PROMPT_PATH", "prompts/agent-system-prompt.yaml"),
+    history_token_budget=int(os.getenv("HISTORY_TOKEN_BUDGET", "8000")),
+    max_history_turns=int(os.getenv("HISTORY_MAX_TURNS", "20")),
+)
+
+
+async def ensure_mcp_session():
+    """Open the long-lived MCP session on first use"""
+    if not mcp_client.is_connected():
+        with tracer.span("mcp.session_setup"):
+            await mcp_session.enter_async_context(mcp_client)
+        count_turn_work("mcp_handshakes")
+
+async def close_mcp_session():
+    await mcp_session.aclose()
 
 async def get_mcp_tools():
-    """Get available MCP tools and convert them to Mistral function format"""
-    async with mcp_client:
+    """Get available MCP tools converted to Mistral function format, cached across turns"""
+    global mistral_tools_cache
+    await ensure_mcp_session()
+    if mistral_tools_cache is not None:
+        return mistral_tools_cache
+    
+    with tracer.span("mcp.list_tools"):
         tools = await mcp_client.list_tools()
-        
-        # Convert MCP tools to Mistral function format
-        mistral_functions = []
-        for tool in tools:
-            mistral_functions.append({
-                "type": "function",
-                "function": {
-                    "name": tool.name,
-                    "description": tool.description,
-                    "parameters": {
-                        "type": "object",
-                        "properties": tool.inputSchema.get("properties", {}),
-                        "required": tool.inputSchema.get("required", [])
-                    }
+    count_turn_work("tool_list_fetches")
+    read_only_tools.clear()
+    read_only_tools.update(tool.name for tool in tools if tool.annotations and tool.annotations.readOnlyHint)
+    
+    # Convert MCP tools to Mistral function format, in a stable order so the
+    # tool prefix of every request is byte-identical
+    mistral_functions = []
+    for tool in sorted(tools, key=lambda tool: tool.name):
+        mistral_functions.append({
+            "type": "function",
+            "function": {
+                "name": tool.name,
+                "description": tool.description,
+                "parameters": {
+                    "type": "object",
+                    "properties": tool.inputSchema.get("properties", {}),
+                    "required": tool.inputSchema.get("required", [])
                 }
-            })
-        
-        return mistral_functions
+            }
+        })
+    
+    mistral_tools_cache = mistral_functions
+    return mistral_functions
+
+async def answer_versions(prompts: PromptManager):
+    """(customer id, versions) that answers of the current turn depend on, or None if unknown"""
+    try:
+        with tracer.span("mcp.data_version"):
+            contents = await mcp_client.read_resource(DATA_VERSION_URI)
+        data = json.loads(contents[0].text)
+    except Exception:
+        return None
+    return data["customer_id"], (data["version"], prompts.prompt_version())
 
 async def execute_mcp_tool(tool_name: str, arguments: dict):
     """Execute an MCP tool with given arguments"""
-    async with mcp_client:
+    await ensure_mcp_session()
+    count_turn_work("tool_calls")
+    with tracer.span("mcp.tool_call", tool=tool_name) as current:
         try:
             result = await mcp_client.call_tool(tool_name, arguments)
             return result
         except Exception as e:
+            current.set(error=type(e).__name__)
             return f"Error executing tool {tool_name}: {e}"
 
-async def chat_with_tools(user_message: str):
-    """Chat with Mistral using MCP tools"""
+class StreamedToolCalls:
+    """Assembles streamed tool call deltas of one step.
+
+    Each call is started as soon as its arguments form a complete JSON
+    object, so tool execution overlaps with the rest of the stream. Calls
+    without arguments yet (the first chunk of a call usually has none) wait
+    for the end of the stream. At most MAX_PARALLEL_TOOLS calls run at a
+    time.
+    """
+    def __init__(self):
+        self.calls = {}
+        self.tasks = {}
+        self.semaphore = asyncio.Semaphore(MAX_PARALLEL_TOOLS)
+    
+    def add_delta(self, delta):
+        call = self.calls.setdefault(delta.index or 0, {"id": None, "name": "", "arguments": ""})
+        if delta.id and delta.id != "null":
+            call["id"] = delta.id
+        if delta.function.name:
+            call["name"] = delta.function.name
+        arguments = delta.function.arguments
+        call["arguments"] += json.dumps(arguments) if isinstance(arguments, dict) else (arguments or "")
+        # Empty arguments only mean "no arguments" once the stream has ended
+        if call["name"] and call["arguments"].strip() and self._parse_arguments(call) is not None:
+            self._start(delta.index or 0)
+    
+    @staticmethod
+    def _parse_arguments(call):
+        try:
+            arguments = json.loads(call["arguments"] or "{}")
+        except json.JSONDecodeError:
+            return None
+        return arguments if isinstance(arguments, dict) else None
+    
+    def _start(self, index):
+        if index not in self.tasks:
+            self.tasks[index] = asyncio.ensure_future(self._run(self.calls[index]))
+    
+    async def _run(self, call):
+        arguments = self._parse_arguments(call)
+        if arguments is None:
+            return f"Error: invalid arguments for tool {call['name']}: {call['arguments']}"
+        async with self.semaphore:
+            return await execute_mcp_tool(call["name"], arguments)
+    
+    def assistant_tool_calls(self):
+        return [{"id": call["id"], "type": "function",
+                 "function": {"name": call["name"], "arguments": call["arguments"]}}
+                for _, call in sorted(self.calls.items())]
+    
+    async def results(self, timeout: float):
+        """Wait for every call of the step and return (call, result) pairs in call order"""
+        for index in self.calls:
+            self._start(index)
+        tasks = [self.tasks[index] for index in sorted(self.calls)]
+        done, pending = await asyncio.wait(tasks, timeout=max(timeout, 0))
+        for task in pending:
+            task.cancel()
+        return [(self.calls[index], task.result() if task in done else "Error: tool call timed out")
+                for index, task in zip(sorted(self.calls), tasks)]
+
+def _content_text(content):
+    """Extract the text of a content delta, which may be a string or a list of chunks"""
+    if isinstance(content, str):
+        return content
+    return "".join(getattr(chunk, "text", "") or "" for chunk in content or [])
+
+async def stream_completion(messages, tools, on_token=None, **kwargs):
+    """Stream one completion from the LLM backend.
+
+    Content tokens are passed to `on_token` as they arrive. Returns the full
+    content, the assembled tool calls and the time to the first token.
+    """
+    started = time.perf_counter()
+    first_token_seconds = None
+    content = []
+    tool_calls = StreamedToolCalls()
+    
+    with tracer.span("llm.completion", backend=type(llm_backend).__name__) as current:
+        async with llm_backend.stream(messages, tools, **kwargs) as deltas:
+            async for delta in deltas:
+                text = _content_text(delta.content)
+                if text:
+                    if first_token_seconds is None:
+                        first_token_seconds = time.perf_counter() - started
+                    content.append(text)
+                    if on_token:
+                        on_token(text)
+                for tool_call in delta.tool_calls or []:
+                    if first_token_seconds is None:
+                        first_token_seconds = time.perf_counter() - started
+                    tool_calls.add_delta(tool_call)
+        current.set(first_token_seconds=first_token_seconds, tool_calls=len(tool_calls.calls))
+    
+    return "".join(content), tool_calls, first_token_seconds
+
+async def chat_with_tools(user_message: str, on_token=None, prompts: PromptManager = None):
+    """Chat with the configured LLM backend using MCP tools.
+
+    Runs an agent loop: every tool call the model requests in a step is
+    executed concurrently and all results are fed back, until the model
+    answers without calling tools or the step/time budget is spent.
+    Answer tokens are streamed to `on_token` as they arrive. The finished
+    turn is kept in the conversation history of `prompts` (the chat's
+    prompt_manager by default) for follow-up questions. A question answered
+    before is answered from `answer_cache`, without the LLM or any tool, if
+    the customer's data has not changed since.
+
+    Returns the answer and the TurnStats of the turn. The turn starts a
+    trace; its id is in the stats and is carried to the MCP server and the
+    banking API.
+    """
+    with tracer.span("agent.turn") as turn:
+        stats = TurnStats(turn.trace_id)
+        token = _turn_stats.set(stats)
+        try:
+            return await _run_turn(user_message, on_token, prompts or prompt_manager, stats)
+        finally:
+            _turn_stats.reset(token)
+
+async def _run_turn(user_message: str, on_token, prompts: PromptManager, stats: TurnStats):
+    turn_started = time.perf_counter()
+    deadline = time.monotonic() + TURN_TIMEOUT
+    
     # Get available tools
     tools = await get_mcp_tools()
     
-    messages = yaml.safe_load(open('prompts/agent-system-prompt.yaml', 'r'))["messages"]
-    messages.append({
+    turn_messages = [{
             "role": "user",
             "content": user_message
-        })
+        }]
     
-    # Call Mistral with function calling
-    response = mistral_client.chat.complete(
-        model=MODEL_NAME,
-        messages=messages,
-        tools=tools
-    )
+    def record_first_token(text):
+        if stats.first_token_seconds is None:
+            stats.first_token_seconds = time.perf_counter() - turn_started
+        if on_token:
+            on_token(text)
     
-    # Check if Mistral wants to call a tool
-    if response.choices[0].message.tool_calls:
-        for tool_call in response.choices[0].message.tool_calls:
-            tool_name = tool_call.function.name
-            tool_args = json.loads(tool_call.function.arguments)
-            
-            # Execute the MCP tool
-            tool_result = await execute_mcp_tool(tool_name, tool_args)
-            
-            # Add the assistant's response with tool calls to the conversation
-            messages.append({
-                "role": "assistant",
-                "content": response.choices[0].message.content or "",
-                "tool_calls": response.choices[0].message.tool_calls
-            })
-            
-            # Add the tool result to the conversation
-            messages.append({
+    # A repeated question is answered from the cache while the data it was
+    # answered from is unchanged. Only the first question of a conversation is
+    # looked up and stored, as later ones may depend on the earlier turns; the
+    # versions are still needed to drop cached answers after a write.
+    first_question = not prompts.turns
+    cached_as = await answer_versions(prompts) if answer_cache.max_entries else None
+    if cached_as is not None and first_question:
+        answer = answer_cache.get(cached_as[0], user_message, cached_as[1])
+        if answer is not None:
+            stats.counts["answer_cache_hits"] += 1
+            record_first_token(answer)
+            prompts.record_turn(turn_messages + [{"role": "assistant", "content": answer}])
+            return answer, stats
+    cacheable = cached_as is not None and first_question
+    
+    for step in range(1, MAX_STEPS + 1):
+        step_started = time.perf_counter()
+        
+        # Stream the model's response; tool calls start while it is still streaming
+        content, tool_calls, first_token_seconds = await stream_completion(
+            prompts.build(turn_messages), tools, record_first_token
+        )
+        llm_seconds = time.perf_counter() - step_started
+        
+        # Done when the model answers without calling a tool
+        if not tool_calls.calls:
+            stats.steps.append({"step": step, "llm_seconds": llm_seconds, "first_token_seconds": first_token_seconds,
+                                "tool_seconds": 0.0, "tool_calls": 0})
+            turn_messages.append({"role": "assistant", "content": content})
+            prompts.record_turn(turn_messages)
+            if cacheable and content:
+                answer_cache.put(cached_as[0], user_message, cached_as[1], content)
+            return content, stats
+        
+        # Add the assistant's response with tool calls to the conversation
+        turn_messages.append({
+            "role": "assistant",
+            "content": content,
+            "tool_calls": tool_calls.assistant_tool_calls()
+        })
+        
+        # Add every tool result to the conversation
+        tools_waited = time.perf_counter()
+        for call, tool_result in await tool_calls.results(deadline - time.monotonic()):
+            turn_messages.append({
                 "role": "tool",
-                "tool_call_id": tool_call.id,
-                "content": str(tool_result)
+                "tool_call_id": call["id"],
+                "content": (tool_result_text(call["name"], tool_result, TOOL_RESULT_TOKEN_BUDGET)
+                            if TOOL_RESULT_SHAPING else str(tool_result))
             })
-            
-            # Get final response from Mistral
-            final_response = mistral_client.chat.complete(
-                model=MODEL_NAME,
-                messages=messages,
-                tools=tools
-            )
-            
-            return final_response.choices[0].message.content
+            # Answers built on failed calls are not kept, and a change to the
+            # customer's data drops every answer cached for them
+            if isinstance(tool_result, str):
+                cacheable = False
+            elif call["name"] not in read_only_tools:
+                cacheable = False
+                if cached_as is not None:
+                    answer_cache.invalidate(cached_as[0])
+        
+        stats.steps.append({
+            "step": step,
+            "llm_seconds": llm_seconds,
+            "first_token_seconds": first_token_seconds,
+            "tool_seconds": time.perf_counter() - tools_waited,
+            "tool_calls": len(tool_calls.calls),
+        })
+        if time.monotonic() >= deadline:
+            break
     
-    return response.choices[0].message.content
+    # Budget spent: ask for an answer from the results gathered so far
+    final_started = time.perf_counter()
+    content, _, first_token_seconds = await stream_completion(
+        prompts.build(turn_messages), tools, record_first_token, tool_choice="none"
+    )
+    stats.steps.append({"step": len(stats.steps) + 1, "llm_seconds": time.perf_counter() - final_started,
+                        "first_token_seconds": first_token_seconds, "tool_seconds": 0.0, "tool_calls": 0})
+    turn_messages.append({"role": "assistant", "content": content})
+    prompts.record_turn(turn_messages)
+    return content, stats
 
 async def main():
     """Interactive chat loop with MCP tools"""
@@ -108,10 +428,12 @@ async def main():
     print("=" * 60)
     print()
     
+    show_stats = bool(os.getenv("CHAT_STATS"))
+    
     while True:
         try:
-            # Get user input
-            user_query = input("You: ").strip()
+            # Get user input without blocking the event loop
+            user_query = (await asyncio.to_thread(input, "You: ")).strip()
             
             # Check for exit commands
             if user_query.lower() in ['exit', 'quit', 'q']:
@@ -122,10 +444,21 @@ async def main():
             if not user_query:
                 continue
             
-            # Get response from chat_with_tools
+            # Stream the response from chat_with_tools as it is generated
             print("\nAssistant: ", end="", flush=True)
-            response = await chat_with_tools(user_query)
-            print(response)
+            _, stats = await chat_with_tools(user_query, on_token=lambda token: print(token, end="", flush=True))
+            print()
+            if show_stats:
+                print(f"[trace: {stats.trace_id}]")
+                if stats.first_token_seconds is not None:
+                    print(f"[time to first token: {stats.first_token_seconds:.2f}s]")
+                print(f"[mcp handshakes: {stats.counts['mcp_handshakes']}, "
+                      f"tool list fetches: {stats.counts['tool_list_fetches']}, "
+                      f"tool calls: {stats.counts['tool_calls']}, "
+                      f"answer cache hits: {stats.counts['answer_cache_hits']}]")
+                for timing in stats.steps:
+                    print(f"[step {timing['step']}: llm {timing['llm_seconds']:.2f}s, "
+                          f"{timing['tool_calls']} tool calls {timing['tool_seconds']:.2f}s]")
             print()
             
         except KeyboardInterrupt:
@@ -134,6 +467,8 @@ async def main():
         except Exception as e:
             print(f"\nError: {e}")
             print()
+    
+    await close_mcp_session()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+"""
+Streaming ingestion of transaction feeds
+
+Daily transaction files arrive as NDJSON (one JSON object per line) or CSV
+(a header line, then one transaction per line; quoted fields must not span
+lines). A TransactionIngestor is fed the raw bytes of a feed as they arrive,
+splits them into lines and applies the rows in chunks: each chunk is
+written in one repository transaction (see
+BankingRepository.ingest_transactions) that inserts the transactions, adds
+their amounts to the account balances, updates the account aggregates and
+bumps the versions of the accounts and their customers. Only the current
+chunk is held in memory, whatever the size of the feed.
+
+Rows have the fields of the API Transaction without ``id``, which is
+allocated: ``account_id``, ``type``, ``amount`` (signed, deposits positive
+and withdrawals negative), ``date`` (ISO date or timestamp, UTC unless it
+has an offset) and ``reference``, plus optional ``description`` and
+``status`` (default "completed"). The reference is the idempotency key per
+account, so a feed that failed halfway is simply loaded again: rows already
+applied count as duplicates. Rows that fail validation or name an unknown
+account are rejected one by one, with their line number, and do not stop
+the load.
+
+The API streams feeds into POST /transactions/ingest. This script loads a
+file into a SQLite database directly, or streams it to the API:
+
+    python ingest.py transactions-2024-06-30.ndjson --db banking.db
+    python ingest.py transactions-2024-06-30.csv.gz --api http://127.0.0.1:8000
+
+Either way it prints the rows applied, skipped and rejected and the
+throughput in rows per second.
+"""
+
+import argparse
+import csv
+import gzip
+import json
+import math
+import os
+import sys
+import time
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from repository import BankingRepository, SQLiteRepository
+from transaction_store import format_timestamp, parse_timestamp
+
+FEED_FORMATS = ("ndjson", "csv")
+CONTENT_TYPES = {
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+    "text/csv": "csv",
+}
+REQUIRED_FIELDS = ("account_id", "type", "amount", "date", "reference")
+DEFAULT_CHUNK_SIZE = 1000
+# Longer lines are rejected, and not buffered, so a feed without newlines cannot fill the memory
+MAX_LINE_BYTES = 64 * 1024
+# Rejected rows reported with their line and reason; later ones are only counted
+MAX_REPORTED_ERRORS = 100
+
+
+class FeedError(ValueError):
+    """The feed as a whole cannot be read, e.g. a CSV header without required columns"""
+
+
+def detect_format(name: str) -> str:
+    """Feed format named by a file name ("day.csv.gz") or a content type ("application/x-ndjson")"""
+    name = name.split(";")[0].strip().lower()
+    if name in FEED_FORMATS:
+        return name
+    if name in CONTENT_TYPES:
+        return CONTENT_TYPES[name]
+    if name.endswith(".gz"):
+        name = name[:-3]
+    if name.endswith(".csv"):
+        return "csv"
+    if name.endswith((".ndjson", ".jsonl")):
+        return "ndjson"
+    raise FeedError(f"Unknown feed format {name!r}, expected one of: {', '.join(FEED_FORMATS)}")
+
+
+def _text(row: Dict[str, Any], field: str, default: Optional[str] = None) -> str:
+    value = row.get(field)
+    if value is None or value == "":
+        if default is None:
+            raise ValueError(f"Missing {field}")
+        return default
+    if not isinstance(value, str):
+        raise ValueError(f"Invalid {field} {value!r}, expected a string")
+    return value
+
+
+def validate_row(row: Dict[str, Any]) -> Dict[str, Any]:
+    """A transaction record, without id, from a feed row; raises ValueError if the row is invalid"""
+    txn_type = _text(row, "type")
+    amount = row.get("amount")
+    if amount is None or amount == "" or isinstance(amount, bool):
+        raise ValueError(f"Invalid amount {amount!r}")
+    try:
+        amount = float(amount)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid amount {amount!r}") from None
+    if not math.isfinite(amount):
+        raise ValueError(f"Invalid amount {amount!r}")
+    # Amounts are signed; an unsigned withdrawal would credit the account
+    if (txn_type == "deposit" and amount < 0) or (txn_type == "withdrawal" and amount > 0):
+        raise ValueError(f"Amount {amount} has the wrong sign for a {txn_type}")
+    date = _text(row, "date")
+    try:
+        # Stored in one form, so dates sort correctly as text
+        date = format_timestamp(parse_timestamp(date))
+    except ValueError:
+        raise ValueError(f"Invalid date {date!r}, expected e.g. 2024-01-31T09:00:00Z") from None
+    return {
+        "account_id": _text(row, "account_id"),
+        "type": txn_type,
+        "amount": round(amount, 2),
+        "description": _text(row, "description", ""),
+        "date": date,
+        "status": _text(row, "status", "completed"),
+        "reference": _text(row, "reference"),
+    }
+
+
+class TransactionIngestor:
+    """Applies a transaction feed to a repository in chunks as its bytes arrive.
+
+    Call feed() with the data as it is read and finish() at the end, which
+    applies the last chunk and returns the report.
+    """
+
+    def __init__(self, repository: BankingRepository, feed_format: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        if feed_format not in FEED_FORMATS:
+            raise FeedError(f"Unknown feed format {feed_format!r}, expected one of: {', '.join(FEED_FORMATS)}")
+        self.repository = repository
+        self.format = feed_format
+        self.chunk_size = chunk_size
+        self.header: Optional[List[str]] = None
+        self.buffer = bytearray()
+        # Discarding the rest of an overlong line
+        self.skipping = False
+        self.line_number = 0
+        self.pending: List[Tuple[int, Dict[str, Any]]] = []
+        self.rows = self.applied = self.duplicates = self.rejected = self.chunks = 0
+        self.errors: List[Dict[str, Any]] = []
+        self.started = time.perf_counter()
+
+    def feed(self, data: bytes):
+        """Process the complete lines in ``data`` and keep the rest for the next call"""
+        self.buffer += data
+        start = 0
+        while True:
+            end = self.buffer.find(b"\n", start)
+            if end < 0:
+                break
+            if self.skipping:
+                self.skipping = False
+            else:
+                self._line(bytes(self.buffer[start:end]))
+            start = end + 1
+        del self.buffer[:start]
+        if not self.skipping and len(self.buffer) > MAX_LINE_BYTES:
+            self._line(bytes(self.buffer))
+            self.skipping = True
+        if self.skipping:
+            self.buffer.clear()
+
+    def finish(self) -> Dict[str, Any]:
+        """Apply what is left of the feed and return the report"""
+        if self.buffer and not self.skipping:
+            self._line(bytes(self.buffer))
+        self.buffer.clear()
+        self._apply()
+        return self.report()
+
+    def report(self) -> Dict[str, Any]:
+        seconds = time.perf_counter() - self.started
+        return {
+            "rows": self.rows,
+            "applied": self.applied,
+            "duplicates": self.duplicates,
+            "rejected": self.rejected,
+            "chunks": self.chunks,
+            "errors": self.errors,
+            "seconds": round(seconds, 3),
+            "rows_per_second": round(self.rows / seconds, 1) if seconds > 0 else 0.0,
+        }
+
+    def _reject(self, line_number: int, error: str):
+        self.rejected += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "error": error})
+
+    def _line(self, raw: bytes):
+        self.line_number += 1
+        if len(raw) > MAX_LINE_BYTES:
+            self.rows += 1
+            self._reject(self.line_number, f"Line longer than {MAX_LINE_BYTES} bytes")
+            return
+        try:
+            line = raw.decode("utf-8")
+        except UnicodeDecodeError:
+            self.rows += 1
+            self._reject(self.line_number, "Invalid UTF-8")
+            return
+        if self.line_number == 1:
+            line = line.lstrip("\ufeff")
+        line = line.strip()
+        if not line:
+            return
+        if self.format == "csv" and self.header is None:
+            self.header = [name.strip() for name in next(csv.reader([line]))]
+            missing = [field for field in REQUIRED_FIELDS if field not in self.header]
+            if missing:
+                raise FeedError(f"CSV header lacks {', '.join(missing)}")
+            return
+        self.rows += 1
+        try:
+            if self.format == "csv":
+                values = next(csv.reader([line]))
+                if len(values) != len(self.header):
+                    raise ValueError(f"Expected {len(self.header)} fields, got {len(values)}")
+                row = dict(zip(self.header, values))
+            else:
+                row = json.loads(line)
+                if not isinstance(row, dict):
+                    raise ValueError("Expected a JSON object")
+            self.pending.append((self.line_number, validate_row(row)))
+        except ValueError as e:
+            self._reject(self.line_number, str(e))
+        if len(self.pending) >= self.chunk_size:
+            self._apply()
+
+    def _apply(self):
+        """Write the pending rows as one chunk"""
+        pending, self.pending = self.pending, []
+        if not pending:
+            return
+        accounts = self.repository.get_accounts(list({txn["account_id"] for _, txn in pending}))
+        known = []
+        for line_number, txn in pending:
+            if txn["account_id"] in accounts:
+                known.append(txn)
+            else:
+                self._reject(line_number, f"Unknown account {txn['account_id']}")
+        # Ids only for rows not applied before, so loading a feed again uses none
+        existing = self.repository.existing_references([(txn["account_id"], txn["reference"]) for txn in known])
+        new = [txn for txn in known if (txn["account_id"], txn["reference"]) not in existing]
+        for txn, txn_id in zip(new, self.repository.next_ids("transaction", len(new))):
+            txn["id"] = txn_id
+        applied = self.repository.ingest_transactions(new) if new else []
+        self.applied += len(applied)
+        self.duplicates += len(known) - len(applied)
+        self.chunks += 1
+
+
+def read_blocks(path: str, size: int = 1 << 16) -> Iterator[bytes]:
+    """The bytes of a file, gunzipped if its name ends in .gz, in blocks"""
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rb") as feed:
+        while True:
+            block = feed.read(size)
+            if not block:
+                return
+            yield block
+
+
+def ingest_file(repository: BankingRepository, path: str, feed_format: str,
+                chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    ingestor = TransactionIngestor(repository, feed_format, chunk_size)
+    for block in read_blocks(path):
+        ingestor.feed(block)
+    return ingestor.finish()
+
+
+def post_file(api_url: str, path: str, feed_format: str, chunk_size: int = DEFAULT_CHUNK_SIZE,
+              timeout: float = 3600.0) -> Dict[str, Any]:
+    """Stream the file to the API's ingestion endpoint and return its report"""
+    import httpx
+
+    content_type = {"ndjson": "application/x-ndjson", "csv": "text/csv"}[feed_format]
+    response = httpx.post(f"{api_url.rstrip('/')}/transactions/ingest", params={"chunk_size": chunk_size},
+                          content=read_blocks(path), headers={"Content-Type": content_type},
+                          timeout=httpx.Timeout(timeout, connect=10.0))
+    if response.status_code != 200:
+        raise SystemExit(f"Ingestion failed with {response.status_code}: {response.text}")
+    return response.json()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load an NDJSON or CSV transaction feed")
+    parser.add_argument("feed", help="feed file, optionally gzipped (.gz)")
+    parser.add_argument("--format", choices=FEED_FORMATS, help="feed format (default: from the file name)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="rows per transaction")
+    target = parser.add_mutually_exclusive_group()
+    target.add_argument("--db", help="load into this SQLite database directly")
+    target.add_argument("--api", default=os.getenv("BANKING_API_URL", "http://127.0.0.1:8000"),
+                        help="stream to this banking API (default: BANKING_API_URL or http://127.0.0.1:8000)")
+    parser.add_argument("--json", action="store_true", help="print the full report as JSON")
+    args = parser.parse_args()
+    if args.chunk_size < 1:
+        parser.error("--chunk-size must be at least 1")
+    try:
+        feed_format = args.format or detect_format(args.feed)
+    except FeedError as e:
+        parser.error(f"{e}; pass --format")
+
+    try:
+        if args.db:
+            repository = SQLiteRepository(args.db)
+            try:
+                report = ingest_file(repository, args.feed, feed_format, args.chunk_size)
+            finally:
+                repository.close()
+        else:
+            report = post_file(args.api, args.feed, feed_format, args.chunk_size)
+    except FeedError as e:
+        raise SystemExit(f"Ingestion failed: {e}")
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    for error in report["errors"]:
+        print(f"line {error['line']}: {error['error']}", file=sys.stderr)
+    if report["rejected"] > len(report["errors"]):
+        print(f"... {report['rejected'] - len(report['errors'])} more rejected rows", file=sys.stderr)
+    print(f"{report['rows']:,} rows in {report['seconds']:.1f}s ({report['rows_per_second']:,.0f} rows/s): "
+          f"{report['applied']:,} applied, {report['duplicates']:,} duplicates, {report['rejected']:,} rejected")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+"""
+LLM backends for the chat client
+
+A backend streams one chat completion as a sequence of message deltas, each
+with optional ``content`` and ``tool_calls`` in the Mistral delta format.
+``MistralBackend`` calls the Mistral API; ``ScriptedBackend`` replays
+recorded tool-calling responses locally with configurable synthetic latency,
+so the agent loop can be run offline and deterministically.
+
+The backend is selected with ``LLM_BACKEND=mistral|scripted``.
+"""
+
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+MODEL_NAME = "mistral-large-latest"
+
+
+class LLMBackend(ABC):
+    @abstractmethod
+    def stream(self, messages: List[Dict[str, Any]], tools: Optional[List[Dict[str, Any]]] = None, **kwargs):
+        """Async context manager yielding an async iterator of message deltas"""
+
+
+class MistralBackend(LLMBackend):
+    def __init__(self, api_key: Optional[str], model: str = MODEL_NAME):
+        from mistralai import Mistral
+
+        self.client = Mistral(api_key=api_key)
+        self.model = model
+
+    @asynccontextmanager
+    async def stream(self, messages, tools=None, **kwargs):
+        events = await self.client.chat.stream_async(model=self.model, messages=messages, tools=tools, **kwargs)
+        async with events:
+            yield (event.data.choices[0].delta async for event in events if event.data.choices)
+
+
+def _delta(content=None, tool_calls=None):
+    return SimpleNamespace(content=content, tool_calls=tool_calls)
+
+def _tool_call_delta(index: int, call_id: str, name: str, arguments: Dict[str, Any]):
+    return SimpleNamespace(index=index, id=call_id,
+                           function=SimpleNamespace(name=name, arguments=json.dumps(arguments)))
+
+
+class ScriptedBackend(LLMBackend):
+    """Replays recorded tool-calling responses.
+
+    ``script`` maps a user message to its recorded response: the
+    ``tool_calls`` of the first step, the optional ``then`` calls of the
+    second step, and an optional final ``answer``. Every step waits
+    ``first_token_latency`` seconds before the first delta and
+    ``token_latency`` seconds between deltas. Unknown messages are answered
+    without tool calls.
+    """
+
+    def __init__(self, script: Dict[str, Dict[str, Any]], first_token_latency: float = 0.0,
+                 token_latency: float = 0.0):
+        self.script = script
+        self.first_token_latency = first_token_latency
+        self.token_latency = token_latency
+        self.calls = 0
+
+    @classmethod
+    def from_jsonl(cls, path: str, placeholders: Optional[Dict[str, str]] = None, **kwargs) -> "ScriptedBackend":
+        """Load a script of ``{"query", "tool_calls", "then", "answer"}`` lines.
+
+        ``{name}`` placeholders in the entries are replaced with ``placeholders[name]``.
+        """
+        script = {}
+        with open(path) as script_file:
+            for line in script_file:
+                if not line.strip():
+                    continue
+                for key, value in (placeholders or {}).items():
+                    line = line.replace("{" + key + "}", value)
+                entry = json.loads(line)
+                script[entry["query"]] = entry
+        return cls(script, **kwargs)
+
+    def _deltas(self, messages: List[Dict[str, Any]], tool_choice: Optional[str]) -> List[Any]:
+        user_index = max(i for i, message in enumerate(messages) if message["role"] == "user")
+        step = sum(1 for message in messages[user_index:] if message["role"] == "assistant")
+        entry = self.script.get(messages[user_index]["content"], {})
+        steps = [calls for calls in (entry.get("tool_calls"), entry.get("then")) if calls]
+
+        if step < len(steps) and tool_choice != "none":
+            return [_delta(tool_calls=[_tool_call_delta(index, f"call-{step}-{index}", call["name"], call["arguments"])])
+                    for index, call in enumerate(steps[step])]
+        tool_results = sum(1 for message in messages[user_index:] if message["role"] == "tool")
+        answer = entry.get("answer") or f"Here is what I found using {tool_results} tool results for your request."
+        return [_delta(content=word + " ") for word in answer.split(" ")]
+
+    async def _replay(self, deltas: List[Any]) -> AsyncIterator[Any]:
+        await asyncio.sleep(self.first_token_latency)
+        for position, delta in enumerate(deltas):
+            if position:
+                await asyncio.sleep(self.token_latency)
+            yield delta
+
+    @asynccontextmanager
+    async def stream(self, messages, tools=None, tool_choice=None, **kwargs):
+        self.calls += 1
+        yield self._replay(self._deltas(messages, tool_choice))
+
+
+def create_llm_backend() -> LLMBackend:
+    """Create the backend configured by LLM_BACKEND"""
+    backend = os.getenv("LLM_BACKEND", "mistral")
+    if backend == "mistral":
+        return MistralBackend(os.getenv("MISTRAL_API_KEY"), os.getenv("MISTRAL_MODEL", MODEL_NAME))
+    if backend == "scripted":
+        return ScriptedBackend.from_jsonl(
+            os.getenv("LLM_SCRIPT_PATH", "benchmarks/corpus.jsonl"),
+            first_token_latency=float(os.getenv("LLM_FIRST_TOKEN_MS", "0")) / 1000,
+            token_latency=float(os.getenv("LLM_TOKEN_MS", "0")) / 1000,
+        )
+    raise ValueError(f"Unknown LLM_BACKEND: {backend}")
@@ -0,0 +1,67 @@
+"""
+Prompt and conversation history management for the chat client
+
+The system prompt is loaded once and reloaded only when its file changes.
+Every LLM call is built as system prompt + conversation history + the
+current turn, so the stable prefix is byte-identical across calls and
+provider-side prefix caching can hit. History is bounded by a token budget;
+the oldest whole turns are dropped first, so tool calls and their results
+always stay together.
+"""
+
+import copy
+import json
+import os
+from typing import Any, Dict, List
+
+import yaml
+
+
+def estimate_tokens(message: Dict[str, Any]) -> int:
+    """Rough token estimate (about four characters per token)"""
+    return len(json.dumps(message, default=str)) // 4 + 1
+
+
+class PromptManager:
+    def __init__(self, path: str, history_token_budget: int = 8000, max_history_turns: int = 20):
+        self.path = path
+        self.history_token_budget = history_token_budget
+        self.max_history_turns = max_history_turns
+        self.turns: List[List[Dict[str, Any]]] = []
+        self._system_messages: List[Dict[str, Any]] = []
+        self._mtime = None
+
+    def system_messages(self) -> List[Dict[str, Any]]:
+        """Return the system prompt messages, reloading them if the file changed"""
+        mtime = os.stat(self.path).st_mtime_ns
+        if mtime != self._mtime:
+            with open(self.path, "r") as prompt_file:
+                self._system_messages = yaml.safe_load(prompt_file)["messages"]
+            self._mtime = mtime
+        return self._system_messages
+
+    def prompt_version(self) -> int:
+        """Changes whenever the system prompt file changes"""
+        self.system_messages()
+        return self._mtime
+
+    def history(self) -> List[Dict[str, Any]]:
+        return [message for turn in self.turns for message in turn]
+
+    def build(self, turn_messages: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Messages for one LLM call: stable prefix first, then the current turn"""
+        return self.system_messages() + self.history() + turn_messages
+
+    def record_turn(self, turn_messages: List[Dict[str, Any]]):
+        """Add a finished turn to the history and trim it to the budget"""
+        self.turns.append(copy.deepcopy(turn_messages))
+        while len(self.turns) > self.max_history_turns:
+            self.turns.pop(0)
+        while self.turns and self.history_tokens() > self.history_token_budget:
+            self.turns.pop(0)
+
+    def history_tokens(self) -> int:
+        return sum(estimate_tokens(message) for message in self.history())
+
+    def clear(self):
+        self.turns.clear()
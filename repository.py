@@ -0,0 +1,871 @@
+"""
+Storage backends for the Mock Banking API
+
+The API endpoints talk to a BankingRepository. Two implementations exist:
+InMemoryRepository keeps everything in Python dicts with secondary indexes,
+SQLiteRepository persists to an embedded SQLite database so data survives
+restarts and can be shared between uvicorn workers. The backend is chosen
+with the BANKING_STORAGE environment variable (see create_repository).
+
+Ids come from per-kind sequences advanced atomically (see id_allocator), and
+every write that touches several records happens in one transaction, so
+concurrent writers, threads or worker processes, never collide or leave
+partial results.
+"""
+
+import base64
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import contextmanager
+from itertools import islice
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from account_aggregates import AccountAggregates, build_summary, split_range
+from id_allocator import ID_PREFIXES, IdAllocator, id_number
+from search_index import DocumentIndex, tokenize
+from transaction_store import ColumnarTransactionStore, parse_timestamp
+
+CUSTOMER_FIELDS = ["id", "name", "email", "phone", "address", "date_of_birth", "ssn", "risk_profile", "created_date"]
+ACCOUNT_FIELDS = ["id", "customer_id", "account_number", "type", "balance", "currency", "status",
+                  "created_date", "interest_rate", "overdraft_limit"]
+TRANSACTION_FIELDS = ["id", "account_id", "type", "amount", "description", "date", "status", "reference"]
+DOCUMENT_FIELDS = ["id", "customer_id", "type", "content", "date"]
+
+# Version key bumped by bulk loads, which change too many entities to track one by one
+GLOBAL_VERSION_KEY = "*"
+
+
+def version_key(kind: str, entity_id: str) -> str:
+    """Key of the version counter of a "customer" or "account" and what hangs off it"""
+    return f"{kind}:{entity_id}"
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(date: str, txn_id: str) -> str:
+    """Encode the position of a transaction as an opaque cursor"""
+    raw = json.dumps([date, txn_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode()
+
+def decode_cursor(cursor: str) -> Tuple[str, str]:
+    """Decode an opaque cursor into a (date, id) sort key; the date must be an ISO date or timestamp"""
+    try:
+        date, txn_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        date, txn_id = str(date), str(txn_id)
+        parse_timestamp(date)
+    except (ValueError, TypeError):
+        raise InvalidCursor(cursor)
+    return date, txn_id
+
+
+class BankingRepository(ABC):
+    """Storage interface used by the banking API endpoints.
+
+    Records are plain dicts with the same fields as the API models.
+    """
+
+    @abstractmethod
+    def list_customers(self) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def get_customer(self, customer_id: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def list_accounts(self) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def get_account(self, account_id: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def get_customer_accounts(self, customer_id: str) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def get_customer_documents(self, customer_id: str) -> List[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def search_documents(self, customer_id: str, query: str, limit: int, doc_type: Optional[str] = None,
+                         from_date: Optional[str] = None, to_date: Optional[str] = None
+                         ) -> List[Tuple[Dict[str, Any], float]]:
+        """Full-text search of a customer's documents, best BM25 match first"""
+
+    @abstractmethod
+    def page_transactions(self, account_id: str, limit: int, cursor: Optional[str] = None,
+                          from_date: Optional[str] = None, to_date: Optional[str] = None,
+                          txn_type: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return one page of an account's transactions, newest first.
+
+        ``from_date`` is inclusive and ``to_date`` exclusive; both are ISO dates or
+        timestamps. The returned cursor continues after the last item of the page.
+        Raises InvalidCursor for a malformed cursor.
+        """
+
+    @abstractmethod
+    def get_account_summary(self, account_id: str, start: Optional[str] = None,
+                            end: Optional[str] = None) -> Dict[str, Any]:
+        """Precomputed transaction aggregates of an account.
+
+        Returns the transaction count, net change (sum of all transaction
+        amounts) and per-month count and total per transaction type. ``start``
+        and ``end`` are inclusive months ("YYYY-MM"), or ISO dates or
+        timestamps, ``start`` inclusive and ``end`` exclusive; the partial
+        months of a date range are summed from its transactions. Raises
+        ValueError for a malformed bound.
+        """
+
+    @abstractmethod
+    def get_accounts(self, account_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the existing accounts among ``account_ids``, keyed by id"""
+
+    @abstractmethod
+    def get_transactions(self, txn_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Return the existing transactions among ``txn_ids``, keyed by id"""
+
+    @abstractmethod
+    def set_account_status(self, account_id: str, status: str) -> Optional[Dict[str, Any]]: ...
+
+    @abstractmethod
+    def set_accounts_status(self, account_ids: List[str], status: str) -> Dict[str, Dict[str, Any]]:
+        """Set the status of several accounts at once and return the updated ones, keyed by id"""
+
+    @abstractmethod
+    def get_versions(self, keys: List[str]) -> Dict[str, Tuple[int, float]]:
+        """Return (version, last modified timestamp) for each version key.
+
+        Every write bumps the versions of the entities whose reads it changes:
+        the customer for its profile, account list and documents, the account
+        for its record, transactions and summary. Entities never written have
+        version 0.
+        """
+
+    id_allocator: IdAllocator
+
+    @abstractmethod
+    def reserve_ids(self, kind: str, count: int) -> int:
+        """Atomically advance the id sequence of ``kind`` by ``count`` and return the first reserved number.
+
+        Sequences start after the highest id number already stored. Callers
+        that write records with ids of their own through bulk_load reserve
+        them here first.
+        """
+
+    def next_id(self, kind: str) -> str:
+        """Allocate a new id for "customer", "account", "transaction" or "document" records"""
+        return self.id_allocator.allocate(kind)[0]
+
+    def next_ids(self, kind: str, count: int) -> List[str]:
+        """Allocate ``count`` new ids; unique across workers and increasing within this one"""
+        return self.id_allocator.allocate(kind, count)
+
+    @abstractmethod
+    def create_accounts(self, accounts: List[Dict[str, Any]], transactions: List[Dict[str, Any]] = ()):
+        """Insert new accounts and their opening transactions, all or none.
+
+        Raises ValueError (in memory) or sqlite3.IntegrityError for a duplicate id.
+        """
+
+    @abstractmethod
+    def add_transaction(self, transaction: Dict[str, Any]): ...
+
+    @abstractmethod
+    def existing_references(self, keys: List[Tuple[str, str]]) -> Set[Tuple[str, str]]:
+        """The (account_id, reference) pairs of ``keys`` that stored transactions already have"""
+
+    @abstractmethod
+    def ingest_transactions(self, transactions: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Apply a chunk of new transactions, all or none, and return those that were applied.
+
+        Each applied transaction's amount is added to its account's balance.
+        The reference is the idempotency key, per account (the two legs of a
+        transfer share one): a transaction whose (account_id, reference) is
+        already stored, or repeats an earlier one of the chunk, is skipped, so
+        a feed can be loaded again without applying anything twice. Raises
+        ValueError for an unknown account.
+        """
+
+    @abstractmethod
+    def add_document(self, document: Dict[str, Any]): ...
+
+    @abstractmethod
+    def bulk_load(self, customers: Iterable[Dict[str, Any]] = (), accounts: Iterable[Dict[str, Any]] = (),
+                  transactions: Iterable[Dict[str, Any]] = (), documents: Iterable[Dict[str, Any]] = ()):
+        """Insert large batches of records, e.g. seed data or synthetic load test data"""
+
+    def close(self):
+        pass
+
+
+class LockStripes:
+    """Per-key locking over a fixed pool of locks that keys hash onto"""
+
+    def __init__(self, stripes: int = 64):
+        self.locks = [threading.Lock() for _ in range(stripes)]
+
+    @contextmanager
+    def hold(self, keys: Iterable[str]):
+        # Acquire in stripe order, so two holders of overlapping keys cannot deadlock
+        stripes = sorted({hash(key) % len(self.locks) for key in keys})
+        for stripe in stripes:
+            self.locks[stripe].acquire()
+        try:
+            yield
+        finally:
+            for stripe in reversed(stripes):
+                self.locks[stripe].release()
+
+
+class InMemoryRepository(BankingRepository):
+    """Dict-backed storage with secondary indexes.
+
+    Customer- and account-scoped lookups go through the indexes, so they cost
+    time proportional to the result size instead of the whole book.
+    Transactions live in a compact ColumnarTransactionStore; the given
+    transaction dicts are copied into it.
+
+    Writes are safe from several threads: changes to an account hold that
+    account's lock, and inserts into the shared records, indexes and
+    sequences hold the repository lock (always taken after account locks).
+    Reads that walk the indexes, aggregates or transaction store hold the
+    repository lock too, so they never see a structure mid-update.
+    """
+
+    def __init__(self, customers: Dict[str, Dict[str, Any]], accounts: Dict[str, Dict[str, Any]],
+                 transactions: Dict[str, Dict[str, Any]], documents: Dict[str, Dict[str, Any]]):
+        self.customers = customers
+        self.accounts = accounts
+        self.transactions = ColumnarTransactionStore()
+        for transaction in transactions.values():
+            self.transactions.append(transaction)
+        self.documents = documents
+        self.customer_account_index: Dict[str, List[str]] = defaultdict(list)
+        self.customer_document_index: Dict[str, List[str]] = defaultdict(list)
+        self.document_search_index = DocumentIndex(self.documents.__getitem__)
+        self.account_aggregates = AccountAggregates()
+        self.versions: Dict[str, Tuple[int, float]] = {}
+        self.created_at = time.time()
+        self.lock = threading.RLock()
+        self.account_locks = LockStripes()
+        self.sequences: Dict[str, int] = {}
+        self.id_allocator = IdAllocator(self.reserve_ids)
+        self.build_indexes()
+
+    def _index_account(self, account: Dict[str, Any]):
+        self.customer_account_index[account["customer_id"]].append(account["id"])
+
+    def _add_transaction(self, transaction: Dict[str, Any]):
+        # The store keeps its own per-account time index
+        self.transactions.append(transaction)
+        self.account_aggregates.add(transaction)
+
+    def _index_document(self, document: Dict[str, Any]):
+        self.customer_document_index[document["customer_id"]].append(document["id"])
+        self.document_search_index.add(document)
+
+    def build_indexes(self):
+        """(Re)build all secondary indexes from the primary records"""
+        self.customer_account_index.clear()
+        self.customer_document_index.clear()
+        self.document_search_index.clear()
+        self.account_aggregates.clear()
+        for account in self.accounts.values():
+            self._index_account(account)
+        for transaction in self.transactions.records():
+            self.account_aggregates.add(transaction)
+        for document in self.documents.values():
+            self._index_document(document)
+
+    def list_customers(self):
+        return list(self.customers.values())
+
+    def get_customer(self, customer_id):
+        return self.customers.get(customer_id)
+
+    def list_accounts(self):
+        return list(self.accounts.values())
+
+    def get_account(self, account_id):
+        return self.accounts.get(account_id)
+
+    def get_customer_accounts(self, customer_id):
+        with self.lock:
+            return [self.accounts[acc_id] for acc_id in self.customer_account_index.get(customer_id, [])]
+
+    def get_customer_documents(self, customer_id):
+        with self.lock:
+            return [self.documents[doc_id] for doc_id in self.customer_document_index.get(customer_id, [])]
+
+    def search_documents(self, customer_id, query, limit, doc_type=None, from_date=None, to_date=None):
+        with self.lock:
+            return self.document_search_index.search(customer_id, query, limit, doc_type, from_date, to_date)
+
+    def page_transactions(self, account_id, limit, cursor=None, from_date=None, to_date=None, txn_type=None):
+        before = None
+        if cursor:
+            date, txn_id = decode_cursor(cursor)
+            before = (parse_timestamp(date), txn_id)
+        from_ts = parse_timestamp(from_date) if from_date else None
+        to_ts = parse_timestamp(to_date) if to_date else None
+        with self.lock:
+            page, more = self.transactions.page(account_id, limit, before, from_ts, to_ts, txn_type)
+        return page, encode_cursor(page[-1]["date"], page[-1]["id"]) if more else None
+
+    def get_account_summary(self, account_id, start=None, end=None):
+        from_month, to_month, spans = split_range(start, end)
+        with self.lock:
+            partial_rows = [
+                {"month": month, "type": txn_type, "count": count, "total": total}
+                for month, span_from, span_to in spans
+                for txn_type, (count, total) in self.transactions.sum_amounts(
+                    account_id, parse_timestamp(span_from), parse_timestamp(span_to)).items()
+            ]
+            return self.account_aggregates.summary(account_id, from_month, to_month, partial_rows)
+
+    def get_accounts(self, account_ids):
+        return {acc_id: self.accounts[acc_id] for acc_id in account_ids if acc_id in self.accounts}
+
+    def get_transactions(self, txn_ids):
+        with self.lock:
+            found = {txn_id: self.transactions.get(txn_id) for txn_id in txn_ids}
+        return {txn_id: txn for txn_id, txn in found.items() if txn is not None}
+
+    def set_account_status(self, account_id, status):
+        return self.set_accounts_status([account_id], status).get(account_id)
+
+    def set_accounts_status(self, account_ids, status):
+        # Status is not an indexed field, so the indexes need no update here
+        with self.account_locks.hold(account_ids):
+            accounts = self.get_accounts(account_ids)
+            for account in accounts.values():
+                account["status"] = status
+            self._bump_versions([key for account in accounts.values()
+                                 for key in (version_key("account", account["id"]),
+                                             version_key("customer", account["customer_id"]))])
+        return accounts
+
+    def _bump_versions(self, keys: Iterable[str]):
+        now = time.time()
+        with self.lock:
+            for key in keys:
+                self.versions[key] = (self.versions.get(key, (0, now))[0] + 1, now)
+
+    def get_versions(self, keys):
+        return {key: self.versions.get(key, (0, self.created_at)) for key in keys}
+
+    def _max_id_number(self, kind: str) -> int:
+        if kind == "transaction":
+            # Ids that are not TXN<number> are stored as -1
+            return max(self.transactions.id_numbers, default=0)
+        records = {"customer": self.customers, "account": self.accounts, "document": self.documents}[kind]
+        return max(filter(None, (id_number(kind, record_id) for record_id in records)), default=0)
+
+    def reserve_ids(self, kind, count):
+        with self.lock:
+            first = self.sequences.get(kind)
+            if first is None:
+                first = self._max_id_number(kind) + 1
+            self.sequences[kind] = first + count
+            return first
+
+    def create_accounts(self, accounts, transactions=()):
+        with self.account_locks.hold([account["id"] for account in accounts]), self.lock:
+            # Check every id before writing anything, so a failure leaves no partial result
+            for account in accounts:
+                if account["id"] in self.accounts:
+                    raise ValueError(f"Duplicate account id {account['id']}")
+            for transaction in transactions:
+                if transaction["id"] in self.transactions:
+                    raise ValueError(f"Duplicate transaction id {transaction['id']}")
+            for account in accounts:
+                self.accounts[account["id"]] = account
+                self._index_account(account)
+            for transaction in transactions:
+                self._add_transaction(transaction)
+            self._bump_versions([version_key("customer", account["customer_id"]) for account in accounts]
+                                + [version_key("account", transaction["account_id"]) for transaction in transactions])
+
+    def add_transaction(self, transaction):
+        with self.account_locks.hold([transaction["account_id"]]), self.lock:
+            self._add_transaction(transaction)
+            self._bump_versions([version_key("account", transaction["account_id"])])
+
+    def existing_references(self, keys):
+        by_account: Dict[str, List[str]] = defaultdict(list)
+        for account_id, reference in keys:
+            by_account[account_id].append(reference)
+        with self.lock:
+            return {(account_id, reference) for account_id, references in by_account.items()
+                    for reference in self.transactions.find_references(account_id, references)}
+
+    def ingest_transactions(self, transactions):
+        account_ids = {transaction["account_id"] for transaction in transactions}
+        with self.account_locks.hold(account_ids), self.lock:
+            # Check everything before writing anything, so a failure leaves no partial result
+            for account_id in account_ids:
+                if account_id not in self.accounts:
+                    raise ValueError(f"Unknown account {account_id}")
+            keys = self.existing_references([(txn["account_id"], txn["reference"]) for txn in transactions])
+            applied = []
+            for transaction in transactions:
+                key = (transaction["account_id"], transaction["reference"])
+                if key in keys:
+                    continue
+                if transaction["id"] in self.transactions:
+                    raise ValueError(f"Duplicate transaction id {transaction['id']}")
+                keys.add(key)
+                applied.append(transaction)
+            for transaction in applied:
+                self._add_transaction(transaction)
+                account = self.accounts[transaction["account_id"]]
+                account["balance"] = round(account["balance"] + transaction["amount"], 2)
+            changed = [self.accounts[account_id] for account_id in {txn["account_id"] for txn in applied}]
+            self._bump_versions([key for account in changed
+                                 for key in (version_key("account", account["id"]),
+                                             version_key("customer", account["customer_id"]))])
+        return applied
+
+    def add_document(self, document):
+        with self.lock:
+            self.documents[document["id"]] = document
+            self._index_document(document)
+            self._bump_versions([version_key("customer", document["customer_id"])])
+
+    def bulk_load(self, customers=(), accounts=(), transactions=(), documents=()):
+        with self.lock:
+            for customer in customers:
+                self.customers[customer["id"]] = customer
+            for account in accounts:
+                self.accounts[account["id"]] = account
+                self._index_account(account)
+            for transaction in transactions:
+                self._add_transaction(transaction)
+            for document in documents:
+                self.documents[document["id"]] = document
+                self._index_document(document)
+            self._bump_versions([GLOBAL_VERSION_KEY])
+
+
+class SQLiteRepository(BankingRepository):
+    """Embedded SQLite storage.
+
+    The database runs in WAL mode so several worker processes can read while
+    one writes. All queries are parameterized and reuse the connection's
+    prepared statement cache. Writes run in BEGIN IMMEDIATE transactions,
+    which take the database write lock up front, so writers in other
+    processes queue on the busy timeout instead of failing mid-transaction.
+    Id sequences live in the database and each worker reserves blocks of
+    ``id_block_size`` ids from them.
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS customers (
+            id TEXT PRIMARY KEY, name TEXT NOT NULL, email TEXT NOT NULL, phone TEXT NOT NULL,
+            address TEXT NOT NULL, date_of_birth TEXT NOT NULL, ssn TEXT NOT NULL,
+            risk_profile TEXT NOT NULL, created_date TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS accounts (
+            id TEXT PRIMARY KEY, customer_id TEXT NOT NULL REFERENCES customers(id),
+            account_number TEXT NOT NULL, type TEXT NOT NULL, balance REAL NOT NULL,
+            currency TEXT NOT NULL, status TEXT NOT NULL, created_date TEXT NOT NULL,
+            interest_rate REAL NOT NULL, overdraft_limit REAL NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS transactions (
+            id TEXT PRIMARY KEY, account_id TEXT NOT NULL REFERENCES accounts(id),
+            type TEXT NOT NULL, amount REAL NOT NULL, description TEXT NOT NULL,
+            date TEXT NOT NULL, status TEXT NOT NULL, reference TEXT NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS documents (
+            id TEXT PRIMARY KEY, customer_id TEXT NOT NULL REFERENCES customers(id),
+            type TEXT NOT NULL, content TEXT NOT NULL, date TEXT NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_accounts_customer ON accounts(customer_id);
+        CREATE INDEX IF NOT EXISTS idx_transactions_account_date ON transactions(account_id, date, id);
+        CREATE INDEX IF NOT EXISTS idx_transactions_reference ON transactions(account_id, reference);
+        CREATE INDEX IF NOT EXISTS idx_documents_customer ON documents(customer_id, date);
+        CREATE TABLE IF NOT EXISTS entity_versions (
+            key TEXT PRIMARY KEY, version INTEGER NOT NULL, modified REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE IF NOT EXISTS id_sequences (
+            kind TEXT PRIMARY KEY, next INTEGER NOT NULL
+        ) WITHOUT ROWID;
+    """
+
+    # Full-text index over documents, kept in sync by a trigger. The customer id
+    # is an indexed column so searches only visit the customer's own postings.
+    SEARCH_SCHEMA = """
+        CREATE VIRTUAL TABLE documents_fts USING fts5(
+            customer_id, content, content='documents', content_rowid='rowid'
+        );
+        CREATE TRIGGER documents_fts_insert AFTER INSERT ON documents BEGIN
+            INSERT INTO documents_fts(rowid, customer_id, content) VALUES (new.rowid, new.customer_id, new.content);
+        END;
+        INSERT INTO documents_fts(documents_fts) VALUES ('rebuild');
+    """
+
+    # Per-account aggregates, kept up to date by a trigger on every transaction
+    # insert and backfilled from existing transactions when first created
+    AGGREGATE_SCHEMA = """
+        CREATE TABLE account_aggregates (
+            account_id TEXT PRIMARY KEY, count INTEGER NOT NULL, net_change REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE TABLE account_monthly_totals (
+            account_id TEXT NOT NULL, month TEXT NOT NULL, type TEXT NOT NULL,
+            count INTEGER NOT NULL, total REAL NOT NULL, PRIMARY KEY (account_id, month, type)
+        ) WITHOUT ROWID;
+        CREATE TRIGGER transactions_aggregate_insert AFTER INSERT ON transactions BEGIN
+            INSERT INTO account_aggregates VALUES (new.account_id, 1, new.amount)
+                ON CONFLICT(account_id) DO UPDATE
+                SET count = count + 1, net_change = net_change + excluded.net_change;
+            INSERT INTO account_monthly_totals VALUES (new.account_id, substr(new.date, 1, 7), new.type, 1, new.amount)
+                ON CONFLICT(account_id, month, type) DO UPDATE
+                SET count = count + 1, total = total + excluded.total;
+        END;
+        INSERT INTO account_aggregates
+            SELECT account_id, COUNT(*), SUM(amount) FROM transactions GROUP BY account_id;
+        INSERT INTO account_monthly_totals
+            SELECT account_id, substr(date, 1, 7), type, COUNT(*), SUM(amount) FROM transactions GROUP BY 1, 2, 3;
+    """
+
+    TABLES = {"customer": "customers", "account": "accounts", "transaction": "transactions", "document": "documents"}
+    BULK_CHUNK_SIZE = 10_000
+
+    # Version key holding the creation time of the database, the Last-Modified
+    # of entities never written; shared by all workers and kept across restarts
+    CREATED_KEY = "database:created"
+
+    def __init__(self, path: str, id_block_size: int = 32):
+        self.path = path
+        self.lock = threading.RLock()
+        self.id_allocator = IdAllocator(self.reserve_ids, id_block_size)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, cached_statements=512)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("PRAGMA foreign_keys=ON")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        # One write transaction that checks what exists inside it, so workers
+        # opening a fresh database together create and backfill everything once
+        with self._write():
+            self._run_script(self.SCHEMA)
+            if self._one("SELECT 1 FROM sqlite_master WHERE name = 'documents_fts'") is None:
+                self._run_script(self.SEARCH_SCHEMA)
+            if self._one("SELECT 1 FROM sqlite_master WHERE name = 'account_aggregates'") is None:
+                self._run_script(self.AGGREGATE_SCHEMA)
+            elif self._one("SELECT 1 FROM pragma_table_info('account_aggregates') WHERE name = 'running_balance'"):
+                # Renamed: the column is a net sum of amounts, not a balance
+                self.conn.execute("ALTER TABLE account_aggregates RENAME COLUMN running_balance TO net_change")
+            self.conn.execute("INSERT OR IGNORE INTO entity_versions VALUES (?, 0, ?)",
+                              (self.CREATED_KEY, time.time()))
+        self.created_at = self._one("SELECT modified FROM entity_versions WHERE key = ?",
+                                    (self.CREATED_KEY,))["modified"]
+
+    def is_empty(self) -> bool:
+        return self._one("SELECT 1 FROM customers LIMIT 1") is None
+
+    def seed(self, customers: Iterable[Dict[str, Any]], accounts: Iterable[Dict[str, Any]],
+             transactions: Iterable[Dict[str, Any]], documents: Iterable[Dict[str, Any]]) -> bool:
+        """Load the records if the database is empty; returns whether it did.
+
+        Checks and loads in one transaction, so workers starting at the same
+        time seed the database exactly once.
+        """
+        with self._write():
+            if not self.is_empty():
+                return False
+            tables = [("customers", CUSTOMER_FIELDS, customers), ("accounts", ACCOUNT_FIELDS, accounts),
+                      ("transactions", TRANSACTION_FIELDS, transactions), ("documents", DOCUMENT_FIELDS, documents)]
+            for table, fields, rows in tables:
+                self.conn.executemany(self._insert_sql(table, fields),
+                                      [tuple(row[field] for field in fields) for row in rows])
+            self._bump_versions([GLOBAL_VERSION_KEY])
+        return True
+
+    def _all(self, sql: str, params: Tuple = ()) -> List[Dict[str, Any]]:
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(sql, params)]
+
+    def _one(self, sql: str, params: Tuple = ()) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute(sql, params).fetchone()
+        return dict(row) if row is not None else None
+
+    @contextmanager
+    def _write(self):
+        """Run the block in one write transaction"""
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+    def _run_script(self, script: str):
+        """Run a SQL script statement by statement; executescript() would commit the open transaction"""
+        statement = ""
+        for line in script.splitlines(keepends=True):
+            statement += line
+            if sqlite3.complete_statement(statement):
+                self.conn.execute(statement)
+                statement = ""
+
+    @staticmethod
+    def _insert_sql(table: str, fields: List[str]) -> str:
+        return f"INSERT INTO {table} ({', '.join(fields)}) VALUES ({', '.join('?' for _ in fields)})"
+
+    def _insert_many(self, table: str, fields: List[str], rows: Iterable[Dict[str, Any]]):
+        sql = self._insert_sql(table, fields)
+        rows = iter(rows)
+        while True:
+            chunk = [tuple(row[field] for field in fields) for row in islice(rows, self.BULK_CHUNK_SIZE)]
+            if not chunk:
+                break
+            with self._write():
+                self.conn.executemany(sql, chunk)
+
+    def list_customers(self):
+        return self._all("SELECT * FROM customers ORDER BY id")
+
+    def get_customer(self, customer_id):
+        return self._one("SELECT * FROM customers WHERE id = ?", (customer_id,))
+
+    def list_accounts(self):
+        return self._all("SELECT * FROM accounts ORDER BY id")
+
+    def get_account(self, account_id):
+        return self._one("SELECT * FROM accounts WHERE id = ?", (account_id,))
+
+    def get_customer_accounts(self, customer_id):
+        return self._all("SELECT * FROM accounts WHERE customer_id = ? ORDER BY id", (customer_id,))
+
+    def get_customer_documents(self, customer_id):
+        return self._all("SELECT * FROM documents WHERE customer_id = ? ORDER BY date, id", (customer_id,))
+
+    def search_documents(self, customer_id, query, limit, doc_type=None, from_date=None, to_date=None):
+        terms = set(tokenize(query))
+        if not terms:
+            return []
+        # Quote every term so user input cannot inject FTS query syntax
+        quoted_terms = " OR ".join(f'"{term}"' for term in terms)
+        match = f'customer_id : "{customer_id}" AND content : ({quoted_terms})'
+        conditions = ["documents_fts MATCH ?"]
+        params: List[Any] = [match]
+        if doc_type:
+            conditions.append("d.type = ?")
+            params.append(doc_type)
+        if from_date:
+            conditions.append("d.date >= ?")
+            params.append(from_date)
+        if to_date:
+            conditions.append("d.date < ?")
+            params.append(to_date)
+        params.append(limit)
+        rows = self._all(
+            "SELECT d.*, -bm25(documents_fts, 0.0, 1.0) AS score FROM documents_fts "
+            f"JOIN documents d ON d.rowid = documents_fts.rowid WHERE {' AND '.join(conditions)} "
+            "ORDER BY bm25(documents_fts, 0.0, 1.0) LIMIT ?",
+            tuple(params),
+        )
+        return [({field: row[field] for field in DOCUMENT_FIELDS}, row["score"]) for row in rows]
+
+    def page_transactions(self, account_id, limit, cursor=None, from_date=None, to_date=None, txn_type=None):
+        conditions = ["account_id = ?"]
+        params: List[Any] = [account_id]
+        if from_date:
+            conditions.append("date >= ?")
+            params.append(from_date)
+        if to_date:
+            conditions.append("date < ?")
+            params.append(to_date)
+        if cursor:
+            conditions.append("(date, id) < (?, ?)")
+            params.extend(decode_cursor(cursor))
+        if txn_type:
+            conditions.append("type = ?")
+            params.append(txn_type)
+        params.append(limit + 1)
+        rows = self._all(
+            f"SELECT * FROM transactions WHERE {' AND '.join(conditions)} ORDER BY date DESC, id DESC LIMIT ?",
+            tuple(params),
+        )
+        if len(rows) > limit:
+            rows = rows[:limit]
+            return rows, encode_cursor(rows[-1]["date"], rows[-1]["id"])
+        return rows, None
+
+    def _get_many(self, table: str, ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        records = {}
+        ids = list(dict.fromkeys(ids))
+        # Stay well below SQLite's limit on bound parameters per statement
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            rows = self._all(f"SELECT * FROM {table} WHERE id IN ({', '.join('?' for _ in chunk)})", tuple(chunk))
+            records.update((row["id"], row) for row in rows)
+        return records
+
+    def get_account_summary(self, account_id, start=None, end=None):
+        from_month, to_month, spans = split_range(start, end)
+        totals = self._one("SELECT count, net_change FROM account_aggregates WHERE account_id = ?",
+                           (account_id,)) or {"count": 0, "net_change": 0.0}
+        conditions = ["account_id = ?"]
+        params: List[Any] = [account_id]
+        if from_month:
+            conditions.append("month >= ?")
+            params.append(from_month)
+        if to_month:
+            conditions.append("month <= ?")
+            params.append(to_month)
+        rows = self._all(f"SELECT month, type, count, total FROM account_monthly_totals "
+                         f"WHERE {' AND '.join(conditions)}", tuple(params))
+        for month, span_from, span_to in spans:
+            rows.extend(self._all("SELECT ? AS month, type, COUNT(*) AS count, SUM(amount) AS total FROM transactions "
+                                  "WHERE account_id = ? AND date >= ? AND date < ? GROUP BY type",
+                                  (month, account_id, span_from, span_to)))
+        return build_summary(account_id, totals["count"], totals["net_change"], rows)
+
+    def get_accounts(self, account_ids):
+        return self._get_many("accounts", account_ids)
+
+    def get_transactions(self, txn_ids):
+        return self._get_many("transactions", txn_ids)
+
+    def set_account_status(self, account_id, status):
+        return self.set_accounts_status([account_id], status).get(account_id)
+
+    def set_accounts_status(self, account_ids, status):
+        with self._write():
+            self.conn.executemany("UPDATE accounts SET status = ? WHERE id = ?",
+                                  [(status, account_id) for account_id in account_ids])
+            accounts = self.get_accounts(account_ids)
+            self._bump_versions([key for account in accounts.values()
+                                 for key in (version_key("account", account["id"]),
+                                             version_key("customer", account["customer_id"]))])
+        return accounts
+
+    def _bump_versions(self, keys: Iterable[str]):
+        now = time.time()
+        with self.lock:
+            self.conn.executemany(
+                "INSERT INTO entity_versions VALUES (?, 1, ?) "
+                "ON CONFLICT(key) DO UPDATE SET version = version + 1, modified = excluded.modified",
+                [(key, now) for key in keys],
+            )
+
+    def get_versions(self, keys):
+        rows = self._all(f"SELECT * FROM entity_versions WHERE key IN ({', '.join('?' for _ in keys)})", tuple(keys))
+        found = {row["key"]: (row["version"], row["modified"]) for row in rows}
+        return {key: found.get(key, (0, self.created_at)) for key in keys}
+
+    def reserve_ids(self, kind, count):
+        with self._write():
+            row = self.conn.execute("SELECT next FROM id_sequences WHERE kind = ?", (kind,)).fetchone()
+            if row is not None:
+                first = row[0]
+            else:
+                # First use: start after the ids already stored. Ids sort as text,
+                # so this scans the table once instead of using the primary key.
+                prefix = ID_PREFIXES[kind]
+                first = self.conn.execute(
+                    f"SELECT COALESCE(MAX(CAST(substr(id, ?) AS INTEGER)), 0) + 1 FROM {self.TABLES[kind]} "
+                    "WHERE id GLOB ?", (len(prefix) + 1, f"{prefix}[0-9]*"),
+                ).fetchone()[0]
+            self.conn.execute("INSERT INTO id_sequences VALUES (?, ?) "
+                              "ON CONFLICT(kind) DO UPDATE SET next = excluded.next", (kind, first + count))
+        return first
+
+    def create_accounts(self, accounts, transactions=()):
+        with self._write():
+            self.conn.executemany(self._insert_sql("accounts", ACCOUNT_FIELDS),
+                                  [tuple(account[field] for field in ACCOUNT_FIELDS) for account in accounts])
+            self.conn.executemany(self._insert_sql("transactions", TRANSACTION_FIELDS),
+                                  [tuple(txn[field] for field in TRANSACTION_FIELDS) for txn in transactions])
+            self._bump_versions([version_key("customer", account["customer_id"]) for account in accounts]
+                                + [version_key("account", txn["account_id"]) for txn in transactions])
+
+    def add_transaction(self, transaction):
+        with self._write():
+            self.conn.execute(self._insert_sql("transactions", TRANSACTION_FIELDS),
+                              tuple(transaction[field] for field in TRANSACTION_FIELDS))
+            self._bump_versions([version_key("account", transaction["account_id"])])
+
+    def existing_references(self, keys):
+        found = set()
+        keys = list(dict.fromkeys(keys))
+        # Two parameters per key, well below SQLite's limit per statement
+        for start in range(0, len(keys), 250):
+            chunk = keys[start:start + 250]
+            # A join, as SQLite scans the whole index for a row value IN (VALUES ...)
+            rows = self._all(f"SELECT t.account_id, t.reference FROM (VALUES {', '.join('(?, ?)' for _ in chunk)}) "
+                             "AS k JOIN transactions t ON t.account_id = k.column1 AND t.reference = k.column2",
+                             tuple(value for key in chunk for value in key))
+            found.update((row["account_id"], row["reference"]) for row in rows)
+        return found
+
+    def ingest_transactions(self, transactions):
+        with self._write():
+            accounts = self.get_accounts([transaction["account_id"] for transaction in transactions])
+            for transaction in transactions:
+                if transaction["account_id"] not in accounts:
+                    raise ValueError(f"Unknown account {transaction['account_id']}")
+            # Checked inside the write transaction, so concurrent loads of one feed apply it once
+            keys = self.existing_references([(txn["account_id"], txn["reference"]) for txn in transactions])
+            applied = []
+            for transaction in transactions:
+                key = (transaction["account_id"], transaction["reference"])
+                if key not in keys:
+                    keys.add(key)
+                    applied.append(transaction)
+            self.conn.executemany(self._insert_sql("transactions", TRANSACTION_FIELDS),
+                                  [tuple(txn[field] for field in TRANSACTION_FIELDS) for txn in applied])
+            totals: Dict[str, float] = defaultdict(float)
+            for transaction in applied:
+                totals[transaction["account_id"]] += transaction["amount"]
+            self.conn.executemany("UPDATE accounts SET balance = round(balance + ?, 2) WHERE id = ?",
+                                  [(total, account_id) for account_id, total in totals.items()])
+            self._bump_versions([key for account_id in totals
+                                 for key in (version_key("account", account_id),
+                                             version_key("customer", accounts[account_id]["customer_id"]))])
+        return applied
+
+    def add_document(self, document):
+        with self._write():
+            self.conn.execute(self._insert_sql("documents", DOCUMENT_FIELDS),
+                              tuple(document[field] for field in DOCUMENT_FIELDS))
+            self._bump_versions([version_key("customer", document["customer_id"])])
+
+    def bulk_load(self, customers=(), accounts=(), transactions=(), documents=()):
+        self._insert_many("customers", CUSTOMER_FIELDS, customers)
+        self._insert_many("accounts", ACCOUNT_FIELDS, accounts)
+        self._insert_many("transactions", TRANSACTION_FIELDS, transactions)
+        self._insert_many("documents", DOCUMENT_FIELDS, documents)
+        self._bump_versions([GLOBAL_VERSION_KEY])
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def create_repository(customers: Dict[str, Dict[str, Any]], accounts: Dict[str, Dict[str, Any]],
+                      transactions: Dict[str, Dict[str, Any]], documents: Dict[str, Dict[str, Any]]) -> BankingRepository:
+    """Create the repository selected by configuration.
+
+    BANKING_STORAGE=memory (default) serves the given dicts directly.
+    BANKING_STORAGE=sqlite opens BANKING_DB_PATH (default banking.db) and seeds
+    it with the given records when the database is empty; each worker
+    reserves BANKING_ID_BLOCK_SIZE (default 32) ids at a time.
+    """
+    storage = os.getenv("BANKING_STORAGE", "memory").lower()
+    if storage == "memory":
+        return InMemoryRepository(customers, accounts, transactions, documents)
+    if storage == "sqlite":
+        repository = SQLiteRepository(os.getenv("BANKING_DB_PATH", "banking.db"),
+                                      int(os.getenv("BANKING_ID_BLOCK_SIZE", "32")))
+        repository.seed(customers.values(), accounts.values(), transactions.values(), documents.values())
+        return repository
+    raise ValueError(f"Unknown BANKING_STORAGE backend: {storage}")
@@ -0,0 +1,170 @@
+"""
+Compact, token-bounded encoding of MCP tool results for the LLM
+
+Tool results reach the model as text. Instead of the repr of the whole MCP
+result, the chat client sends the structured content shaped in three steps:
+
+- projection: records (flat dicts with an "id") keep only the fields the
+  model needs for the tool that returned them, and null fields are dropped,
+  so e.g. a customer's SSN never enters the prompt;
+- encoding: lists of flat records become a table (one header line, one
+  "|"-separated line per record), everything else indented "key: value"
+  lines;
+- truncation: when the text exceeds the token budget, rows are dropped from
+  the end of the largest tables and replaced by a "more available" marker
+  that says how many rows were left out.
+
+benchmarks/token_savings.py measures the savings on the corpus.
+"""
+
+import json
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
+
+from prompt_manager import estimate_tokens
+
+ACCOUNT_FIELDS = ("id", "type", "account_number", "balance", "currency", "status", "interest_rate", "overdraft_limit")
+TRANSACTION_FIELDS = ("id", "date", "type", "amount", "description", "status")
+DOCUMENT_FIELDS = ("id", "type", "date", "content")
+PROFILE_FIELDS = ("id", "name", "email", "phone", "address", "risk_profile")
+
+# Fields of the records each tool returns; tools not listed keep every field
+TOOL_FIELDS: Dict[str, Sequence[str]] = {
+    "list_accounts": ACCOUNT_FIELDS,
+    "lock_account": ACCOUNT_FIELDS,
+    "lock_accounts": ACCOUNT_FIELDS,
+    "list_transactions": TRANSACTION_FIELDS,
+    "list_transactions_batch": TRANSACTION_FIELDS,
+    "get_transactions": TRANSACTION_FIELDS,
+    "search_documents": DOCUMENT_FIELDS + ("score",),
+    "get_user_profile": PROFILE_FIELDS,
+}
+
+# Batch results wrap each record as {"id": ..., "<key>": record, "error": ...};
+# the record is lifted into the result line, so results form one table
+TOOL_UNWRAP: Dict[str, str] = {
+    "get_transactions": "transaction",
+    "lock_accounts": "account",
+}
+
+# Per-record errors of batch tools are kept whatever the projection
+ALWAYS_KEPT = ("error",)
+
+DEFAULT_TOKEN_BUDGET = 1500
+SEPARATOR = "|"
+
+
+def _is_scalar(value: Any) -> bool:
+    return value is None or isinstance(value, (str, int, float, bool))
+
+def _is_record(value: Any) -> bool:
+    return isinstance(value, dict) and "id" in value and all(_is_scalar(item) for item in value.values())
+
+def project(value: Any, fields: Optional[Sequence[str]] = None, unwrap: Optional[str] = None) -> Any:
+    """Keep only ``fields`` of every record in ``value`` and drop null fields"""
+    if isinstance(value, list):
+        return [project(item, fields, unwrap) for item in value]
+    if not isinstance(value, dict):
+        return value
+    if unwrap and isinstance(value.get(unwrap), dict):
+        value = {**{key: item for key, item in value.items() if key != unwrap}, **value[unwrap]}
+    if fields is not None and _is_record(value):
+        return {field: value[field] for field in (*fields, *ALWAYS_KEPT) if value.get(field) is not None}
+    return {key: project(item, fields, unwrap) for key, item in value.items() if item is not None}
+
+
+def _cell(value: Any) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, float):
+        return f"{value:.2f}" if value == round(value, 2) else repr(value)
+    text = str(value)
+    # Quote cells that would break the table
+    return json.dumps(text) if SEPARATOR in text or "\n" in text or text != text.strip() else text
+
+def _scalar(value: Any) -> str:
+    if isinstance(value, str):
+        return json.dumps(value) if "\n" in value or value != value.strip() or value == "" else value
+    return _cell(value)
+
+
+class _Table:
+    def __init__(self, indent: str, records: List[Dict[str, Any]]):
+        self.indent = indent
+        columns: Dict[str, None] = {}
+        for record in records:
+            columns.update(dict.fromkeys(record))
+        self.header = indent + SEPARATOR.join(columns)
+        self.rows = [indent + SEPARATOR.join(_cell(record.get(column)) for column in columns) for record in records]
+        self.hidden = 0
+
+    def lines(self) -> List[str]:
+        lines = [self.header] + self.rows
+        if self.hidden:
+            lines.append(f"{self.indent}... {self.hidden} more rows not shown (more available)")
+        return lines
+
+
+def _encode(value: Any, indent: str, out: List[Union[str, _Table]]):
+    if isinstance(value, list):
+        if value and all(isinstance(item, dict) and all(_is_scalar(v) for v in item.values()) for item in value):
+            out.append(_Table(indent, value))
+        elif all(_is_scalar(item) for item in value):
+            out.append(indent + ", ".join(_scalar(item) for item in value) if value else indent + "(none)")
+        else:
+            for item in value:
+                out.append(indent + "-")
+                _encode(item, indent + "  ", out)
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            if _is_scalar(item):
+                out.append(f"{indent}{key}: {_scalar(item)}")
+            else:
+                out.append(f"{indent}{key}:")
+                _encode(item, indent + "  ", out)
+    else:
+        out.append(indent + _scalar(value))
+
+def encode(value: Any, token_budget: int = DEFAULT_TOKEN_BUDGET) -> str:
+    """Compact text of a projected result, truncated to about ``token_budget`` tokens"""
+    parts: List[Union[str, _Table]] = []
+    _encode(value, "", parts)
+    tables = [part for part in parts if isinstance(part, _Table)]
+    # Same estimate as the conversation history budget: about four characters per token
+    budget_chars = token_budget * 4
+    size = sum(len(line) + 1 for part in parts for line in (part.lines() if isinstance(part, _Table) else [part]))
+    marker_size = 48
+    while size > budget_chars:
+        table = max(tables, key=lambda table: len(table.rows), default=None)
+        if table is None or not table.rows:
+            break
+        size -= len(table.rows.pop()) + 1
+        if table.hidden == 0:
+            size += marker_size
+        table.hidden += 1
+    text = "\n".join(line for part in parts for line in (part.lines() if isinstance(part, _Table) else [part]))
+    if len(text) > budget_chars:
+        text = text[:budget_chars] + "\n... truncated (more available)"
+    return text
+
+def shape_result(tool_name: str, content: Any, token_budget: int = DEFAULT_TOKEN_BUDGET) -> str:
+    """Projected, compactly encoded and budget-truncated text of a tool's structured result"""
+    return encode(project(content, TOOL_FIELDS.get(tool_name), TOOL_UNWRAP.get(tool_name)), token_budget)
+
+def tool_result_text(tool_name: str, result: Any, token_budget: int = DEFAULT_TOKEN_BUDGET) -> str:
+    """Text of a fastmcp tool call result (or an error message) for the LLM"""
+    structured = getattr(result, "structured_content", None)
+    if structured is None:
+        blocks = getattr(result, "content", None)
+        if blocks is None:
+            return str(result)
+        return encode("\n".join(getattr(block, "text", "") or "" for block in blocks), token_budget)
+    # fastmcp wraps results that are not objects as {"result": ...}
+    if isinstance(structured, dict) and list(structured) == ["result"]:
+        structured = structured["result"]
+    return shape_result(tool_name, structured, token_budget)
+
+
+def token_counts(tool_name: str, result: Any, token_budget: int = DEFAULT_TOKEN_BUDGET) -> Tuple[int, int]:
+    """Estimated tokens of a result as str(result) and as shaped text"""
+    return (estimate_tokens({"role": "tool", "content": str(result)}),
+            estimate_tokens({"role": "tool", "content": tool_result_text(tool_name, result, token_budget)}))
@@ -0,0 +1,83 @@
+"""
+Full-text inverted index for customer documents
+
+Documents are tokenized into lowercase words and kept in per-customer
+posting lists, so a search only touches the customer's own documents that
+contain at least one query term. Results are ranked with BM25 using the
+customer's document collection statistics. The index is updated
+incrementally as documents are added.
+"""
+
+import heapq
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Standard BM25 parameters
+K1 = 1.2
+B = 0.75
+
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class _CustomerIndex:
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self.lengths: Dict[str, int] = {}
+        self.total_length = 0
+
+
+class DocumentIndex:
+    """Per-customer inverted index with BM25 ranking"""
+
+    def __init__(self, get_document: Callable[[str], Dict[str, Any]]):
+        self.get_document = get_document
+        self.customers: Dict[str, _CustomerIndex] = defaultdict(_CustomerIndex)
+
+    def add(self, document: Dict[str, Any]):
+        index = self.customers[document["customer_id"]]
+        terms = tokenize(document["content"])
+        for term, frequency in Counter(terms).items():
+            index.postings[term][document["id"]] = frequency
+        index.lengths[document["id"]] = len(terms)
+        index.total_length += len(terms)
+
+    def clear(self):
+        self.customers.clear()
+
+    def search(self, customer_id: str, query: str, limit: int, doc_type: Optional[str] = None,
+               from_date: Optional[str] = None, to_date: Optional[str] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Return up to ``limit`` (document, score) pairs, best match first.
+
+        ``from_date`` is inclusive and ``to_date`` exclusive.
+        """
+        index = self.customers.get(customer_id)
+        if index is None or not index.lengths:
+            return []
+        doc_count = len(index.lengths)
+        average_length = index.total_length / doc_count
+
+        scores: Dict[str, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = index.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (doc_count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, frequency in postings.items():
+                norm = K1 * (1 - B + B * index.lengths[doc_id] / average_length)
+                scores[doc_id] += idf * frequency * (K1 + 1) / (frequency + norm)
+
+        def matches(doc_id: str) -> bool:
+            document = self.get_document(doc_id)
+            return ((doc_type is None or document["type"] == doc_type)
+                    and (from_date is None or document["date"] >= from_date)
+                    and (to_date is None or document["date"] < to_date))
+
+        ranked = heapq.nlargest(limit, (item for item in scores.items() if matches(item[0])),
+                                key=lambda item: (item[1], item[0]))
+        return [(self.get_document(doc_id), score) for doc_id, score in ranked]
@@ -1,14 +1,28 @@
 from fastmcp import FastMCP
+from fastmcp.server.dependencies import get_http_request
+from fastmcp.server.middleware import Middleware, MiddlewareContext
 from fastapi import FastAPI, HTTPException
 from typing import List, Optional, Dict, Any
-from banking_api import Account, Transaction, Document
-import requests
-import os
+from banking_api import Account, TransactionPage, ScoredDocument
+from banking_client import banking_api
+from admission import AdmissionController, AdmissionMiddleware
+from auth import MissingTokenSecret, token_secret, verify_token
+from starlette.middleware import Middleware as ASGIMiddleware
+from starlette.requests import Request
+from starlette.responses import PlainTextResponse
+import telemetry
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+import time
 from functools import wraps
 
-mcp = FastMCP(name="Banking MCP Server")
+@asynccontextmanager
+async def lifespan(server: FastMCP):
+    yield
+    await banking_api.aclose()
 
-banking_api_url = "http://127.0.0.1:8000"
+mcp = FastMCP(name="Banking MCP Server", lifespan=lifespan)
+tracer = telemetry.Tracer("mcp-server")
 
 # User context management
 class UserContext:
@@ -16,109 +30,260 @@ class UserContext:
         self.user_id = user_id
         self.customer_id = customer_id
 
-# Global user context (in production, this would come from authentication)
-current_user = UserContext(user_id="CUST001", customer_id="CUST001")
+# Identity of the session handling the current request. Each MCP request runs
+# in its own context, so concurrent sessions never see each other's user.
+_current_user: ContextVar[Optional[UserContext]] = ContextVar("current_user", default=None)
+
+# User for in-process and stdio transports, which carry no bearer token
+default_user: Optional[UserContext] = UserContext(user_id="CUST001", customer_id="CUST001")
 
 def set_user_context(user_id: str, customer_id: str):
-    """Set the current user context"""
-    global current_user
-    current_user = UserContext(user_id, customer_id)
+    """Set the user for transports without HTTP authentication"""
+    global default_user
+    default_user = UserContext(user_id, customer_id)
+
+def get_current_user() -> UserContext:
+    """Get the user of the current session"""
+    user = _current_user.get()
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not authenticated")
+    return user
+
+def resolve_user() -> Optional[UserContext]:
+    """Resolve the user from the bearer token of the current HTTP request"""
+    try:
+        request = get_http_request()
+    except RuntimeError:
+        return default_user
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() != "bearer":
+        return None
+    customer_id = verify_token(token.strip())
+    if customer_id is None:
+        return None
+    return UserContext(user_id=customer_id, customer_id=customer_id)
+
+class UserContextMiddleware(Middleware):
+    """Binds the authenticated user to each MCP request"""
+    async def on_request(self, context: MiddlewareContext, call_next):
+        token = _current_user.set(resolve_user())
+        try:
+            return await call_next(context)
+        finally:
+            _current_user.reset(token)
+
+mcp.add_middleware(UserContextMiddleware())
+
+tool_calls = telemetry.registry.counter("mcp_tool_calls_total", "MCP tool calls by tool and outcome",
+                                        ["tool", "status"])
+tool_duration = telemetry.registry.histogram("mcp_tool_duration_seconds", "MCP tool call latency", ["tool"])
+
+class TracingMiddleware(Middleware):
+    """Runs each tool call in a span continuing the client's trace.
+
+    The client sends its traceparent in the `_meta` of the tools/call request;
+    backend requests made by the tool carry the trace on to the banking API.
+    """
+    async def on_call_tool(self, context: MiddlewareContext, call_next):
+        # fastmcp passes the tool name and arguments only; _meta stays on the request context
+        meta = context.fastmcp_context.request_context.meta if context.fastmcp_context is not None else None
+        traceparent = (meta.model_extra or {}).get("traceparent") if meta is not None else None
+        tool = context.message.name
+        user = _current_user.get()
+        status = "error"
+        started = time.perf_counter()
+        try:
+            # The customer is passed on to the banking API for its per-customer rate limit
+            with tracer.span("mcp.tool", traceparent, tool=tool, customer=user.customer_id if user else None):
+                result = await call_next(context)
+            status = "ok"
+            return result
+        finally:
+            tool_calls.inc(tool=tool, status=status)
+            tool_duration.observe(time.perf_counter() - started, tool=tool)
+
+mcp.add_middleware(TracingMiddleware())
+
+def token_customer(scope) -> Optional[str]:
+    """Customer of the bearer token of an HTTP request, for per-customer rate limits"""
+    for name, value in scope["headers"]:
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            return verify_token(token.strip()) if scheme.lower() == "bearer" else None
+    return None
+
+# Admission control of MCP requests (see admission.py). Only POSTs are
+# checked: GET holds the session's notification stream open for its lifetime.
+http_middleware = [
+    ASGIMiddleware(AdmissionMiddleware, controller=AdmissionController.from_env("MCP"), service="mcp-server",
+                   customer_of=token_customer, methods=("POST",)),
+]
+
+@mcp.custom_route("/metrics", methods=["GET"])
+async def metrics(request: Request) -> PlainTextResponse:
+    """Tool, backend request and span metrics in the Prometheus text format"""
+    return PlainTextResponse(telemetry.registry.render(), media_type=telemetry.PROMETHEUS_CONTENT_TYPE)
+
+# Tool annotations: clients may reuse the results of read-only tools, e.g. in
+# answers cached until the customer's data changes (see answer_cache.py)
+READ_ONLY = {"readOnlyHint": True}
+WRITES = {"readOnlyHint": False, "destructiveHint": False, "idempotentHint": True}
 
 def require_authentication(func):
     """Decorator to ensure user is authenticated"""
     @wraps(func)
-    def wrapper(*args, **kwargs):
-        if current_user is None:
-            raise HTTPException(status_code=401, detail="User not authenticated")
-        return func(*args, **kwargs)
+    async def wrapper(*args, **kwargs):
+        get_current_user()
+        return await func(*args, **kwargs)
     return wrapper
 
-def get_user_accounts() -> List[Account]:
+async def get_user_accounts() -> List[Account]:
     """Get accounts for the current authenticated user"""
-    if current_user is None:
-        raise HTTPException(status_code=401, detail="User not authenticated")
-    
-    response = requests.get(f"{banking_api_url}/customers/{current_user.customer_id}/accounts")
+    current_user = get_current_user()
+    response = await banking_api.get(f"/customers/{current_user.customer_id}/accounts")
     if response.status_code == 404:
         return []
+    raise_for_status(response)
     return response.json()
 
-def validate_account_access(account_id: str) -> bool:
-    """Validate that the current user has access to the specified account"""
-    if current_user is None:
-        return False
-    
-    user_accounts = get_user_accounts()
-    return any(account["id"] == account_id for account in user_accounts)
+async def get_owned_account(account_id: str) -> Optional[Account]:
+    """Fetch an account in one call if it belongs to the current user, else None"""
+    current_user = get_current_user()
+    response = await banking_api.get(f"/customers/{current_user.customer_id}/accounts/{account_id}")
+    if response.status_code == 404:
+        return None
+    raise_for_status(response)
+    return response.json()
 
+def raise_for_status(response):
+    """Raise an HTTPException with the API's reason for any non-2xx response"""
+    if response.is_success:
+        return
+    try:
+        detail = response.json().get("detail")
+    except ValueError:
+        detail = response.text
+    if response.status_code == 422 and isinstance(detail, list):
+        # Request validation errors: report the first one
+        raise HTTPException(status_code=400, detail=f"Invalid request: {detail[0]['msg']}")
+    raise HTTPException(status_code=response.status_code, detail=detail)
 
-@mcp.tool()
+async def post_batch(path: str, payload: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Send a batch request to the banking API and return its per-item results"""
+    response = await banking_api.post(path, json=payload)
+    raise_for_status(response)
+    return response.json()
+
+
+@mcp.tool(annotations=READ_ONLY)
 @require_authentication
-def list_accounts() -> List[Account]:
+async def list_accounts() -> List[Account]:
     """List all accounts and balances for the authenticated user."""
-    return get_user_accounts()
+    return await get_user_accounts()
 
-@mcp.tool()
+@mcp.tool(annotations=WRITES)
 @require_authentication
-def lock_account(account_id: str) -> Optional[Account]:
+async def lock_account(account_id: str) -> Optional[Account]:
     """Lock an account by account id. Only works for user's own accounts."""
-    if not validate_account_access(account_id):
-        raise HTTPException(status_code=403, detail="Access denied: You can only lock your own accounts")
-    
-    response = requests.get(f"{banking_api_url}/accounts/{account_id}/lock")
+    # The API checks ownership in the same request
+    response = await banking_api.get(f"/accounts/{account_id}/lock",
+                                     params={"customer_id": get_current_user().customer_id})
     if response.status_code == 404:
-        raise HTTPException(status_code=404, detail="Account not found")
+        raise HTTPException(status_code=403, detail="Access denied: You can only lock your own accounts")
+    raise_for_status(response)
     return response.json()
 
-@mcp.tool()
+@mcp.tool(annotations=READ_ONLY)
 @require_authentication
-def list_transactions(account_id: str) -> List[Transaction]:
-    """List all transactions for an account. Only works for user's own accounts."""
-    if not validate_account_access(account_id):
+async def list_transactions(
+    account_id: str,
+    limit: int = 20,
+    cursor: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    transaction_type: Optional[str] = None,
+) -> TransactionPage:
+    """List transactions for an account, newest first. Only works for user's own accounts.
+
+    Returns at most `limit` transactions. Pass the returned `next_cursor` to fetch
+    the next page. `from_date` (inclusive) and `to_date` (exclusive) take ISO dates
+    such as 2024-01-31; `transaction_type` is deposit, withdrawal or transfer.
+    """
+    response = await banking_api.get(
+        f"/accounts/{account_id}/transactions",
+        params={"limit": limit, "cursor": cursor, "from": from_date, "to": to_date, "type": transaction_type,
+                "customer_id": get_current_user().customer_id},
+    )
+    if response.status_code == 404:
         raise HTTPException(status_code=403, detail="Access denied: You can only view transactions for your own accounts")
-    
-    response = requests.get(f"{banking_api_url}/accounts/{account_id}/transactions")
+    raise_for_status(response)
+    return response.json()
+
+@mcp.tool(annotations=READ_ONLY)
+@require_authentication
+async def get_account_summary(
+    account_id: str,
+    from_month: Optional[str] = None,
+    to_month: Optional[str] = None,
+) -> Dict[str, Any]:
+    """Get precomputed spending and income totals of an account. Only works for user's own accounts.
+
+    Returns the balance, the transaction count, the net change (sum of all
+    transaction amounts, not a balance) and, per month, the count and total
+    amount per transaction type (withdrawals and outgoing transfers are
+    negative). `from_month` and `to_month` are inclusive months such as
+    2024-01, or dates such as 2024-01-15 (`to_month` exclusive) to cover part
+    of a month. Prefer this over summing list_transactions results.
+    """
+    response = await banking_api.get(f"/accounts/{account_id}/summary", params={
+        "from": from_month, "to": to_month, "customer_id": get_current_user().customer_id})
     if response.status_code == 404:
-        raise HTTPException(status_code=404, detail="Account not found")
+        raise HTTPException(status_code=403, detail="Access denied: You can only view summaries for your own accounts")
+    raise_for_status(response)
     return response.json()
 
-@mcp.tool()
+@mcp.tool(annotations=READ_ONLY)
 @require_authentication
-def search_documents(query: str) -> List[Document]:
-    """Search for documents belonging to the authenticated user."""
-    if current_user is None:
-        raise HTTPException(status_code=401, detail="User not authenticated")
-    
-    response = requests.get(f"{banking_api_url}/customers/{current_user.customer_id}/documents")
+async def search_documents(
+    query: str,
+    limit: int = 10,
+    document_type: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+) -> List[ScoredDocument]:
+    """Search documents belonging to the authenticated user, best match first.
+
+    `document_type` (e.g. statement) and the `from_date` (inclusive) / `to_date`
+    (exclusive) ISO dates narrow the search.
+    """
+    current_user = get_current_user()
+    response = await banking_api.get(
+        f"/customers/{current_user.customer_id}/documents/search",
+        params={"q": query, "limit": limit, "type": document_type, "from": from_date, "to": to_date},
+    )
     if response.status_code == 404:
         return []
-    
-    documents = response.json()
-    return [doc for doc in documents if query.lower() in doc["content"].lower()]
+    raise_for_status(response)
+    return response.json()
 
-@mcp.tool()
+@mcp.tool(annotations=READ_ONLY)
 @require_authentication
-def get_user_profile() -> Dict[str, Any]:
+async def get_user_profile() -> Dict[str, Any]:
     """Get the authenticated user's profile information."""
-    if current_user is None:
-        raise HTTPException(status_code=401, detail="User not authenticated")
-    
-    response = requests.get(f"{banking_api_url}/customers/{current_user.customer_id}")
+    current_user = get_current_user()
+    response = await banking_api.get(f"/customers/{current_user.customer_id}")
     if response.status_code == 404:
         raise HTTPException(status_code=404, detail="User profile not found")
+    raise_for_status(response)
     return response.json()
 
-@mcp.tool()
+@mcp.tool(annotations=READ_ONLY)
 @require_authentication
-def get_account_balance(account_id: str) -> Dict[str, Any]:
+async def get_account_balance(account_id: str) -> Dict[str, Any]:
     """Get balance for a specific account. Only works for user's own accounts."""
-    if not validate_account_access(account_id):
-        raise HTTPException(status_code=403, detail="Access denied: You can only view balances for your own accounts")
-    
-    user_accounts = get_user_accounts()
-    account = next((acc for acc in user_accounts if acc["id"] == account_id), None)
+    account = await get_owned_account(account_id)
     if not account:
-        raise HTTPException(status_code=404, detail="Account not found")
+        raise HTTPException(status_code=403, detail="Access denied: You can only view balances for your own accounts")
     
     return {
         "account_id": account["id"],
@@ -128,5 +293,94 @@ def get_account_balance(account_id: str) -> Dict[str, Any]:
         "type": account["type"]
     }
 
+@mcp.tool(annotations=READ_ONLY)
+@require_authentication
+async def get_account_balances(account_ids: List[str]) -> List[Dict[str, Any]]:
+    """Get balances for several of the user's accounts in one call.
+
+    Returns one result per account id, in order; accounts the user does not own
+    get an `error` instead of a balance.
+    """
+    current_user = get_current_user()
+    results = await post_batch("/accounts/batch", {"ids": account_ids, "customer_id": current_user.customer_id})
+    return [
+        {"account_id": result["id"], "error": "Access denied: You can only view balances for your own accounts"}
+        if result["error"] else
+        {"account_id": result["id"], "account_number": result["account"]["account_number"],
+         "balance": result["account"]["balance"], "currency": result["account"]["currency"],
+         "type": result["account"]["type"]}
+        for result in results
+    ]
+
+@mcp.tool(annotations=READ_ONLY)
+@require_authentication
+async def list_transactions_batch(
+    account_ids: List[str],
+    limit: int = 10,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    transaction_type: Optional[str] = None,
+) -> List[Dict[str, Any]]:
+    """List the latest transactions of several of the user's accounts in one call.
+
+    Returns one result per account id with a page of at most `limit` transactions,
+    newest first; use list_transactions with the page's `next_cursor` for more.
+    Filters work as in list_transactions.
+    """
+    current_user = get_current_user()
+    results = await post_batch("/accounts/transactions/batch", {
+        "account_ids": account_ids, "customer_id": current_user.customer_id, "limit": limit,
+        "from_date": from_date, "to_date": to_date, "type": transaction_type,
+    })
+    return [
+        {"account_id": result["account_id"],
+         "error": "Access denied: You can only view transactions for your own accounts"}
+        if result["error"] else result
+        for result in results
+    ]
+
+@mcp.tool(annotations=READ_ONLY)
+@require_authentication
+async def get_transactions(transaction_ids: List[str]) -> List[Dict[str, Any]]:
+    """Get several transactions of the user's accounts by transaction id.
+
+    Returns one result per id, in order; unknown ids and transactions on other
+    customers' accounts get an `error`.
+    """
+    current_user = get_current_user()
+    return await post_batch("/transactions/batch", {"ids": transaction_ids, "customer_id": current_user.customer_id})
+
+@mcp.tool(annotations=WRITES)
+@require_authentication
+async def lock_accounts(account_ids: List[str]) -> List[Dict[str, Any]]:
+    """Lock several of the user's accounts in one call.
+
+    Returns one result per account id; accounts the user does not own are not
+    locked and get an `error`.
+    """
+    current_user = get_current_user()
+    results = await post_batch("/accounts/bulk-lock", {"ids": account_ids, "customer_id": current_user.customer_id})
+    return [
+        {"id": result["id"], "error": "Access denied: You can only lock your own accounts"}
+        if result["error"] else result
+        for result in results
+    ]
+
+@mcp.resource("banking://customer/versions", mime_type="application/json")
+@require_authentication
+async def customer_data_version() -> Dict[str, Any]:
+    """Version of the user's banking data; it changes with every write to the user or their accounts."""
+    current_user = get_current_user()
+    response = await banking_api.get(f"/customers/{current_user.customer_id}/versions")
+    if response.status_code == 404:
+        raise HTTPException(status_code=404, detail="User profile not found")
+    raise_for_status(response)
+    return response.json()
+
 if __name__ == "__main__":
-    mcp.run(transport="http", host="0.0.0.0", port=8010)
\ No newline at end of file
+    # Bearer tokens are only as safe as their signing secret; refuse to serve without one
+    try:
+        token_secret()
+    except MissingTokenSecret as e:
+        raise SystemExit(str(e))
+    mcp.run(transport="http", host="0.0.0.0", port=8010, middleware=http_middleware)
\ No newline at end of file
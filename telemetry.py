@@ -0,0 +1,280 @@
+"""
+Tracing and metrics shared by the chat client, MCP server and banking API
+
+A trace id is started per agent turn and carried across the tiers in the
+W3C ``traceparent`` format: in the ``_meta`` of MCP tool calls and in the
+``traceparent`` header of banking API requests. Every tier records spans
+(an LLM call, a tool call, a backend request, an API request) that share the
+trace id; finished spans are observed in the ``trace_span_duration_seconds``
+histogram and, when TRACE_LOG is set, appended to that file as JSON lines:
+
+    {"trace_id": ..., "span_id": ..., "parent_id": ..., "service": "mcp-server",
+     "name": "mcp.tool", "start": 1718000000.123, "duration_ms": 4.2, "attributes": {...}}
+
+Metrics are kept in process and rendered in the Prometheus text format by
+the /metrics endpoints of the API and the MCP server. With several API
+workers, every worker keeps its own metrics.
+"""
+
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Iterator, List, Optional, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.lock = threading.Lock()
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels: Any):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            for key, value in sorted(self.values.items()):
+                lines.append(f"{self.name}{_label_text(self.labels, key)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        self.lock = threading.Lock()
+        # label values -> [count per bucket (the last one is +Inf), sum]
+        self.values: Dict[Tuple[str, ...], List] = {}
+
+    def observe(self, value: float, **labels: Any):
+        key = tuple(str(labels[name]) for name in self.labels)
+        with self.lock:
+            state = self.values.get(key)
+            if state is None:
+                state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            state[0][bisect_left(self.buckets, value)] += 1
+            state[1] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            for key, (counts, total) in sorted(self.values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else f"{bound:g}"
+                    labels = _label_text(self.labels, key, f'le="{le}"')
+                    lines.append(f"{self.name}_bucket{labels} {cumulative}")
+                lines.append(f"{self.name}_sum{_label_text(self.labels, key)} {total:.6f}")
+                lines.append(f"{self.name}_count{_label_text(self.labels, key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, Any] = {}
+
+    def counter(self, name: str, help: str, labels: Sequence[str] = ()) -> Counter:
+        return self.metrics.setdefault(name, Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self.metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format"""
+        return "\n".join(line for metric in self.metrics.values() for line in metric.render()) + "\n"
+
+
+registry = MetricsRegistry()
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+span_duration = registry.histogram("trace_span_duration_seconds", "Duration of finished spans", ["span"])
+
+
+class Span:
+    __slots__ = ("service", "name", "trace_id", "span_id", "parent_id", "parent", "attributes", "start", "duration")
+
+    def __init__(self, service: str, name: str, trace_id: str, parent_id: Optional[str], parent: Optional["Span"],
+                 attributes: Dict[str, Any]):
+        self.service = service
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.parent = parent
+        self.attributes = attributes
+        self.start = time.time()
+        self.duration: Optional[float] = None
+
+    @property
+    def traceparent(self) -> str:
+        """This span as the parent of remote work, in W3C traceparent form"""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def set(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def find(self, attribute: str) -> Any:
+        """Value of an attribute on this span or its nearest local ancestor that has it"""
+        span: Optional[Span] = self
+        while span is not None:
+            if attribute in span.attributes:
+                return span.attributes[attribute]
+            span = span.parent
+        return None
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+# The last finished spans, for inspection in benchmarks and debugging
+recent_spans: Deque[Span] = deque(maxlen=int(os.getenv("TRACE_RECENT_SPANS", "1000")))
+
+_trace_log = None
+_trace_log_lock = threading.Lock()
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+def current_traceparent() -> Optional[str]:
+    span = _current_span.get()
+    return span.traceparent if span is not None else None
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str]]:
+    """(trace id, parent span id) of a traceparent value, or None if it is malformed"""
+    parts = (value or "").strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2]
+
+class Tracer:
+    """Creates the spans of one tier ("chat-client", "mcp-server", "banking-api").
+
+    Tiers may share a process, as in the benchmark harness, so the tier is
+    part of the tracer rather than of the process.
+    """
+
+    def __init__(self, service: str):
+        self.service = service
+
+    @contextmanager
+    def span(self, name: str, traceparent: Optional[str] = None, **attributes: Any) -> Iterator[Span]:
+        """Time the block as a span.
+
+        The span is a child of the remote parent in ``traceparent`` if given and
+        valid, else of the current span, else it starts a new trace.
+        """
+        parent = _current_span.get()
+        remote = parse_traceparent(traceparent) if traceparent else None
+        if remote is not None:
+            trace_id, parent_id = remote
+        elif parent is not None:
+            trace_id, parent_id = parent.trace_id, parent.span_id
+        else:
+            trace_id, parent_id = os.urandom(16).hex(), None
+        current = Span(self.service, name, trace_id, parent_id, parent, attributes)
+        token = _current_span.set(current)
+        started = time.perf_counter()
+        try:
+            yield current
+        except BaseException as e:
+            current.attributes["error"] = type(e).__name__
+            raise
+        finally:
+            current.duration = time.perf_counter() - started
+            _current_span.reset(token)
+            _finish(current)
+
+def _finish(finished: Span):
+    global _trace_log
+    span_duration.observe(finished.duration, span=finished.name)
+    recent_spans.append(finished)
+    path = os.getenv("TRACE_LOG")
+    if not path:
+        return
+    line = json.dumps({
+        "trace_id": finished.trace_id, "span_id": finished.span_id, "parent_id": finished.parent_id,
+        "service": finished.service, "name": finished.name, "start": round(finished.start, 6),
+        "duration_ms": round(finished.duration * 1000, 3), "attributes": finished.attributes,
+    }, default=str)
+    with _trace_log_lock:
+        if _trace_log is None:
+            _trace_log = open(path, "a", buffering=1)
+        _trace_log.write(line + "\n")
+
+
+http_requests = registry.counter("http_requests_total", "HTTP requests by route and status",
+                                 ["method", "route", "status"])
+http_request_duration = registry.histogram("http_request_duration_seconds", "HTTP request latency by route",
+                                           ["method", "route"])
+
+
+class TraceMiddleware:
+    """ASGI middleware that runs every HTTP request in a span.
+
+    Continues the trace of an incoming ``traceparent`` header, returns the
+    trace id in ``X-Trace-Id`` and records request counts and latency per
+    route template (not per concrete path, to bound the number of series).
+    """
+
+    def __init__(self, app, service: str):
+        self.app = app
+        self.tracer = Tracer(service)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+        status = 500
+
+        with self.tracer.span("http.request", traceparent, method=scope["method"], path=scope["path"]) as current:
+            async def send_traced(message):
+                nonlocal status
+                if message["type"] == "http.response.start":
+                    status = message["status"]
+                    message["headers"] = [*message.get("headers", ()), (b"x-trace-id", current.trace_id.encode())]
+                await send(message)
+
+            started = time.perf_counter()
+            try:
+                await self.app(scope, receive, send_traced)
+            finally:
+                route = getattr(scope.get("route"), "path", "unmatched")
+                current.set(route=route, status=status)
+                http_requests.inc(method=scope["method"], route=route, status=status)
+                http_request_duration.observe(time.perf_counter() - started, method=scope["method"], route=route)
@@ -0,0 +1,262 @@
+"""
+Columnar in-memory transaction store
+
+Transactions are kept column by column instead of one dict per row: amounts
+and timestamps in typed arrays, account ids, types, statuses and
+descriptions as codes into interned string tables, and references packed
+into one UTF-8 buffer. Each account has an array of row offsets sorted by
+(timestamp, id), so date ranges are found by binary search and summed over
+the amount column without materializing rows. Rows are turned back into
+dicts of the API ``Transaction`` shape only when they are read.
+
+Memory use is about an eighth of the dict-per-row layout
+(benchmarks/transaction_memory.py).
+"""
+
+from array import array
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+ID_PREFIX = "TXN"
+
+
+def parse_timestamp(value: str) -> int:
+    """Microseconds since the epoch of an ISO date or timestamp; UTC unless it has an offset.
+
+    Raises ValueError for anything else.
+    """
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    delta = parsed - EPOCH
+    return (delta.days * 86400 + delta.seconds) * 1_000_000 + delta.microseconds
+
+@lru_cache(maxsize=4096)
+def _day_text(day: int) -> str:
+    return (EPOCH + timedelta(days=day)).strftime("%Y-%m-%d")
+
+def format_timestamp(micros: int) -> str:
+    """ISO text of a timestamp in UTC, with microseconds only when they are non-zero"""
+    day, micros = divmod(micros, 86_400_000_000)
+    seconds, fraction = divmod(micros, 1_000_000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    text = f"{_day_text(day)}T{hours:02d}:{minutes:02d}:{seconds:02d}"
+    return f"{text}.{fraction:06d}Z" if fraction else f"{text}Z"
+
+
+class StringTable:
+    """Interned strings, stored once and referenced by integer code"""
+
+    def __init__(self):
+        self.values: List[str] = []
+        self.codes: Dict[str, int] = {}
+
+    def code(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+
+class StringColumn:
+    """Variable-length strings packed into one UTF-8 buffer"""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array("Q", [0])
+
+    def append(self, value: str):
+        self.data += value.encode("utf-8")
+        self.offsets.append(len(self.data))
+
+    def __getitem__(self, row: int) -> str:
+        return self.data[self.offsets[row]:self.offsets[row + 1]].decode("utf-8")
+
+
+class ColumnarTransactionStore:
+    """Append-only transaction storage with per-account time ordering"""
+
+    def __init__(self):
+        # Ids of the form TXN<number> are stored as the number (-1 otherwise)
+        self.id_numbers = array("q")
+        self.odd_ids: Dict[int, str] = {}
+        # Increasing id numbers and their rows, searched with bisect; ids that
+        # arrive out of order or are not numbered go to id_rows instead
+        self.sorted_id_numbers = array("q")
+        self.sorted_id_rows = array("I")
+        self.id_rows: Dict[str, int] = {}
+
+        self.accounts = StringTable()
+        self.types = StringTable()
+        self.statuses = StringTable()
+        self.descriptions = StringTable()
+        self.account_codes = array("I")
+        self.type_codes = array("H")
+        self.status_codes = array("H")
+        self.description_codes = array("I")
+        self.amounts = array("d")
+        self.timestamps = array("q")
+        # Dates whose text does not round-trip through format_timestamp
+        self.odd_dates: Dict[int, str] = {}
+        self.references = StringColumn()
+        # hash() of each reference, so an account's references are compared
+        # without decoding them
+        self.reference_hashes = array("q")
+        # Account code -> rows sorted by (timestamp, id)
+        self.account_rows: Dict[int, array] = {}
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    def __contains__(self, txn_id: str) -> bool:
+        return self.row_of(txn_id) is not None
+
+    @staticmethod
+    def _id_number(txn_id: str) -> int:
+        digits = txn_id[len(ID_PREFIX):]
+        if (txn_id.startswith(ID_PREFIX) and digits.isascii() and digits.isdigit()
+                and str(int(digits)).zfill(3) == digits):
+            return int(digits)
+        return -1
+
+    def txn_id(self, row: int) -> str:
+        number = self.id_numbers[row]
+        return self.odd_ids[row] if number < 0 else f"{ID_PREFIX}{str(number).zfill(3)}"
+
+    def date(self, row: int) -> str:
+        return self.odd_dates.get(row) or format_timestamp(self.timestamps[row])
+
+    def sort_key(self, row: int) -> Tuple[int, str]:
+        return (self.timestamps[row], self.txn_id(row))
+
+    def row_of(self, txn_id: str) -> Optional[int]:
+        number = self._id_number(txn_id)
+        if number >= 0:
+            position = bisect_left(self.sorted_id_numbers, number)
+            if position < len(self.sorted_id_numbers) and self.sorted_id_numbers[position] == number:
+                return self.sorted_id_rows[position]
+        return self.id_rows.get(txn_id)
+
+    def append(self, transaction: Dict[str, Any]) -> int:
+        """Add a transaction and return its row. Raises ValueError for a duplicate id."""
+        txn_id = transaction["id"]
+        if txn_id in self:
+            raise ValueError(f"Duplicate transaction id {txn_id}")
+        timestamp = parse_timestamp(transaction["date"])
+        row = len(self.amounts)
+
+        number = self._id_number(txn_id)
+        self.id_numbers.append(number)
+        if number < 0:
+            self.odd_ids[row] = txn_id
+            self.id_rows[txn_id] = row
+        elif not self.sorted_id_numbers or number > self.sorted_id_numbers[-1]:
+            self.sorted_id_numbers.append(number)
+            self.sorted_id_rows.append(row)
+        else:
+            self.id_rows[txn_id] = row
+
+        account_code = self.accounts.code(transaction["account_id"])
+        self.account_codes.append(account_code)
+        self.type_codes.append(self.types.code(transaction["type"]))
+        self.status_codes.append(self.statuses.code(transaction["status"]))
+        self.description_codes.append(self.descriptions.code(transaction["description"]))
+        self.amounts.append(transaction["amount"])
+        self.timestamps.append(timestamp)
+        if format_timestamp(timestamp) != transaction["date"]:
+            self.odd_dates[row] = transaction["date"]
+        self.references.append(transaction["reference"])
+        self.reference_hashes.append(hash(transaction["reference"]))
+
+        rows = self.account_rows.setdefault(account_code, array("I"))
+        # Transactions mostly arrive in time order, which is a plain append
+        if not rows or self.sort_key(rows[-1]) <= self.sort_key(row):
+            rows.append(row)
+        else:
+            insort(rows, row, key=self.sort_key)
+        return row
+
+    def record(self, row: int) -> Dict[str, Any]:
+        """The row as a dict of the API Transaction shape"""
+        return {
+            "id": self.txn_id(row),
+            "account_id": self.accounts.values[self.account_codes[row]],
+            "type": self.types.values[self.type_codes[row]],
+            "amount": self.amounts[row],
+            "description": self.descriptions.values[self.description_codes[row]],
+            "date": self.date(row),
+            "status": self.statuses.values[self.status_codes[row]],
+            "reference": self.references[row],
+        }
+
+    def get(self, txn_id: str) -> Optional[Dict[str, Any]]:
+        row = self.row_of(txn_id)
+        return self.record(row) if row is not None else None
+
+    def records(self) -> Iterator[Dict[str, Any]]:
+        return (self.record(row) for row in range(len(self)))
+
+    def find_references(self, account_id: str, references: Iterable[str]) -> Set[str]:
+        """Those of ``references`` that rows of the account already have; scans the account's rows only"""
+        wanted: Dict[int, List[str]] = {}
+        for reference in references:
+            wanted.setdefault(hash(reference), []).append(reference)
+        found = set()
+        hashes = self.reference_hashes
+        for row in self._rows(account_id):
+            candidates = wanted.get(hashes[row])
+            # Equal hashes are only candidates; compare the references themselves
+            if candidates is not None and self.references[row] in candidates:
+                found.add(self.references[row])
+        return found
+
+    def _rows(self, account_id: str) -> array:
+        code = self.accounts.codes.get(account_id)
+        return self.account_rows.get(code, array("I")) if code is not None else array("I")
+
+    def _range(self, rows: array, from_ts: Optional[int], to_ts: Optional[int]) -> Tuple[int, int]:
+        """Positions of the rows with from_ts <= timestamp < to_ts"""
+        timestamp = self.timestamps.__getitem__
+        start = bisect_left(rows, from_ts, key=timestamp) if from_ts is not None else 0
+        end = bisect_left(rows, to_ts, key=timestamp) if to_ts is not None else len(rows)
+        return start, end
+
+    def sum_amounts(self, account_id: str, from_ts: Optional[int] = None,
+                    to_ts: Optional[int] = None) -> Dict[str, Tuple[int, float]]:
+        """Count and total amount per transaction type of an account's transactions in a time range"""
+        rows = self._rows(account_id)
+        start, end = self._range(rows, from_ts, to_ts)
+        type_codes, amounts = self.type_codes, self.amounts
+        totals: Dict[int, List[float]] = {}
+        for row in rows[start:end]:
+            type_totals = totals.setdefault(type_codes[row], [0, 0.0])
+            type_totals[0] += 1
+            type_totals[1] += amounts[row]
+        return {self.types.values[code]: (count, total) for code, (count, total) in totals.items()}
+
+    def page(self, account_id: str, limit: int, before: Optional[Tuple[int, str]] = None,
+             from_ts: Optional[int] = None, to_ts: Optional[int] = None,
+             txn_type: Optional[str] = None) -> Tuple[List[Dict[str, Any]], bool]:
+        """Up to ``limit`` transactions newest first, before the (timestamp, id) key
+        ``before``; also returns whether more rows follow"""
+        rows = self._rows(account_id)
+        start, end = self._range(rows, from_ts, to_ts)
+        if before is not None:
+            end = min(end, bisect_left(rows, before, key=self.sort_key))
+        type_code = self.types.codes.get(txn_type, -1) if txn_type else None
+
+        page = []
+        for position in range(end - 1, start - 1, -1):
+            row = rows[position]
+            if type_code is not None and self.type_codes[row] != type_code:
+                continue
+            if len(page) == limit:
+                return page, True
+            page.append(self.record(row))
+        return page, False
+